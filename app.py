@@ -1,15 +1,9 @@
 from flask import Flask, render_template, jsonify, request, g, make_response, send_from_directory
-from functools import wraps
 import os
-import hashlib
-import hmac
-from urllib.parse import parse_qsl, unquote
 import time
 import json
 import logging
 from datetime import datetime
-import asyncio
-import concurrent.futures
 
 # Загрузка переменных окружения из .env файла
 try:
@@ -20,12 +14,31 @@ except ImportError:
 
 from database import init_db, get_db, close_db
 from database.db import (
-    create_or_update_user,
     get_user_profile_data,
     get_user_order_history,
     get_user_active_ads
 )
-from database.models import User, Order, Advertisement, BloggerApplication, ChatMessage, AdPost, Offer, OfferPublication
+from database.models import (
+    CHAT_PAGE_SIZE, MAX_CHAT_PAGE_SIZE, User, Order, Advertisement, BloggerApplication, ChatMessage, AdPost, Offer,
+    OfferPublication,
+)
+from database.catalog import (
+    DEFAULT_PAGE_SIZE, BloggerCatalog, catalog_page_body, catalog_version, catch_up, get_catalog_snapshot,
+)
+from database.conversation_model import Conversation
+from database.notification_outbox import NotificationOutbox
+from database.rating_model import RatingStats
+from database.user_events import UserEvents
+from database.recommendations import NUMPY_AVAILABLE, recommend_channels
+from utils.auth import BOT_TOKEN, init_auth, require_auth
+from utils.async_runner import run_async
+from utils.event_hub import get_event_hub
+from utils.http_cache import conditional_get, table_versions
+from utils.media_cache import (
+    IMMUTABLE_CACHE_CONTROL, MEDIA_URL_PREFIX, initials_avatar_url, mirror_chat_photo,
+    render_initials_avatar, thumbnail_url,
+)
+from utils.numbers import format_price, parse_price
 
 
 from payment import payment_bp
@@ -49,35 +62,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def run_async(coro, timeout=30):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(_run_in_new_loop, coro)
-        return future.result(timeout=timeout)
-
-
-def _run_in_new_loop(coro):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        try:
-          
-            pending = asyncio.all_tasks(loop)
-            for task in pending:
-                task.cancel()
-          
-            if pending:
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-        except Exception as e:
-            logger.debug(f"ошщибка цикла: {e}")
-        finally:
-            try:
-                loop.close()
-            except Exception as e:
-                logger.debug(f"ошибка: {e}")
-
-
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
@@ -85,6 +69,8 @@ init_db()
 
 app.teardown_appcontext(close_db)
 
+init_auth(app)
+
 app.register_blueprint(payment_bp)
 
 
@@ -93,179 +79,13 @@ app.register_blueprint(blogger_channels_bp)
 
 STATIC_VERSION = str(int(time.time()))
 
-
-
-
-
-BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', 'ТУТтокен')
+# Окно, за которое сообщения одному получателю собираются в одно уведомление бота
+CHAT_NOTIFICATION_DELAY = float(os.environ.get('CHAT_NOTIFICATION_DELAY', 10))
 
 
 
 
 
-INIT_DATA_EXPIRATION = 3600
-
-def validate_init_data(init_data_raw):
-
-    logger.info("=" * 60)
-    logger.info(" НАЧАЛО ВАЛИДАЦИИ ")
-    logger.info(f"InitData length: {len(init_data_raw)} chars")
-    logger.info(f"токен : {BOT_TOKEN[:20]}...{BOT_TOKEN[-10:]}")
-    logger.info(f"токен: {BOT_TOKEN}")
-    
-    try:
-    
-        parsed_data = dict(parse_qsl(init_data_raw))
-        logger.info(f"лог key: {list(parsed_data.keys())}")
-        
- 
-        logger.info("parse :")
-        for key, value in parsed_data.items():
-            if key != 'user':
-                logger.info(f"   {key} = {value}")
-            else:
-                logger.info(f"   user = {value[:100]}..." if len(value) > 100 else f"   user = {value}")
-        
-      
-        received_hash = parsed_data.pop('hash', None)
-        if not received_hash:
-            logger.warning(" Hash not found in InitData")
-            return False, None
-        
-        logger.info(f" Received hash (FULL): {received_hash}")
-        
-        
-        auth_date = parsed_data.get('auth_date')
-        if not auth_date:
-            logger.warning("autf   date not found")
-            return False, None
-        
-        try:
-            auth_timestamp = int(auth_date)
-            current_timestamp = int(time.time())
-            age_seconds = current_timestamp - auth_timestamp
-            
-            logger.info(f" Auth date: {datetime.fromtimestamp(auth_timestamp)}")
-            logger.info(f" Current time: {datetime.fromtimestamp(current_timestamp)}")
-            logger.info(f" Age: {age_seconds} seconds ({age_seconds/60:.1f} minutes)")
-            
-      
-            if age_seconds > INIT_DATA_EXPIRATION:
-                logger.warning(f"InitData expired! {age_seconds} > {INIT_DATA_EXPIRATION}")
-                return False, None
-            else:
-                logger.info(f"InitData not expired ({INIT_DATA_EXPIRATION - age_seconds}s remaining)")
-        except ValueError as e:
-            logger.error(f"Invalid auth_date: {e}")
-            return False, None
-        
-        
-        data_check_arr = [f"{k}={v}" for k, v in sorted(parsed_data.items())]
-        data_check_string = '\n'.join(data_check_arr)
-        logger.info(f" Data check string created ({len(data_check_string)} chars)")
-        logger.info(f" DATA CHECK STRING (FULL):")
-        logger.info(data_check_string)
-        logger.info(f" DATA CHECK ARR: {data_check_arr}")
-        
-  
-        logger.info(f"Creating secret key with: {BOT_TOKEN}")
-        secret_key = hmac.new(
-            key="WebAppData".encode(),
-            msg=BOT_TOKEN.encode(),
-            digestmod=hashlib.sha256
-        ).digest()
-        logger.info(f"Secret key generated: {secret_key.hex()}")
-        
-        # Step 3: Calculate hash
-        calculated_hash = hmac.new(
-            key=secret_key,
-            msg=data_check_string.encode(),
-            digestmod=hashlib.sha256
-        ).hexdigest()
-        logger.info(f"Calculated hash: {calculated_hash}")
-        
-        # Step 4: Compare hashes
-        if calculated_hash != received_hash:
-            logger.error(f"HASH MISMATCH!")
-            logger.error(f"Expected (calculated): {calculated_hash}")
-            logger.error(f"  Received (from TG):    {received_hash}")
-            logger.error(f"   BOT_TOKEN used: {BOT_TOKEN}")
-            return False, None
-        
-        logger.info("хеш ВЕРНЫЙ ")
-        
-      
-        if 'user' in parsed_data:
-            try:
-                parsed_data['user'] = json.loads(unquote(parsed_data['user']))
-                user = parsed_data['user']
-                logger.info(f"👤 User: {user.get('first_name')} {user.get('last_name')} (@{user.get('username')}, ID: {user.get('id')})")
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"❌ Error parsing user data: {e}")
-        
-        logger.info("УСПЕШНАЯ ВАлидация")
-        logger.info("=" * 60)
-        return True, parsed_data
-        
-    except Exception as e:
-        logger.error(f"ОШИБКА: {str(e)}", exc_info=True)
-        logger.info("=" * 60)
-        return False, None
-
-def require_auth(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        endpoint = f"{request.method} {request.path}"
-        logger.info(f"\nIncoming request: {endpoint}")
-        logger.info(f"IP: {request.remote_addr}")
-        auth_header = request.headers.get('Authorization', '')
-
-        if not auth_header:
-            logger.warning(f"No Authorization header for {endpoint}")
-            return jsonify({'error': 'Unauthorized', 'message': 'Missing authorization header'}), 401
-
-        if not auth_header.startswith('tma '):
-            logger.warning(f"Invalid Authorization format for {endpoint}")
-            return jsonify({'error': 'Unauthorized', 'message': 'Invalid authorization header format'}), 401
-        
-    
-        init_data_raw = auth_header[4:]  
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        
-
-
-        if not is_valid:
-            logger.error(f"Authorization FAILED for {endpoint}")
-            return jsonify({'error': 'Unauthorized', 'message': 'Invalid or expired authorization data'}), 401
-        
-        g.init_data = parsed_data
-        g.user = parsed_data.get('user', {})
-        
-     
-        referrer_id = None
-        try:
-            start_param = parsed_data.get('start_param') or parsed_data.get('startapp') or ''
-            if isinstance(start_param, str) and start_param.startswith('ref_'):
-                ref_str = start_param.split('ref_', 1)[-1]
-                if ref_str.isdigit():
-                    referrer_id = int(ref_str)
-        except Exception as e:
-            logger.error(f"Error parsing referral from init_data: {e}")
-            referrer_id = None
-
-    
-        try:
-            create_or_update_user(g.user, referrer_id=referrer_id)
-            logger.info(f" User data synchronized with database")
-        except Exception as e:
-            logger.error(f" Error syncing user to database: {e}")
-        
-        logger.info(f" Authorization for {endpoint}")
-        logger.info(f"User: {g.user.get('id')}\n")
-        
-        return f(*args, **kwargs)
-    
-    return decorated_function
 
 
 
@@ -287,6 +107,26 @@ def tonconnect_manifest():
     return send_from_directory('static', 'tonconnect-manifest.json', mimetype='application/json')
 
 
+@app.after_request
+def cache_media_forever(response):
+    # Файлы медиакэша названы по sha256 содержимого и не меняются
+    if request.path.startswith(MEDIA_URL_PREFIX) and response.status_code in (200, 304):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+@app.route('/avatars/<background>/<initials>.svg')
+def initials_avatar(background, initials):
+    """Аватар с инициалами вместо ui-avatars.com; содержимое задаётся URL."""
+    try:
+        svg = render_initials_avatar(initials, background)
+    except ValueError:
+        return jsonify({'error': 'Not found'}), 404
+    response = app.response_class(svg, mimetype='image/svg+xml')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
 
 
 @app.route('/api/user/profile', methods=['GET'])
@@ -554,9 +394,9 @@ def delete_first_channel():
         cursor.execute("""
             UPDATE users 
             SET user_type = 'user',
-                blogger_price = '',
-                blogger_price_permanent = '',
-                blogger_subscribers = '0',
+                blogger_price = NULL,
+                blogger_price_permanent = NULL,
+                blogger_subscribers = 0,
                 blogger_photo_url = '',
                 blogger_is_active = 0
             WHERE user_id = ?
@@ -659,6 +499,7 @@ def get_user_ads():
 
 
 @app.route('/api/user/rating/<int:user_id>', methods=['GET'])
+@conditional_get(table_versions('reviews'))
 def get_user_rating(user_id):
 
     try:
@@ -666,19 +507,11 @@ def get_user_rating(user_id):
         cursor = db.cursor()
         
        
-        cursor.execute("""
-            SELECT AVG(rating) as avg_rating, COUNT(*) as review_count
-            FROM reviews
-            WHERE reviewed_id = ?
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        avg_rating = result[0] if result and result[0] else 0
-        review_count = result[1] if result else 0
+        stats = RatingStats.get(cursor, user_id)
         
         return jsonify({
-            'rating': round(avg_rating, 1) if avg_rating else 0,
-            'count': review_count
+            'rating': stats['rating'],
+            'count': stats['count']
         })
     except Exception as e:
         logger.error(f"ОШИБКА В get_user_rating: {str(e)}", exc_info=True)
@@ -712,26 +545,9 @@ def submit_review():
         cursor = db.cursor()
         
    
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id INTEGER NOT NULL,
-                reviewer_id INTEGER NOT NULL,
-                reviewed_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL,
-                review_text TEXT,
-                review_type TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(post_id, reviewer_id, review_type)
-            )
-        """)
         
     
-        cursor.execute("""
-            INSERT OR REPLACE INTO reviews 
-            (post_id, reviewer_id, reviewed_id, rating, review_text, review_type)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (post_id, user_id, target_user_id, rating, review_text, review_type))
+        RatingStats.record_review(cursor, post_id, user_id, target_user_id, rating, review_type, review_text)
         
       #соо
         cursor.execute("""
@@ -794,21 +610,19 @@ def submit_review():
             notification_message += f"\n\n{review_text}"
         
     
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, receiver_id, message, message_type, metadata, channel_id, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (
+        ChatMessage.create(
+            cursor,
             user_id,
             target_user_id,
             notification_message,
-            "system_notification",
-            json.dumps({
+            channel_id=review_channel_id,
+            message_type="system_notification",
+            metadata=json.dumps({
                 "rating": rating,
                 "reviewer_type": reviewer_type_text,
                 "review_text": review_text
             }),
-            review_channel_id 
-        ))
+        )
         
         db.commit()
         
@@ -948,117 +762,125 @@ def create_advertisement():
         logger.error(f"Error in create_advertisement: {str(e)}", exc_info=True)
         return jsonify({'error': 'ошибка  сервера'}), 500
 
+CATALOG_QUERY_PARAMS = (
+    'topic_group_key', 'topic_sub_key', 'topics',
+    'min_price', 'max_price', 'min_subscribers', 'max_subscribers', 'min_rating',
+    'sort', 'limit', 'cursor',
+)
+
+
+def _get_topics_args():
+    """Тематики из ?topic_group_key=&topic_sub_key= и ?topics=group:sub,group,..."""
+    topics = []
+    if request.args.get('topic_group_key'):
+        topics.append((request.args['topic_group_key'], request.args.get('topic_sub_key') or None))
+    for topic in request.args.get('topics', '').split(','):
+        group_key, _, sub_key = topic.strip().partition(':')
+        if group_key:
+            topics.append((group_key, sub_key or None))
+    return topics
+
+
+def _get_bloggers_page(cursor):
+    """Страница каталога с фильтрами: ?topics=group:sub,...&min_price=&sort=-rating&cursor=..."""
+    catch_up(cursor)
+    try:
+        payloads, next_cursor = BloggerCatalog.query_page(
+            cursor,
+            topics=_get_topics_args(),
+            min_price=request.args.get('min_price', type=float),
+            max_price=request.args.get('max_price', type=float),
+            min_subscribers=request.args.get('min_subscribers', type=int),
+            max_subscribers=request.args.get('max_subscribers', type=int),
+            min_rating=request.args.get('min_rating', type=float),
+            sort=request.args.get('sort', 'id'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            after=request.args.get('cursor') or None,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    logger.info(f"📋 GET /api/bloggers/list (page): {len(payloads)} каналов, next={'yes' if next_cursor else 'no'}")
+    return app.response_class(catalog_page_body(payloads, next_cursor), mimetype='application/json')
+
+
 @app.route('/api/bloggers/list', methods=['GET'])
 @require_auth
+@conditional_get(catalog_version)
 def get_active_bloggers():
 
     try:
-        logger.info("=" * 60)
-        logger.info("📋 GET /api/bloggers/list called НОВАЯ БД БЛОГРЕРОВ ")
-        
         db = get_db()
         cursor = db.cursor()
-        
-        bloggers = []
-        
-       
-        logger.info("Поиск.................")
-        cursor.execute("""
-            SELECT bc.id, bc.user_id, bc.channel_name, bc.channel_link, bc.channel_id,
-                   bc.channel_photo_url, bc.subscribers_count, bc.price, bc.price_permanent,
-                   bc.topic_group_key, bc.topic_sub_key, bc.topic_sub_title,
-                   u.username, u.first_name, u.last_name,
-                   COALESCE(AVG(r.rating), 0) as avg_rating
-            FROM blogger_channels bc
-            JOIN users u ON bc.user_id = u.user_id
-            LEFT JOIN reviews r ON u.user_id = r.reviewed_id AND r.review_type = 'blogger'
-            WHERE bc.is_active = 1 
-              AND bc.is_verified = 1
-              AND u.user_type = 'blogger'
-            GROUP BY bc.id
-        """)
-        
-        channel_rows = cursor.fetchall()
-        logger.info(f" найдено {len(channel_rows)} каналов")
-        
-        for row in channel_rows:
-           
-            price = row.get('price', '')
-            if not price:
-                price = '0'
-            
-       
-            subscribers = row.get('subscribers_count', '')
-            if not subscribers or subscribers == '':
-                subscribers = '0'
-                
-      
-            channel_display = row.get('channel_name', '')
-            if not channel_display:
-                channel_link = row.get('channel_link', '')
-                if channel_link:
-                    import re
-                    patterns = [r't\.me/([^/\?]+)', r'telegram\.me/([^/\?]+)', r'@(\w+)']
-                    for pattern in patterns:
-                        match = re.search(pattern, channel_link)
-                        if match:
-                            username = match.group(1)
-                            if not username.startswith('@'):
-                                username = '@' + username
-                            channel_display = username
-                            break
-                
-                if not channel_display:
-                    channel_display = f"@{row.get('username')}" if row.get('username') else f"ID: {row.get('user_id')}"
-            
-           
-            photo_url = row.get('channel_photo_url')
-            if not photo_url:
-            
-                photo_url = f"https://ui-avatars.com/api/?name={channel_display}&background=2481cc&color=fff&size=128"
-            avg_rating = row.get('avg_rating', 0)
-            rating_display = round(avg_rating, 1) if avg_rating > 0 else 0
-            
-     
-            price_permanent = row.get('price_permanent', '')
-            if not price_permanent:
-                price_permanent = '0'
-            
-      
-            topic_sub_title = row.get('topic_sub_title', '')
-            if not topic_sub_title or topic_sub_title == '':
-                topic_sub_title = 'Без тематики'
 
-            bloggers.append({
-                'channel_id': row.get('id'),
-                'user_id': row.get('user_id'),
-                'name': channel_display, 
-                'image': photo_url,
-                'subscribers': subscribers,
-                'price': f"{price} ₽ / 12ч",
-                'price_permanent': price_permanent,
-                'channel_link': row.get('channel_link', ''),
-                'telegram_channel_id': row.get('channel_id', ''),
-                'raw_price': float(price) if price.replace('.','',1).isdigit() else 0,
-                'topic_group_key': row.get('topic_group_key'),
-                'topic_sub_key': row.get('topic_sub_key'),
-                'topic_sub_title': topic_sub_title,
-                'rating': rating_display
-            })
-            logger.info(f"  КАНАЛЫ: user_id={row.get('user_id')}, name={channel_display}, channel_id={row.get('id')}")
-        
-        logger.info(f"все каналы: {len(bloggers)}")
-        logger.info("=" * 60)
-        
-        return jsonify({
-            'bloggers': bloggers,
-            'count': len(bloggers)
-        })
+        if any(param in request.args for param in CATALOG_QUERY_PARAMS):
+            return _get_bloggers_page(cursor)
+
+        # Карточки собираются заранее (database/catalog.py) и обновляются
+        # только для изменившихся каналов
+        snapshot = get_catalog_snapshot(cursor)
+        logger.info(f"📋 GET /api/bloggers/list: {snapshot.count} каналов (rev={snapshot.rev})")
+
+        return app.response_class(snapshot.body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"ОШИБКА АКТ БЛОГЕРОВ: {str(e)}", exc_info=True)
         return jsonify({'error': 'ошибка сервера'}), 500
 
+@app.route('/api/bloggers/search', methods=['GET'])
+@require_auth
+def search_bloggers():
+    """Поиск каналов: ?q=крипто&topics=...&limit=20, лучшие совпадения первыми"""
+    try:
+        db = get_db()
+        cursor = db.cursor()
+
+        catch_up(cursor)
+        payloads = BloggerCatalog.search(
+            cursor,
+            request.args.get('q', ''),
+            topics=_get_topics_args(),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+        )
+
+        logger.info(f"🔎 GET /api/bloggers/search: {len(payloads)} каналов")
+        return app.response_class(catalog_page_body(payloads, None), mimetype='application/json')
+
+    except Exception as e:
+        logger.error(f"Error in search_bloggers: {str(e)}", exc_info=True)
+        return jsonify({'error': 'ошибка сервера'}), 500
+
+@app.route('/api/bloggers/recommended', methods=['GET'])
+@require_auth
+def get_recommended_bloggers():
+    """Каналы каталога, отсортированные под покупателя: ?limit=20"""
+    try:
+        buyer_id = g.user.get('id')
+        db = get_db()
+        cursor = db.cursor()
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+
+        if not NUMPY_AVAILABLE:
+            # Без numpy - лучшие по рейтингу, без персонализации
+            catch_up(cursor)
+            payloads, _ = BloggerCatalog.query_page(cursor, sort='-rating', limit=limit)
+            return app.response_class(catalog_page_body(payloads, None), mimetype='application/json')
+
+        recommended = recommend_channels(cursor, buyer_id, limit)
+        snapshot = get_catalog_snapshot(cursor)
+        payloads = [
+            snapshot.payloads[channel_id]
+            for channel_id, _ in recommended
+            if channel_id in snapshot.payloads
+        ]
+
+        logger.info(f"🎯 GET /api/bloggers/recommended: {len(payloads)} каналов для {buyer_id}")
+        return app.response_class(catalog_page_body(payloads, None), mimetype='application/json')
+
+    except Exception as e:
+        logger.error(f"Error in get_recommended_bloggers: {str(e)}", exc_info=True)
+        return jsonify({'error': 'ошибка сервера'}), 500
+
 @app.route('/api/blogger/card', methods=['GET']) #ПОФИКСИТЬ СТАТУСЫ
 @require_auth
 def get_blogger_card():
@@ -1099,20 +921,7 @@ def get_blogger_card():
             logger.info(f"Application found - channel_link: {channel_link}, channel_id: {channel_id}")
             
       
-            import re
-            patterns = [
-                r't\.me/([^/\?]+)',
-                r'telegram\.me/([^/\?]+)',
-                r'@(\w+)'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, channel_link)
-                if match:
-                    channel_username = match.group(1)
-                    if not channel_username.startswith('@'):
-                        channel_username = '@' + channel_username
-                    break
+            channel_username = application.get('channel_username')
             
     
             
@@ -1122,7 +931,7 @@ def get_blogger_card():
          
             if channel_id or channel_username:
                 try:
-                    from telegram_bot import bot, BOT_TOKEN
+                    from telegram_bot import bot
                     
                     
                     chat_identifier = channel_username if channel_username else channel_id
@@ -1138,14 +947,9 @@ def get_blogger_card():
                             member_count = await bot.get_chat_member_count(chat_identifier)
                             
                            
-                            photo_url = ''
-                            if chat.photo:
-                                photo_file = await bot.get_file(chat.photo.big_file_id)
-                                photo_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{photo_file.file_path}"
-                            
                             return {
                                 'subscribers_count': member_count,
-                                'channel_photo_url': photo_url
+                                'photo': chat.photo
                             }
                         except Exception as e:
                             logger.error(f"Error getting channel data: {e}")
@@ -1155,8 +959,14 @@ def get_blogger_card():
                     
                     if channel_data:
                         subscribers_count = channel_data['subscribers_count']
-                        if channel_data['channel_photo_url']:
-                            channel_photo_url = channel_data['channel_photo_url']
+                        # Фото скачивается один раз по file_unique_id (utils/media_cache.py)
+                        try:
+                            photo_url = mirror_chat_photo(cursor, channel_data['photo'])
+                        except Exception as e:
+                            logger.error(f"Error mirroring channel photo: {e}")
+                            photo_url = None
+                        if photo_url:
+                            channel_photo_url = photo_url
                         
                         logger.info(f"✅ Successfully got real-time data for {chat_identifier}: {subscribers_count} subscribers")
                         
@@ -1166,26 +976,26 @@ def get_blogger_card():
                             SET blogger_subscribers = ?,
                                 blogger_photo_url = ?
                             WHERE user_id = ?
-                        """, (str(subscribers_count), channel_photo_url, user_id))
+                        """, (subscribers_count, channel_photo_url, user_id))
                         db.commit()
                         logger.info(f"✅ Updated database with fresh data")
                     else:
                         # Fallback to database value
-                        subscribers_count = int(user.get('blogger_subscribers', 0)) if user.get('blogger_subscribers', '0').isdigit() else 0
+                        subscribers_count = user.get('blogger_subscribers') or 0
                         logger.warning(f"Using fallback subscribers count: {subscribers_count}")
                         
                 except Exception as e:
                     logger.error(f"❌ Error getting real-time subscribers count for {chat_identifier}: {e}", exc_info=True)
                    
-                    subscribers_count = int(user.get('blogger_subscribers', 0)) if user.get('blogger_subscribers', '0').isdigit() else 0
+                    subscribers_count = user.get('blogger_subscribers') or 0
             else:
                 logger.warning(f"No channel_id or channel_username available")
                 
-                subscribers_count = int(user.get('blogger_subscribers', 0)) if user.get('blogger_subscribers', '0').isdigit() else 0
+                subscribers_count = user.get('blogger_subscribers') or 0
         else:
             logger.warning(f"No approved application found for user {user_id}")
            
-            subscribers_count = int(user.get('blogger_subscribers', 0)) if user.get('blogger_subscribers', '0').isdigit() else 0
+            subscribers_count = user.get('blogger_subscribers') or 0
         
 
 
@@ -1202,8 +1012,8 @@ def get_blogger_card():
         result = {
             'is_blogger': is_blogger,
             'blogger_photo_url': channel_photo_url,
-            'blogger_price': user.get('blogger_price', ''),
-            'blogger_price_permanent': user.get('blogger_price_permanent', ''),
+            'blogger_price': format_price(user.get('blogger_price')),
+            'blogger_price_permanent': format_price(user.get('blogger_price_permanent')),
             'blogger_subscribers': subscribers_count,
             'blogger_is_active': bool(user.get('blogger_is_active', 0)),
             'channel_username': channel_username,
@@ -1244,8 +1054,8 @@ def update_blogger_card():
                 updated_at = CURRENT_TIMESTAMP
             WHERE user_id = ?
         """, (
-            data.get('blogger_price_12h', ''),
-            data.get('blogger_price_permanent', ''),
+            parse_price(data.get('blogger_price_12h')),
+            parse_price(data.get('blogger_price_permanent')),
             1 if data.get('blogger_is_active', False) else 0,
             user_id
         ))
@@ -1266,6 +1076,7 @@ def update_blogger_card():
 
 @app.route('/api/blogger/schedule', methods=['GET'])
 @require_auth
+@conditional_get(table_versions('blogger_schedules'), per_user=True)
 def get_blogger_schedule():
     
     try:
@@ -1292,6 +1103,7 @@ def get_blogger_schedule():
 
 @app.route('/api/blogger/<int:blogger_id>/schedule', methods=['GET'])
 @require_auth
+@conditional_get(table_versions('blogger_schedules'))
 def get_public_blogger_schedule(blogger_id):
 
     try:
@@ -1501,45 +1313,29 @@ def get_chat_messages(blogger_id):
     try:
         user_id = g.user.get('id')
         channel_id = request.args.get('channel_id', type=int)
+        # Курсоры по id: before_id - подгрузка истории, after_id - только новые
+        before_id = request.args.get('before_id', type=int)
+        after_id = request.args.get('after_id', type=int)
+        limit = max(1, min(request.args.get('limit', CHAT_PAGE_SIZE, type=int), MAX_CHAT_PAGE_SIZE))
         
-        logger.info(f"GET_MESSAGES: user_id={user_id}, blogger_id={blogger_id}, channel_id={channel_id}")
-        
-        logger.info(f"🔍 GET /api/chat/messages/{blogger_id} - user_id={user_id}, channel_id={channel_id}")
-        
-        logger.info(f"🔍 GET /api/chat/messages/{blogger_id} - user_id={user_id}, channel_id={channel_id}")
+        logger.debug(f"🔍 GET /api/chat/messages/{blogger_id} - user_id={user_id}, channel_id={channel_id}, "
+                     f"before_id={before_id}, after_id={after_id}")
         
         db = get_db()
         cursor = db.cursor()
         
-     
-        messages = ChatMessage.get_conversation(cursor, user_id, blogger_id, channel_id=channel_id)
+        # Лишнее сообщение сверх limit показывает, есть ли ещё страница
+        messages = ChatMessage.get_conversation(
+            cursor, user_id, blogger_id, channel_id=channel_id,
+            limit=limit + 1, before_id=before_id, after_id=after_id,
+        )
+        has_more = len(messages) > limit
+        if has_more:
+            messages = messages[:limit] if after_id is not None else messages[1:]
         
-      
-        filtered_messages = []
-        for message in messages:
-          
-            if message.get('message_type') == 'system_review' and message.get('metadata'):
-                try:
-                    metadata = json.loads(message['metadata']) if isinstance(message['metadata'], str) else message['metadata']
-                    post_id = metadata.get('post_id')
-                    review_type = metadata.get('review_type')
-                    
-                    # Проверяем, был ли уже оставлен отзыв
-                    cursor.execute("""
-                        SELECT id FROM reviews
-                        WHERE post_id = ? AND reviewer_id = ? AND review_type = ?
-                    """, (post_id, user_id, review_type))
-                    
-                    existing_review = cursor.fetchone()
-                    
-                    # Если отзыв уже был оставлен, пропускаем это сообщение
-                    if existing_review:
-                        continue
-                        
-                except Exception as e:
-                    logger.error(f"Error checking review status: {str(e)}")
-            
-            filtered_messages.append(message)
+
+        # Запросы отзыва, на которые пользователь уже ответил, не показываем
+        filtered_messages = ChatMessage.hide_submitted_review_requests(cursor, user_id, messages)
         
     
         ChatMessage.mark_as_read(cursor, blogger_id, user_id, channel_id=channel_id)
@@ -1547,7 +1343,11 @@ def get_chat_messages(blogger_id):
         
         return jsonify({
             'messages': filtered_messages,
-            'count': len(filtered_messages)
+            'count': len(filtered_messages),
+            'has_more': has_more,
+            # Курсоры по всем прочитанным сообщениям, включая скрытые запросы отзывов
+            'first_id': messages[0]['id'] if messages else None,
+            'last_id': messages[-1]['id'] if messages else None,
         })
     except Exception as e:
         logger.error(f"Error getting chat messages: {str(e)}", exc_info=True)
@@ -1585,6 +1385,13 @@ def send_chat_message():
         
 
         message_id = ChatMessage.create(cursor, user_id, blogger_id, message, channel_id=channel_id)  # NEW: Pass channel_id
+
+        NotificationOutbox.enqueue(cursor, 'new_message', {
+            'receiver_id': blogger_id,
+            'sender_id': user_id,
+            'sender_name': g.user.get('username') or g.user.get('first_name') or f"ID{user_id}",
+            'message_preview': message[:50]
+        }, delay=CHAT_NOTIFICATION_DELAY, coalesce_key=str(blogger_id))
         db.commit()
         
 
@@ -1604,26 +1411,6 @@ def send_chat_message():
         
         logger.info(f"Message sent: from={user_id} to={blogger_id}, id={message_id}")
         
-
-        try:
-            from telegram_bot import notify_user_about_new_message
-            sender = User.get_by_id(cursor, user_id)
-            
-            run_async(notify_user_about_new_message(
-                receiver_id=blogger_id,
-                sender_id=user_id,
-                sender_name=sender.get('username') or sender.get('first_name') or f"ID{user_id}",
-                message_preview=message[:50]
-            ))
-            
-            logger.info(f"Telegram notification sent to user {blogger_id}")
-        except Exception as e:
-            logger.error(f"Error sending Telegram notification: {e}")
-
-
-
-
-        
         return jsonify({
             'success': True,
             'message': created_message
@@ -1684,87 +1471,17 @@ def get_conversations():
         current_user_row = cursor.fetchone()
         current_user_type = current_user_row['user_type'] if current_user_row else 'buyer'
         
-        # Get all unique conversations with last message, grouped by channel_id
-        # ВАЖНО: Группируем по (contact_id, channel_id), чтобы один блогер с разными каналами давал разные чаты
-        # channel_id может быть:
+        # Чаты группируются по (contact_id, channel_id): один блогер с разными
+        # каналами даёт разные чаты. channel_id может быть:
         # - NULL (старые сообщения без привязки)
         # - положительное число (ID из blogger_channels)
         # - отрицательное число (ID из blogger_applications, умноженный на -1)
-        cursor.execute("""
-            WITH last_messages AS (
-                SELECT 
-                    CASE 
-                        WHEN sender_id = ? THEN receiver_id
-                        ELSE sender_id
-                    END as contact_id,
-                    channel_id,
-                    MAX(created_at) as last_message_time
-                FROM chat_messages
-                WHERE sender_id = ? OR receiver_id = ?
-                GROUP BY contact_id, channel_id
-            ),
-            unread_counts AS (
-                SELECT 
-                    sender_id as contact_id,
-                    channel_id,
-                    COUNT(*) as unread_count
-                FROM chat_messages
-                WHERE receiver_id = ? AND is_read = 0
-                GROUP BY sender_id, channel_id
-            )
-            SELECT 
-                u.user_id,
-                u.first_name,
-                u.last_name,
-                u.username,
-                u.photo_url,
-                u.blogger_photo_url,
-                lm.last_message_time,
-                lm.channel_id,
-                COALESCE(uc.unread_count, 0) as unread_count,
-                (
-                    SELECT message 
-                    FROM chat_messages 
-                    WHERE ((sender_id = ? AND receiver_id = u.user_id) 
-                       OR (sender_id = u.user_id AND receiver_id = ?))
-                       AND (
-                           (channel_id IS NULL AND lm.channel_id IS NULL) OR
-                           (channel_id = lm.channel_id)
-                       )
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                ) as last_message,
-                (
-                    SELECT sender_id 
-                    FROM chat_messages 
-                    WHERE ((sender_id = ? AND receiver_id = u.user_id) 
-                       OR (sender_id = u.user_id AND receiver_id = ?))
-                       AND (
-                           (channel_id IS NULL AND lm.channel_id IS NULL) OR
-                           (channel_id = lm.channel_id)
-                       )
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                ) as last_message_sender_id,
-                u.user_type,
-                bc.channel_link,
-                bc.channel_name,
-                bc.channel_photo_url,
-                ba.channel_link as app_channel_link
-            FROM last_messages lm
-            JOIN users u ON u.user_id = lm.contact_id
-            LEFT JOIN unread_counts uc ON uc.contact_id = u.user_id AND (
-                (uc.channel_id IS NULL AND lm.channel_id IS NULL) OR
-                (uc.channel_id = lm.channel_id)
-            )
-            LEFT JOIN blogger_channels bc ON bc.id = lm.channel_id AND lm.channel_id > 0
-            LEFT JOIN blogger_applications ba ON ba.id = -lm.channel_id AND lm.channel_id < 0
-            ORDER BY lm.last_message_time DESC
-        """, (user_id, user_id, user_id, user_id, user_id, user_id, user_id, user_id))
-        
+        # Последнее сообщение и непрочитанные уже собраны в conversations
+        rows = Conversation.list_for_user(cursor, user_id)
+
         conversations = []
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row in rows:
+            row_dict = row
             
         
             channel_username = None
@@ -1774,26 +1491,10 @@ def get_conversations():
             if row_dict.get('channel_id'):  
                 if row_dict['channel_id'] > 0:
                     channel_name = row_dict.get('channel_name', '')
-                    channel_link = row_dict.get('channel_link', '')
+                    channel_username = row_dict.get('channel_username')
                 else:
                     channel_name = ''
-                    channel_link = row_dict.get('app_channel_link', '')
-                
-                if channel_link:
-                    import re
-                    patterns = [
-                        r't\.me/([^/\?]+)',
-                        r'telegram\.me/([^/\?]+)',
-                        r'@(\w+)'
-                    ]
-                    for pattern in patterns:
-                        match = re.search(pattern, channel_link)
-                        if match:
-                            username = match.group(1)
-                            if not username.startswith('@'):
-                                username = '@' + username
-                            channel_username = username
-                            break
+                    channel_username = row_dict.get('app_channel_username')
                 
                 if channel_username:
                     display_name = channel_username
@@ -1865,8 +1566,10 @@ def get_conversations():
                 photo_url = row_dict.get('photo_url')
             
    
-            if not photo_url:
-                photo_url = f"https://ui-avatars.com/api/?name={display_name}&background=2481cc&color=fff&size=200"
+            if photo_url:
+                photo_url = thumbnail_url(photo_url, 'small')
+            else:
+                photo_url = initials_avatar_url(display_name)
             
     
             final_channel_link = None
@@ -1896,11 +1599,11 @@ def get_conversations():
           
                 buyer_photo = row_dict.get('photo_url')
                 if not buyer_photo:
-                    buyer_photo = f"https://ui-avatars.com/api/?name={buyer_name}&background=2481cc&color=fff&size=200"
+                    buyer_photo = initials_avatar_url(buyer_name)
                 
        
                 if row_dict.get('channel_photo_url'):
-                    channel_avatar = row_dict['channel_photo_url']
+                    channel_avatar = thumbnail_url(row_dict['channel_photo_url'], 'small')
             
 
 
@@ -1932,6 +1635,36 @@ def get_conversations():
         return jsonify({'error': 'ошибка сервера'}), 500
 
 
+@app.route('/api/stream', methods=['GET'])
+@require_auth
+def event_stream():
+    """Server-Sent Events: новые сообщения, непрочитанные, баланс, статусы постов и платежей.
+
+    initData передаётся в ?tma= (EventSource не отправляет заголовки). При
+    переподключении браузер присылает Last-Event-ID - пропущенные события
+    досылаются из user_events.
+    """
+    user_id = g.user.get('id')
+    hub = get_event_hub()
+    subscription = hub.subscribe(user_id)
+
+    missed = []
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is not None:
+        try:
+            missed = UserEvents.get_for_user(get_db().cursor(), user_id, last_event_id)
+        except Exception as e:
+            hub.unsubscribe(subscription)
+            logger.error(f"Error replaying events for user {user_id}: {e}", exc_info=True)
+            return jsonify({'error': 'ошибка сервера'}), 500
+
+    response = app.response_class(hub.stream(subscription, missed), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Не буферизовать поток на nginx
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 
 
 @app.route('/api/referrals', methods=['GET'])
@@ -2077,73 +1810,39 @@ def create_ad_post():
             channel = cursor.fetchone()
             if not channel:
                 return jsonify({'error': 'Канал не найден или неактивен'}), 404
-            channel_dict = dict(channel)
+            channel_dict = channel
         else:
            
             cursor.execute("""
                 SELECT * FROM blogger_channels 
                 WHERE user_id = ? AND is_active = 1 
-                AND (price IS NOT NULL AND price != '')
+                AND price IS NOT NULL
                 ORDER BY id ASC
                 LIMIT 1
             """, (blogger_id,))
             channel = cursor.fetchone()
             if channel:
-                channel_dict = dict(channel)
+                channel_dict = channel
                 channel_id = channel_dict.get('id')
                 logger.info(f"No channel_id provided, using first active channel: {channel_id}")
         
       
-        if channel_dict:
-
-
-           
-            channel_price_str = channel_dict.get('price') or None
-            if channel_price_str and str(channel_price_str).strip():
-
-                channel_price_str = str(channel_price_str).strip()
-            else:
-
-                channel_price_str = blogger.get('blogger_price', '0')
-            
-            channel_price_permanent_str = channel_dict.get('price_permanent') or None
-
-            if channel_price_permanent_str and str(channel_price_permanent_str).strip():
-                channel_price_permanent_str = str(channel_price_permanent_str).strip()
-
-
-            else:
-                channel_price_permanent_str = blogger.get('blogger_price_permanent', '')
-        else:
-            channel_price_str = blogger.get('blogger_price', '0')
-
-            channel_price_permanent_str = blogger.get('blogger_price_permanent', '')
-        
-        logger.info(f"Price calculation: channel_id={channel_id}, channel_price_str='{channel_price_str}', channel_price_permanent_str='{channel_price_permanent_str}'")
-        
-        try:
-            blogger_price_12h = float(channel_price_str) if channel_price_str else 0.0
-            if blogger_price_12h <= 0:
-                logger.error(f"Invalid channel/blogger price: {channel_price_str} (must be > 0)")
-                return jsonify({'error': 'Цена канала не установлена или некорректна'}), 400
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid channel/blogger price: {channel_price_str}, error: {e}")
-
-
-            return jsonify({'error': 'Некорректная цена канала'}), 500
-        
-  
+        # Цены канала в приоритете, цены из карточки блогера - запасной вариант
+        blogger_price_12h = None
         blogger_price_permanent = None
+        if channel_dict:
+            blogger_price_12h = channel_dict.get('price')
+            blogger_price_permanent = channel_dict.get('price_permanent')
+        if not blogger_price_12h:
+            blogger_price_12h = blogger.get('blogger_price')
+        if not blogger_price_permanent:
+            blogger_price_permanent = blogger.get('blogger_price_permanent')
 
+        logger.info(f"Price calculation: channel_id={channel_id}, price_12h={blogger_price_12h}, price_permanent={blogger_price_permanent}")
 
-        if channel_price_permanent_str:
-            try:
-                blogger_price_permanent = float(channel_price_permanent_str)
-            except (ValueError, TypeError):
-
-
-                logger.warning(f"Invalid permanent price: {channel_price_permanent_str}")
-                blogger_price_permanent = None
+        if not blogger_price_12h or blogger_price_12h <= 0:
+            logger.error(f"Invalid channel/blogger price: {blogger_price_12h} (must be > 0)")
+            return jsonify({'error': 'Цена канала не установлена или некорректна'}), 400
         
    
    
@@ -2315,7 +2014,6 @@ def create_ad_post():
 
 
         from database.escrow_model import EscrowTransaction
-        EscrowTransaction.create_table(cursor)
         
 
         User.update_balance(cursor, user_id, price, 'subtract')
@@ -2329,6 +2027,16 @@ def create_ad_post():
             amount=price,
             commission_rate=0.10
         )
+
+        NotificationOutbox.enqueue(cursor, 'ad_post_payment', {
+            'buyer_id': user_id,
+            'blogger_id': blogger_id,
+            'price': price,
+            'post_id': post_id,
+            'scheduled_time': scheduled_time_db,
+            'is_offer': is_offer,
+            'channel_id': channel_id
+        })
         
         db.commit()
         
@@ -2337,25 +2045,6 @@ def create_ad_post():
 
         created_post = AdPost.get_by_id(cursor, post_id)
 
-
-        try:
-            from telegram_bot import notify_about_ad_post_payment
-
-            run_async(
-                notify_about_ad_post_payment(
-                    buyer_id=user_id,
-                    blogger_id=blogger_id,
-                    price=price,
-                    post_id=post_id,
-                    scheduled_time=scheduled_time_db,
-                    is_offer=is_offer,
-                    channel_id=channel_id 
-                )
-            )
-            logger.info(f"Telegram notifications about ad post payment sent (post_id={post_id}, channel_id={channel_id})")
-        except Exception as e:
-            logger.error(f"Error sending Telegram notifications for ad post {post_id}: {e}", exc_info=True)
-        
         return jsonify({
             'success': True,
             'post_id': post_id,
@@ -2370,6 +2059,7 @@ def create_ad_post():
 
 @app.route('/api/offers/my', methods=['GET'])
 @require_auth
+@conditional_get(table_versions('offers'))
 def get_my_offers():
 
     try:
@@ -2515,7 +2205,7 @@ def get_premium_post_status():
         
         if row:
 
-            post_data = dict(row)
+            post_data = row
             return jsonify({
                 'status': 'received',
                 'post_id': post_data['id'],
@@ -2799,7 +2489,7 @@ def get_ad_posts_for_chat(partner_id):
         from datetime import datetime
         posts = []
         for row in rows:
-            post = dict(row)
+            post = row
             try:
                 post['post_images'] = json.loads(post.get('post_images', '[]'))
             except Exception:
@@ -2830,8 +2520,7 @@ def get_ad_posts_for_chat(partner_id):
                         
                         # Получаем текущую базовую цену блогера
                         blogger = User.get_by_id(cursor, post.get('blogger_id'))
-                        blogger_price_str = blogger.get('blogger_price') if blogger else None
-                        blogger_price_24h = float(blogger_price_str) if blogger_price_str else None
+                        blogger_price_24h = blogger.get('blogger_price') if blogger else None
                         
                         if blogger_price_24h and blogger_price_24h > 0:
                             # Если эффективная цена заметно отличается от базовой — считаем, что это оффер
@@ -3028,26 +2717,18 @@ def cancel_ad_post(post_id):
             User.update_balance(cursor, post['buyer_id'], post['price'], 'add')
             logger.warning(f"⚠️ Escrow не найден для поста {post_id}, сделан прямой возврат")
 
+        NotificationOutbox.enqueue(cursor, 'ad_post_cancelled', {
+            'buyer_id': post['buyer_id'],
+            'blogger_id': post['blogger_id'],
+            'price': post['price'],
+            'post_id': post_id,
+            'channel_id': post.get('channel_id')
+        })
+
         db.commit()
 
         logger.info(f"Ad post cancelled: id={post_id}, buyer={user_id}, refund={post['price']}")
 
-    
-        try:
-            from telegram_bot import notify_about_ad_post_cancelled
-
-            run_async(
-                notify_about_ad_post_cancelled(
-                    buyer_id=post['buyer_id'],
-                    blogger_id=post['blogger_id'],
-                    price=post['price'],
-                    post_id=post_id,
-                    channel_id=post.get('channel_id') 
-                )
-            )
-        except Exception as e:
-            logger.error(f"Error sending Telegram notifications for cancelled ad post {post_id}: {e}", exc_info=True)
-
         return jsonify({
             'success': True,
             'message': 'Заказ отменён, средства возвращены на баланс'
@@ -3101,6 +2782,17 @@ def approve_ad_post(post_id):
             total_price
         )
 
+        NotificationOutbox.enqueue(cursor, 'ad_post_approved', {
+            'buyer_id': post['buyer_id'],
+            'blogger_id': post['blogger_id'],
+            'price': total_price,
+            'blogger_amount': total_price * 0.9,  # Для уведомления показываем сумму после комиссии
+            'commission_amount': total_price * 0.1,
+            'post_id': post_id,
+            'scheduled_time': str(post['scheduled_time']),
+            'channel_id': post.get('channel_id')
+        })
+
         db.commit()
 
         logger.info(
@@ -3108,36 +2800,6 @@ def approve_ad_post(post_id):
             f"total_price={total_price}, средства остаются в escrow до удаления поста"
         )
 
-
-
-
-        # Telegram notifications
-        try:
-            from telegram_bot import notify_about_ad_post_approved
-
-            run_async(
-                notify_about_ad_post_approved(
-                    buyer_id=post['buyer_id'],
-                    blogger_id=post['blogger_id'],
-                    price=total_price,
-                    blogger_amount=total_price * 0.9,  # Для уведомления показываем сумму после комиссии
-                    commission_amount=total_price * 0.1,
-                    post_id=post_id,
-                    scheduled_time=str(post['scheduled_time']),
-                    channel_id=post.get('channel_id')  # NEW: Pass channel_id
-                )
-            )
-
-
-
-
-
-
-
-
-        except Exception as e:
-            logger.error(f"Error sending Telegram notifications for approved ad post {post_id}: {e}", exc_info=True)
-
         return jsonify({
             'success': True,
             'message': 'Пост одобрен, средства начислены блогеру'
@@ -3186,32 +2848,17 @@ def reject_ad_post(post_id):
             User.update_balance(cursor, post['buyer_id'], post['price'], 'add')
             logger.warning(f"⚠️ Escrow не найден для поста {post_id}, сделан прямой возврат")
 
-
-
+        NotificationOutbox.enqueue(cursor, 'ad_post_rejected', {
+            'buyer_id': post['buyer_id'],
+            'blogger_id': post['blogger_id'],
+            'price': post['price'],
+            'post_id': post_id,
+            'channel_id': post.get('channel_id')
+        })
         
         db.commit()
-        
-
-
-
 
         logger.info(f"Ad post rejected: id={post_id}, blogger={user_id}, refund={post['price']}")
-
-
-        try:
-            from telegram_bot import notify_about_ad_post_rejected
-
-            run_async(
-                notify_about_ad_post_rejected(
-                    buyer_id=post['buyer_id'],
-                    blogger_id=post['blogger_id'],
-                    price=post['price'],
-                    post_id=post_id,
-                    channel_id=post.get('channel_id')  
-                )
-            )
-        except Exception as e:
-            logger.error(f"Error sending Telegram notifications for rejected ad post {post_id}: {e}", exc_info=True)
         
         return jsonify({
             'success': True,
@@ -3225,6 +2872,7 @@ def reject_ad_post(post_id):
 
 @app.route('/api/blogger/<int:blogger_id>/reviews', methods=['GET'])
 @require_auth
+@conditional_get(table_versions('reviews', 'users'))
 def get_blogger_reviews(blogger_id):
 
     try:
@@ -3233,16 +2881,34 @@ def get_blogger_reviews(blogger_id):
         db = get_db()
         cursor = db.cursor()
         
-   
-        cursor.execute("""
+        # Средняя оценка и гистограмма - из rating_stats; сами отзывы можно
+        # читать страницами: ?limit=20&before_id=<id последнего отзыва>
+        stats = RatingStats.get(cursor, blogger_id, 'blogger')
+        limit = request.args.get('limit', type=int)
+        if limit:
+            limit = max(1, min(limit, 100))
+        before_id = request.args.get('before_id', type=int)
+
+        params = [blogger_id]
+        before_clause = ''
+        if before_id:
+            before_clause = 'AND r.id < ?'
+            params.append(before_id)
+        limit_clause = ''
+        if limit:
+            limit_clause = 'LIMIT ?'
+            params.append(limit)
+
+        cursor.execute(f"""
             SELECT r.id, r.rating, r.review_text, r.created_at,
                    u.user_id as reviewer_id, u.first_name, u.last_name, 
                    u.username, u.photo_url
             FROM reviews r
             LEFT JOIN users u ON r.reviewer_id = u.user_id
-            WHERE r.reviewed_id = ? AND r.review_type = 'blogger'
-            ORDER BY r.created_at DESC
-        """, (blogger_id,))
+            WHERE r.reviewed_id = ? AND r.review_type = 'blogger' {before_clause}
+            ORDER BY r.id DESC
+            {limit_clause}
+        """, params)
         
         reviews = []
         rows = cursor.fetchall()
@@ -3267,7 +2933,7 @@ def get_blogger_reviews(blogger_id):
 
             avatar_url = row.get('photo_url')
             if not avatar_url:
-                avatar_url = f"https://ui-avatars.com/api/?name={reviewer_name}&background=3b82f6&color=fff&size=80"
+                avatar_url = initials_avatar_url(reviewer_name, '3b82f6')
             
             review_data = {
                 'id': row.get('id'),
@@ -3286,7 +2952,11 @@ def get_blogger_reviews(blogger_id):
         
         response_data = {
             'reviews': reviews,
-            'count': len(reviews)
+            'count': len(reviews),
+            'total': stats['count'],
+            'rating': stats['rating'],
+            'histogram': stats['histogram'],
+            'next_before_id': reviews[-1]['id'] if limit and len(reviews) == limit else None
         }
         
         logger.info(f"✅ Returning {len(reviews)} reviews")
@@ -0,0 +1,82 @@
+"""
+Бенчмарк авторизационного этапа (utils.auth) отдельно от остального приложения.
+
+Поднимает минимальное Flask-приложение с init_auth и одним защищённым
+маршрутом, подписывает initData тестовым токеном и гоняет запросы через
+test_client: холодная проверка подписи против попадания в кэш верификатора.
+
+    TELEGRAM_BOT_TOKEN=123:bench python benchmarks/bench_auth.py [N]
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:bench-token')
+
+from flask import Flask, g, jsonify
+
+import database.db as database_db
+from utils import auth
+
+
+def make_init_data(bot_token, user_id):
+    fields = {
+        'auth_date': str(int(time.time())),
+        'query_id': f'AAH{user_id}',
+        'user': json.dumps({'id': user_id, 'first_name': 'Bench', 'username': f'bench{user_id}'}),
+    }
+    data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def build_app():
+    app = Flask(__name__)
+    app.teardown_appcontext(database_db.close_db)
+    auth.init_auth(app)
+
+    @app.route('/ping')
+    @auth.require_auth
+    def ping():
+        return jsonify({'user_id': g.user_id})
+
+    return app
+
+
+def run(client, headers_list, label):
+    start = time.perf_counter()
+    for headers in headers_list:
+        response = client.get('/ping', headers=headers)
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+    per_request = elapsed / len(headers_list) * 1e6
+    print(f"{label:<28} {len(headers_list):>6} req  {elapsed:8.3f}s  {per_request:8.1f} µs/req")
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_db.DATABASE_PATH = os.path.join(tmp, 'bench.db')
+        database_db.init_db()
+
+        app = build_app()
+        client = app.test_client()
+
+        # Каждый запрос с уникальной initData - всегда полная проверка подписи
+        cold = [{'Authorization': 'tma ' + make_init_data(auth.BOT_TOKEN, 10_000 + i)} for i in range(n)]
+        # Одна и та же initData, как при опросе из Mini App
+        warm = [{'Authorization': 'tma ' + make_init_data(auth.BOT_TOKEN, 1)}] * n
+
+        auth.init_data_verifier.cache_size = 2 * n
+        run(client, cold, 'cold (signature check)')
+        run(client, warm, 'warm (cached initData)')
+        print(f"verifier: {auth.init_data_verifier.stats()}")
@@ -0,0 +1,86 @@
+"""
+Задержка event loop бота, пока планировщик ждёт блокировку SQLite:
+синхронный запрос в корутине (как раньше в telegram_bot.py) против
+database.async_db. Параллельно другой процесс держит эксклюзивную
+транзакцию по HOLD секунд; LoopLagMonitor показывает, на сколько
+останавливался цикл (а с ним polling и колбэки).
+
+    python benchmarks/bench_bot_loop_lag.py [ROUNDS]
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.async_db import AsyncDatabase
+from database.pool import ConnectionPool
+from utils.loop_lag import LoopLagMonitor
+
+HOLD = 0.3
+UPDATE_SQL = "UPDATE ad_posts SET status = 'approved' WHERE id = 1"
+
+
+def prepare(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE ad_posts (id INTEGER PRIMARY KEY, status TEXT)")
+    conn.executemany("INSERT INTO ad_posts (status) VALUES ('pending')", [()] * 100)
+    conn.commit()
+    conn.close()
+
+
+def hold_write_lock(path):
+    conn = sqlite3.connect(path)
+    conn.execute("BEGIN EXCLUSIVE")
+    time.sleep(HOLD)
+    conn.commit()
+    conn.close()
+
+
+async def measure(label, path, rounds, write):
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=float('inf'))
+    task = asyncio.create_task(monitor.run())
+    for _ in range(rounds):
+        holder = threading.Thread(target=hold_write_lock, args=(path,))
+        holder.start()
+        await asyncio.sleep(0.02)
+        await write()
+        await asyncio.sleep(0.05)
+        holder.join()
+    task.cancel()
+    stats = monitor.stats()
+    print(f"{label:<28} samples={stats['samples']:>5} p99={stats['p99_ms']:8.2f}ms max={stats['max_ms']:8.2f}ms")
+
+
+async def main(rounds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        prepare(path)
+        pool = ConnectionPool(path)
+
+        async def sync_write():
+            conn = pool.acquire()
+            conn.execute(UPDATE_SQL)
+            conn.commit()
+            conn.close()
+
+        async_db = AsyncDatabase(path)
+
+        async def async_write():
+            await async_db.execute(UPDATE_SQL)
+
+        await measure('sync sqlite3 in coroutine', path, rounds, sync_write)
+        await measure('database.async_db', path, rounds, async_write)
+        print(async_db.stats())
+        async_db.shutdown()
+        pool.close_all()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
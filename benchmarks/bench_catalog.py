@@ -0,0 +1,110 @@
+"""
+/api/bloggers/list: полный пересчёт каталога на каждый запрос (как было)
+против материализованного каталога database.catalog.
+
+Для каждого размера печатается время старого пути (JOIN + AVG + сборка
+карточек + json), запроса к тёплому снимку и запроса после изменения
+цены одного канала (инкрементальная пересборка одной карточки).
+
+    python benchmarks/bench_catalog.py [CHANNELS ...]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.catalog import BloggerCatalog, get_catalog_snapshot
+from database.migrations import run_migrations
+from database.rows import MappingConnection, dict_factory
+
+REPEATS = 5
+
+LEGACY_SQL = """
+    SELECT bc.id, bc.user_id, bc.channel_name, bc.channel_link, bc.channel_username, bc.channel_id,
+           bc.channel_photo_url, bc.subscribers_count, bc.price, bc.price_permanent,
+           bc.topic_group_key, bc.topic_sub_key, bc.topic_sub_title,
+           u.username, u.first_name, u.last_name,
+           COALESCE(AVG(r.rating), 0) as avg_rating
+    FROM blogger_channels bc
+    JOIN users u ON bc.user_id = u.user_id
+    LEFT JOIN reviews r ON u.user_id = r.reviewed_id AND r.review_type = 'blogger'
+    WHERE bc.is_active = 1
+      AND bc.is_verified = 1
+      AND u.user_type = 'blogger'
+    GROUP BY bc.id
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, factory=MappingConnection)
+    conn.row_factory = dict_factory
+    return conn
+
+
+def prepare(path, channels):
+    conn = connect(path)
+    run_migrations(conn)
+    conn.executemany(
+        "INSERT INTO users (user_id, first_name, username, user_type) VALUES (?, ?, ?, 'blogger')",
+        [(i, f"Имя {i}", f"user{i}") for i in range(1, channels + 1)]
+    )
+    conn.executemany(
+        """INSERT INTO blogger_channels (user_id, channel_link, subscribers_count, price, is_active, is_verified)
+           VALUES (?, ?, '12000', '1500', 1, 1)""",
+        [(i, f"https://t.me/channel{i}") for i in range(1, channels + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO reviews (post_id, reviewer_id, reviewed_id, rating, review_type) VALUES (?, ?, ?, ?, 'blogger')",
+        [(i, (i % channels) + 1, ((i * 7) % channels) + 1, i % 5 + 1) for i in range(channels * 3)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy(cursor):
+    cursor.execute(LEGACY_SQL)
+    bloggers = [BloggerCatalog.build_entry(row) for row in cursor.fetchall()]
+    return json.dumps({'bloggers': bloggers, 'count': len(bloggers)}, ensure_ascii=False)
+
+
+def best_of(func):
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 5000, 20000]
+
+    for channels in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            prepare(path, channels)
+            conn = connect(path)
+            cursor = conn.cursor()
+
+            started = time.perf_counter()
+            get_catalog_snapshot(cursor)
+            initial = (time.perf_counter() - started) * 1000
+
+            legacy_ms = best_of(lambda: legacy(cursor))
+            warm_ms = best_of(lambda: get_catalog_snapshot(cursor).body)
+
+            def after_price_change():
+                cursor.execute("UPDATE blogger_channels SET price = price + 1 WHERE id = 1")
+                conn.commit()
+                get_catalog_snapshot(cursor).body
+
+            changed_ms = best_of(after_price_change)
+            conn.close()
+
+        print(f"channels={channels:>6} legacy={legacy_ms:9.2f}ms initial_build={initial:9.2f}ms "
+              f"warm={warm_ms:7.3f}ms after_one_change={changed_ms:8.2f}ms")
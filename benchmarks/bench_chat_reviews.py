@@ -0,0 +1,98 @@
+"""
+Страница /api/chat/messages с запросами отзыва: запрос к reviews на каждое
+сообщение system_review (как было) против одного запроса на страницу
+(ChatMessage.hide_submitted_review_requests).
+
+Страница - 100 последних сообщений, из них PROMPTS запросов отзыва, на
+половину которых отзыв уже оставлен. Печатается время выборки страницы
+вместе с фильтрацией для обоих вариантов.
+
+    python benchmarks/bench_chat_reviews.py [PROMPTS ...]
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_catalog import best_of, connect
+from database.migrations import run_migrations
+from database.models import ChatMessage
+from database.rating_model import RatingStats
+
+BUYER_ID = 1
+BLOGGER_ID = 2
+PAGE_SIZE = 100
+# Переписка длиннее страницы: прочие отзывы покупателя тоже лежат в reviews
+HISTORY = 5000
+
+
+def legacy(cursor, user_id, messages):
+    filtered_messages = []
+    for message in messages:
+        if message.get('message_type') == 'system_review' and message.get('metadata'):
+            metadata = json.loads(message['metadata'])
+            cursor.execute("""
+                SELECT id FROM reviews
+                WHERE post_id = ? AND reviewer_id = ? AND review_type = ?
+            """, (metadata.get('post_id'), user_id, metadata.get('review_type')))
+            if cursor.fetchone():
+                continue
+        filtered_messages.append(message)
+    return filtered_messages
+
+
+def prepare(path, prompts):
+    conn = connect(path)
+    run_migrations(conn)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO users (user_id, first_name) VALUES (?, ?)",
+        [(BUYER_ID, 'Покупатель'), (BLOGGER_ID, 'Блогер')]
+    )
+    # Старые запросы отзыва с ответами - вне последней страницы
+    for post_id in range(1, HISTORY - PAGE_SIZE + 1):
+        if post_id % 10 == 0:
+            metadata = json.dumps({'post_id': post_id, 'review_type': 'blogger'})
+            ChatMessage.create(cursor, BLOGGER_ID, BUYER_ID, 'review_request', None, 'system_review', metadata)
+            RatingStats.record_review(cursor, post_id, BUYER_ID, BLOGGER_ID, 5, 'blogger')
+        else:
+            ChatMessage.create(cursor, BUYER_ID, BLOGGER_ID, f"сообщение {post_id}")
+
+    # Последняя страница: prompts запросов отзыва, на каждый второй уже ответили
+    for i in range(PAGE_SIZE):
+        post_id = HISTORY + i
+        if i < prompts:
+            metadata = json.dumps({'post_id': post_id, 'review_type': 'blogger'})
+            ChatMessage.create(cursor, BLOGGER_ID, BUYER_ID, 'review_request', None, 'system_review', metadata)
+            if i % 2 == 0:
+                RatingStats.record_review(cursor, post_id, BUYER_ID, BLOGGER_ID, 4, 'blogger')
+        else:
+            ChatMessage.create(cursor, BUYER_ID, BLOGGER_ID, f"сообщение {post_id}")
+    conn.commit()
+    return conn
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [0, 10, 50, 100]
+
+    for prompts in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = prepare(os.path.join(tmp, 'bench.db'), prompts)
+            cursor = conn.cursor()
+
+            def page():
+                return ChatMessage.get_conversation(cursor, BUYER_ID, BLOGGER_ID, limit=PAGE_SIZE)
+
+            legacy_result = legacy(cursor, BUYER_ID, page())
+            batched_result = ChatMessage.hide_submitted_review_requests(cursor, BUYER_ID, page())
+            assert [m['id'] for m in legacy_result] == [m['id'] for m in batched_result]
+
+            legacy_ms = best_of(lambda: legacy(cursor, BUYER_ID, page()))
+            batched_ms = best_of(lambda: ChatMessage.hide_submitted_review_requests(cursor, BUYER_ID, page()))
+            conn.close()
+
+        print(f"review_prompts={prompts:>4} shown={len(batched_result):>4} "
+              f"per_message={legacy_ms:7.3f}ms batched={batched_ms:7.3f}ms")
@@ -0,0 +1,68 @@
+"""
+/api/bloggers/recommended против полного списка /api/bloggers/list.
+
+Для каждого размера печатается время старого полного списка (JOIN + AVG +
+сборка карточек), тёплого снимка каталога, оценки всех каналов под
+покупателя с двадцатью заказами в истории и той же оценки после изменения
+цены одного канала (инкрементальная пересборка признаков).
+
+    python benchmarks/bench_recommendations.py [CHANNELS ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_catalog import best_of, connect, legacy, prepare
+from database.catalog import get_catalog_snapshot
+from database.recommendations import get_channel_features, recommend_channels
+
+BUYER_ID = 0
+HISTORY = 20
+
+
+def add_buyer_history(path, channels):
+    conn = connect(path)
+    conn.execute("INSERT INTO users (user_id, first_name, user_type) VALUES (?, 'Покупатель', 'buyer')", (BUYER_ID,))
+    conn.executemany(
+        """INSERT INTO ad_posts (buyer_id, blogger_id, channel_id, post_text, scheduled_time, delete_time, price, status)
+           VALUES (?, ?, ?, 'текст', '2030-01-01 12:00:00', '2030-01-02 12:00:00', ?, 'approved')""",
+        [(BUYER_ID, i, i, 1000 + i % 7 * 250) for i in range(1, min(HISTORY, channels) + 1)]
+    )
+    conn.commit()
+    conn.close()
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 20000]
+
+    for channels in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            prepare(path, channels)
+            add_buyer_history(path, channels)
+            conn = connect(path)
+            cursor = conn.cursor()
+
+            started = time.perf_counter()
+            get_channel_features(cursor)
+            initial = (time.perf_counter() - started) * 1000
+
+            legacy_ms = best_of(lambda: legacy(cursor))
+            list_ms = best_of(lambda: get_catalog_snapshot(cursor).body)
+            recommend_ms = best_of(lambda: recommend_channels(cursor, BUYER_ID, 20))
+
+            def after_price_change():
+                cursor.execute("UPDATE blogger_channels SET price = price + 1 WHERE id = 1")
+                conn.commit()
+                recommend_channels(cursor, BUYER_ID, 20)
+
+            changed_ms = best_of(after_price_change)
+            conn.close()
+
+        print(f"channels={channels:>6} legacy_list={legacy_ms:9.2f}ms warm_list={list_ms:7.3f}ms "
+              f"initial_build={initial:9.2f}ms recommend={recommend_ms:7.3f}ms "
+              f"after_one_change={changed_ms:8.2f}ms")
@@ -0,0 +1,141 @@
+"""
+Стоимость превращения строк в dict на больших выборках: старый
+dict_factory (цикл по cursor.description на каждой строке) плюс копия
+dict(row) в моделях против database.rows (кэш имён колонок, один
+dict(zip()), без повторной копии). sqlite3.Row и голые кортежи - для
+ориентира.
+
+Запросы повторяют /api/bloggers/list (каталог каналов с рейтингом) и
+ChatMessage.get_conversation (длинная переписка с именами участников).
+
+    python benchmarks/bench_row_factory.py [CHANNELS] [MESSAGES]
+"""
+
+import gc
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrations import run_migrations
+from database.rows import MappingConnection, dict_factory, rows_to_dicts
+
+REPEATS = 7
+
+BLOGGERS_LIST_SQL = """
+    SELECT bc.id, bc.user_id, bc.channel_name, bc.channel_link, bc.channel_id,
+           bc.channel_photo_url, bc.subscribers_count, bc.price, bc.price_permanent,
+           bc.topic_group_key, bc.topic_sub_key, bc.topic_sub_title,
+           u.username, u.first_name, u.last_name,
+           COALESCE(AVG(r.rating), 0) as avg_rating
+    FROM blogger_channels bc
+    JOIN users u ON bc.user_id = u.user_id
+    LEFT JOIN reviews r ON u.user_id = r.reviewed_id AND r.review_type = 'blogger'
+    WHERE bc.is_active = 1
+      AND bc.is_verified = 1
+      AND u.user_type = 'blogger'
+    GROUP BY bc.id
+"""
+
+CONVERSATION_SQL = """
+    SELECT cm.*,
+           u1.first_name as sender_first_name,
+           u1.last_name as sender_last_name,
+           u1.username as sender_username,
+           u2.first_name as receiver_first_name,
+           u2.last_name as receiver_last_name,
+           u2.username as receiver_username
+    FROM chat_messages cm
+    LEFT JOIN users u1 ON cm.sender_id = u1.user_id
+    LEFT JOIN users u2 ON cm.receiver_id = u2.user_id
+    WHERE ((cm.sender_id = ? AND cm.receiver_id = ?)
+       OR (cm.sender_id = ? AND cm.receiver_id = ?))
+       AND cm.channel_id IS NULL
+    ORDER BY cm.created_at DESC
+    LIMIT ?
+"""
+
+
+def legacy_dict_factory(cursor, row):
+    d = {}
+    for idx, col in enumerate(cursor.description):
+        d[col[0]] = row[idx]
+    return d
+
+
+def prepare(path, channels, messages):
+    conn = sqlite3.connect(path, factory=MappingConnection)
+    conn.row_factory = dict_factory
+    run_migrations(conn)
+    conn.executemany(
+        "INSERT INTO users (user_id, first_name, last_name, username, user_type) VALUES (?, ?, ?, ?, 'blogger')",
+        [(i, f"Имя {i}", f"Фамилия {i}", f"user{i}") for i in range(1, channels + 1)]
+    )
+    conn.executemany(
+        """INSERT INTO blogger_channels (user_id, channel_name, channel_link, channel_id, channel_photo_url,
+                                         subscribers_count, price, price_permanent, is_active, is_verified)
+           VALUES (?, ?, ?, ?, '', '12000', '1500', '4000', 1, 1)""",
+        [(i, f"Канал {i}", f"https://t.me/channel{i}", f"-100{i}") for i in range(1, channels + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO reviews (post_id, reviewer_id, reviewed_id, rating, review_type) VALUES (?, ?, ?, ?, 'blogger')",
+        [(i, (i % channels) + 1, ((i * 7) % channels) + 1, i % 5 + 1) for i in range(channels * 3)]
+    )
+    conn.executemany(
+        "INSERT INTO chat_messages (sender_id, receiver_id, message, created_at) VALUES (?, ?, ?, ?)",
+        [(1 + i % 2, 2 - i % 2, f"Сообщение номер {i}", f"2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}")
+         for i in range(messages)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(connect, row_factory, convert, sql, params):
+    conn = connect()
+    conn.row_factory = row_factory
+    best = float('inf')
+    rows = []
+    gc.disable()
+    try:
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            rows = convert(conn.execute(sql, params).fetchall())
+            best = min(best, time.perf_counter() - started)
+            gc.collect()
+    finally:
+        gc.enable()
+        conn.close()
+    return best, len(rows)
+
+
+if __name__ == '__main__':
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        prepare(path, channels, messages)
+
+        plain = lambda: sqlite3.connect(path)
+        mapping = lambda: sqlite3.connect(path, factory=MappingConnection)
+        variants = (
+            ('legacy dict_factory + dict(row)', plain, legacy_dict_factory,
+             lambda rows: [dict(row) for row in rows]),
+            ('database.rows.dict_factory', mapping, dict_factory, rows_to_dicts),
+            ('sqlite3.Row (no dict)', plain, sqlite3.Row, list),
+            ('tuples (no mapping)', plain, None, list),
+        )
+        queries = (
+            ('/api/bloggers/list', BLOGGERS_LIST_SQL, ()),
+            ('get_conversation', CONVERSATION_SQL, (1, 2, 2, 1, messages)),
+        )
+
+        for label, sql, params in queries:
+            print(label)
+            for name, connect, row_factory, convert in variants:
+                best, count = timed(connect, row_factory, convert, sql, params)
+                print(f"  {name:<34} rows={count:>7} best={best * 1000:8.2f}ms "
+                      f"per_row={best / max(count, 1) * 1e6:6.2f}us")
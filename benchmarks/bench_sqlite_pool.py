@@ -0,0 +1,118 @@
+"""
+Конкурентные читатели против пишущего планировщика: старое подключение
+(rollback-журнал) против database.pool (WAL + PRAGMA).
+
+Писатель имитирует process_scheduled_ad_posts_once: держит эксклюзивную
+транзакцию записи по WRITE_HOLD секунд (так выглядит фиксация большой
+транзакции в rollback-журнале; в WAL EXCLUSIVE равносилен IMMEDIATE).
+Читатели в это время выполняют выборки как /api/chat/messages. Для
+каждого режима печатаются задержки чтения, число ошибок "database is
+locked" у читателей и число удавшихся/сорвавшихся транзакций писателя.
+
+    python benchmarks/bench_sqlite_pool.py [READERS] [SECONDS]
+"""
+
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.pool import ConnectionPool
+
+WRITE_HOLD = 0.05
+
+
+def prepare(path, rows=20000):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE ad_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            buyer_id INTEGER, blogger_id INTEGER, status TEXT,
+            scheduled_time TEXT, price REAL
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO ad_posts (buyer_id, blogger_id, status, scheduled_time, price) VALUES (?, ?, 'pending', '2030-01-01 00:00:00', 100)",
+        [(i % 500, i % 50) for i in range(rows)]
+    )
+    conn.execute("CREATE INDEX idx_bench_blogger ON ad_posts(blogger_id)")
+    conn.commit()
+    conn.close()
+
+
+def run(label, connect, readers, seconds):
+    stop = threading.Event()
+    latencies = []
+    errors = [0]
+    writes = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def writer():
+        conn = connect()
+        while not stop.is_set():
+            try:
+                conn.execute("BEGIN EXCLUSIVE")
+                conn.execute("UPDATE ad_posts SET status = 'approved' WHERE id % 97 = 0")
+                time.sleep(WRITE_HOLD)
+                conn.commit()
+                writes['ok'] += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                writes['failed'] += 1
+            time.sleep(0.01)
+        conn.close()
+
+    def reader(n):
+        conn = connect()
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                conn.execute("SELECT * FROM ad_posts WHERE blogger_id = ? LIMIT 50", (n % 50,)).fetchall()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    if latencies:
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        worst = latencies[-1] * 1000
+    else:
+        p50 = p99 = worst = float('nan')
+    print(f"{label:<30} reads={len(latencies):>7} locked={errors[0]:>6} "
+          f"p50={p50:7.2f}ms p99={p99:7.2f}ms max={worst:7.2f}ms "
+          f"writes={writes['ok']} write_failures={writes['failed']}")
+
+
+if __name__ == '__main__':
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        prepare(legacy_path)
+        run('sqlite3.connect (rollback)', lambda: sqlite3.connect(legacy_path, check_same_thread=False),
+            readers, seconds)
+
+        pooled_path = os.path.join(tmp, 'pooled.db')
+        prepare(pooled_path)
+        pool = ConnectionPool(pooled_path, max_idle=readers + 1)
+        run('database.pool (WAL)', pool.acquire, readers, seconds)
+        print(pool.stats())
@@ -1,46 +1,23 @@
 from flask import Blueprint, jsonify, request, g
-from functools import wraps
 import logging
 from database import get_db
 from database.models import User, BloggerApplication
-import asyncio
-import concurrent.futures
+from database.notification_outbox import NotificationOutbox
+from database.rows import row_to_dict, rows_to_dicts
 import sys
 sys.path.append('..')
 from utils.sanitizer import InputSanitizer
+from utils.auth import BOT_TOKEN, require_auth
+from utils.numbers import format_count, format_price, parse_count, parse_price
+from utils.channel_links import extract_channel_username
+from utils.media_cache import mirror_chat_photo
+from utils.singleflight import get_singleflight
 
 logger = logging.getLogger(__name__)
 
 blogger_channels_bp = Blueprint('blogger_channels', __name__, url_prefix='/api/blogger/channels')
 
 
-def run_async(coro, timeout=30):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(_run_in_new_loop, coro)
-        return future.result(timeout=timeout)
-
-
-def _run_in_new_loop(coro):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        try:
-            pending = asyncio.all_tasks(loop)
-            for task in pending:
-                task.cancel()
-            if pending:
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-        except Exception as e:
-            logger.debug(f"Error cleaning up event loop: {e}")
-        finally:
-            try:
-                loop.close()
-            except Exception as e:
-                logger.debug(f"Error closing event loop: {e}")
-
-
 class BloggerChannel:
     
     @staticmethod
@@ -53,9 +30,9 @@ class BloggerChannel:
                 channel_id TEXT DEFAULT '',
                 channel_name TEXT DEFAULT '',
                 channel_photo_url TEXT DEFAULT '',
-                subscribers_count TEXT DEFAULT '0',
-                price TEXT DEFAULT '',
-                price_permanent TEXT DEFAULT '',
+                subscribers_count INTEGER NOT NULL DEFAULT 0,
+                price REAL,
+                price_permanent REAL,
                 topic_group_key TEXT DEFAULT '',
                 topic_group_title TEXT DEFAULT '',
                 topic_sub_key TEXT DEFAULT '',
@@ -76,7 +53,7 @@ class BloggerChannel:
                 logger.info("🔧 Adding price_permanent column to blogger_channels table...")
                 cursor.execute("""
                     ALTER TABLE blogger_channels 
-                    ADD COLUMN price_permanent TEXT DEFAULT ''
+                    ADD COLUMN price_permanent REAL
                 """)
                 logger.info("✅ price_permanent column added successfully!")
         except Exception as e:
@@ -85,9 +62,9 @@ class BloggerChannel:
     @staticmethod
     def create(cursor, user_id, channel_link):
         cursor.execute("""
-            INSERT INTO blogger_channels (user_id, channel_link)
-            VALUES (?, ?)
-        """, (user_id, channel_link))
+            INSERT INTO blogger_channels (user_id, channel_link, channel_username)
+            VALUES (?, ?, ?)
+        """, (user_id, channel_link, extract_channel_username(channel_link)))
         return cursor.lastrowid
     
     @staticmethod
@@ -97,9 +74,21 @@ class BloggerChannel:
         """, (channel_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
     
+    @staticmethod
+    def get_by_username(cursor, channel_username):
+        if not channel_username.startswith('@'):
+            channel_username = '@' + channel_username
+        cursor.execute("""
+            SELECT * FROM blogger_channels
+            WHERE channel_username = ? COLLATE NOCASE
+            ORDER BY id
+            LIMIT 1
+        """, (channel_username,))
+        return row_to_dict(cursor.fetchone())
+    
     @staticmethod
     def get_user_channels(cursor, user_id):
         cursor.execute("""
@@ -107,14 +96,20 @@ class BloggerChannel:
             WHERE user_id = ? 
             ORDER BY created_at DESC
         """, (user_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
     
     @staticmethod
     def update_channel_info(cursor, channel_id, channel_name=None, channel_photo_url=None, 
-                           subscribers_count=None, channel_telegram_id=None):
+                           subscribers_count=None, channel_telegram_id=None, channel_link=None):
         updates = []
         params = []
         
+        if channel_link is not None:
+            updates.append("channel_link = ?")
+            params.append(channel_link)
+            updates.append("channel_username = ?")
+            params.append(extract_channel_username(channel_link))
+        
         if channel_name is not None:
             updates.append("channel_name = ?")
             params.append(channel_name)
@@ -125,7 +120,7 @@ class BloggerChannel:
         
         if subscribers_count is not None:
             updates.append("subscribers_count = ?")
-            params.append(subscribers_count)
+            params.append(parse_count(subscribers_count))
         
         if channel_telegram_id is not None:
             updates.append("channel_id = ?")
@@ -144,18 +139,19 @@ class BloggerChannel:
     
     @staticmethod
     def update_price(cursor, channel_id, price, price_permanent=None):
+        # Пустая строка от клиента - цена не указана (NULL)
         if price_permanent is not None:
             cursor.execute("""
                 UPDATE blogger_channels 
                 SET price = ?, price_permanent = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
-            """, (price, price_permanent, channel_id))
+            """, (parse_price(price), parse_price(price_permanent), channel_id))
         else:
             cursor.execute("""
                 UPDATE blogger_channels 
                 SET price = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
-            """, (price, channel_id))
+            """, (parse_price(price), channel_id))
     
     @staticmethod
     def update_topic(cursor, channel_id, topic_group_key, topic_group_title, 
@@ -236,28 +232,83 @@ class ChannelSchedule:
                     WHEN 'Sun' THEN 7
                 END
         """, (channel_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
+
+
+# Открытие списка каналов несколькими вкладками/клиентами сразу не должно
+# умножать запросы getChat к Telegram по одному и тому же каналу
+_telegram_chat_flight = get_singleflight('telegram_get_chat')
+
+
+def _fetch_telegram_chat(chat_id):
+    """getChat + getChatMemberCount через Bot API, аватар - через медиакэш.
+
+    Возвращает {'title', 'subscribers_count', 'photo_url'}; subscribers_count
+    и photo_url равны None, если их получить не удалось. Ошибка getChat -
+    исключение.
+    """
+    import requests
+
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
+    response = requests.post(url, json={'chat_id': chat_id}, timeout=10)
+    response.raise_for_status()
+    chat_data = response.json()
+
+    if not chat_data.get('ok'):
+        raise Exception(f"Telegram API error: {chat_data.get('description', 'Unknown error')}")
+
+    chat = chat_data['result']
+
+    subscribers_count = None
+    try:
+        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMemberCount"
+        response = requests.post(url, json={'chat_id': chat_id}, timeout=10)
+        response.raise_for_status()
+        count_data = response.json()
+
+        if count_data.get('ok'):
+            subscribers_count = max(count_data['result'], 0)
+    except Exception as e:
+        logger.error(f"❌ Error getting subscribers count for {chat_id}: {e}")
+
+    return {
+        'title': chat.get('title', ''),
+        'subscribers_count': subscribers_count,
+        'photo_url': _mirror_chat_photo(chat),
+    }
+
+
+def _mirror_chat_photo(chat):
+    """Локальная копия аватара канала (utils/media_cache.py) или None."""
+    try:
+        return mirror_chat_photo(get_db().cursor(), chat.get('photo'))
+    except Exception as e:
+        logger.error(f"❌ Error mirroring photo of chat {chat.get('id')}: {e}")
+        return None
+
+
+def fetch_telegram_chat(chat_id):
+    """_fetch_telegram_chat, общий для одновременных запросов по одному каналу."""
+    return _telegram_chat_flight.do(str(chat_id), _fetch_telegram_chat, chat_id)
+
+
+def serialize_channel(channel):
+    """Канал для ответа: цены и подписчики строками, как их ждёт клиент."""
+    return {
+        **channel,
+        'subscribers_count': format_count(channel.get('subscribers_count')),
+        'price': format_price(channel.get('price')),
+        'price_permanent': format_price(channel.get('price_permanent')),
+    }
 
 
 @blogger_channels_bp.route('/list', methods=['GET'])
+@require_auth
 def get_channels():
     try:
-        from app import validate_init_data, BOT_TOKEN
         from telegram_bot import bot
         
-        # Manually check auth
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -269,63 +320,35 @@ def get_channels():
         channels = BloggerChannel.get_user_channels(cursor, user_id)
         
         def refresh_channels_data_sync():
-            import requests
-            
             updated_channels = []
             for channel in channels:
-                if not channel.get('subscribers_count') or channel.get('subscribers_count') == '':
-                    channel['subscribers_count'] = '0'
-                
                 if channel.get('channel_id'):
                     try:
-                        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
-                        response = requests.post(url, json={'chat_id': channel['channel_id']}, timeout=10)
-                        response.raise_for_status()
-                        chat_data = response.json()
-                        
-                        if chat_data.get('ok'):
-                            chat = chat_data['result']
-                            channel_name = chat.get('title', '')
-                            
-                            url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMemberCount"
-                            response = requests.post(url, json={'chat_id': channel['channel_id']}, timeout=10)
-                            response.raise_for_status()
-                            count_data = response.json()
-                            
-                            subscribers_count = '0'
-                            if count_data.get('ok'):
-                                member_count = count_data['result']
-                                subscribers_count = str(member_count) if member_count > 0 else '0'
-                            
-                            channel_photo_url = channel.get('channel_photo_url', '')
-                            if 'photo' in chat and 'big_file_id' in chat['photo']:
-                                url = f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
-                                response = requests.post(url, json={'file_id': chat['photo']['big_file_id']}, timeout=10)
-                                response.raise_for_status()
-                                file_data = response.json()
-                                
-                                if file_data.get('ok'):
-                                    file_path = file_data['result']['file_path']
-                                    channel_photo_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-                            
-                            cursor.execute("""
-                                UPDATE blogger_channels
-                                SET channel_name = ?,
-                                    channel_photo_url = ?,
-                                    subscribers_count = ?,
-                                    updated_at = CURRENT_TIMESTAMP
-                                WHERE id = ?
-                            """, (channel_name, channel_photo_url, subscribers_count, channel['id']))
-                            
-                            channel['channel_name'] = channel_name
-                            channel['channel_photo_url'] = channel_photo_url
-                            channel['subscribers_count'] = subscribers_count
-                            
-                            logger.info(f"✅ Refreshed channel {channel['id']}: name='{channel_name}', subscribers={subscribers_count}")
+                        chat = fetch_telegram_chat(channel['channel_id'])
+                        channel_name = chat['title']
+
+                        # Если Telegram не отдал число подписчиков или аватар - оставляем прежние
+                        subscribers_count = chat['subscribers_count']
+                        if subscribers_count is None:
+                            subscribers_count = channel.get('subscribers_count') or 0
+                        channel_photo_url = chat['photo_url'] or channel.get('channel_photo_url', '')
+
+                        cursor.execute("""
+                            UPDATE blogger_channels
+                            SET channel_name = ?,
+                                channel_photo_url = ?,
+                                subscribers_count = ?,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE id = ?
+                        """, (channel_name, channel_photo_url, subscribers_count, channel['id']))
+
+                        channel['channel_name'] = channel_name
+                        channel['channel_photo_url'] = channel_photo_url
+                        channel['subscribers_count'] = subscribers_count
+
+                        logger.info(f"✅ Refreshed channel {channel['id']}: name='{channel_name}', subscribers={subscribers_count}")
                     except Exception as e:
                         logger.error(f"❌ Error refreshing channel {channel['id']}: {e}")
-                        if not channel.get('subscribers_count'):
-                            channel['subscribers_count'] = '0'
                 else:
                     logger.warning(f"⚠️ Channel {channel['id']} has no channel_id, skipping refresh")
                 
@@ -340,7 +363,7 @@ def get_channels():
             logger.error(f"Error refreshing channels data: {e}")
         
         return jsonify({
-            'channels': channels,
+            'channels': [serialize_channel(channel) for channel in channels],
             'count': len(channels)
         })
         
@@ -350,24 +373,12 @@ def get_channels():
 
 
 @blogger_channels_bp.route('/<int:channel_id>/refresh', methods=['POST'])
+@require_auth
 def refresh_channel_data(channel_id):
     try:
-        from app import validate_init_data, BOT_TOKEN
         from telegram_bot import bot
         
-        # Manually check auth
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -384,55 +395,15 @@ def refresh_channel_data(channel_id):
             return jsonify({'error': 'Канал не верифицирован'}), 400
         
         def refresh_from_telegram_sync():
-            import requests
-            
             try:
-                url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
-                response = requests.post(url, json={'chat_id': channel_telegram_id}, timeout=10)
-                response.raise_for_status()
-                chat_data = response.json()
-                
-                if not chat_data.get('ok'):
-                    raise Exception(f"Telegram API error: {chat_data.get('description', 'Unknown error')}")
-                
-                chat = chat_data['result']
-                channel_name = chat.get('title', '')
-                
-                channel_photo_url = ''
-                if 'photo' in chat and 'big_file_id' in chat['photo']:
-                    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
-                    response = requests.post(url, json={'file_id': chat['photo']['big_file_id']}, timeout=10)
-                    response.raise_for_status()
-                    file_data = response.json()
-                    
-                    if file_data.get('ok'):
-                        file_path = file_data['result']['file_path']
-                        channel_photo_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-                
-                subscribers_count = '0'
-                try:
-                    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMemberCount"
-                    response = requests.post(url, json={'chat_id': channel_telegram_id}, timeout=10)
-                    response.raise_for_status()
-                    count_data = response.json()
-                    
-                    if count_data.get('ok'):
-                        member_count = count_data['result']
-                        if member_count >= 1000:
-                            subscribers_count = f"{member_count // 1000}K"
-                        elif member_count > 0:
-                            subscribers_count = str(member_count)
-                        else:
-                            subscribers_count = '0'
-                        logger.info(f"📊 Refreshed subscribers: {subscribers_count} (raw: {member_count})")
-                except Exception as e:
-                    logger.error(f"❌ Error getting subscribers count: {e}")
-                    subscribers_count = '0'
-                
+                chat = fetch_telegram_chat(channel_telegram_id)
+                subscribers_count = chat['subscribers_count'] or 0
+                logger.info(f"📊 Refreshed subscribers: {subscribers_count}")
+
                 return {
                     'success': True,
-                    'channel_name': channel_name,
-                    'channel_photo_url': channel_photo_url,
+                    'channel_name': chat['title'],
+                    'channel_photo_url': chat['photo_url'] or '',
                     'subscribers_count': subscribers_count
                 }
             except Exception as e:
@@ -470,7 +441,7 @@ def refresh_channel_data(channel_id):
             'success': True,
             'channel_name': result['channel_name'],
             'channel_photo_url': result['channel_photo_url'],
-            'subscribers_count': result['subscribers_count']
+            'subscribers_count': format_count(result['subscribers_count'])
         })
         
     except Exception as e:
@@ -479,22 +450,11 @@ def refresh_channel_data(channel_id):
 
 
 @blogger_channels_bp.route('/add', methods=['POST'])
+@require_auth
 def add_channel():
     try:
-        from app import validate_init_data
-        
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
         
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         data = request.json
         channel_link = data.get('channel_link')
@@ -538,24 +498,11 @@ def add_channel():
 
 
 @blogger_channels_bp.route('/<int:channel_id>/verify', methods=['POST'])
+@require_auth
 def verify_channel(channel_id):
     try:
-        from app import validate_init_data, BOT_TOKEN
-        from telegram_bot import notify_admin_about_channel
-        import re
-        
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
         
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -574,22 +521,7 @@ def verify_channel(channel_id):
                 'message': 'Канал уже одобрен администратором'
             })
         
-        channel_link = channel['channel_link']
-        channel_username = None
-        
-        patterns = [
-            r't\.me/([^/\?]+)',
-            r'telegram\.me/([^/\?]+)',
-            r'@(\w+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, channel_link)
-            if match:
-                channel_username = match.group(1)
-                if not channel_username.startswith('@'):
-                    channel_username = '@' + channel_username
-                break
+        channel_username = channel.get('channel_username')
         
         if not channel_username:
             return jsonify({
@@ -647,20 +579,9 @@ def verify_channel(channel_id):
                 else:
                     logger.info(f"❌ Bot is NOT an administrator (status: {bot_status})")
                 
-                channel_photo_url = ''
-                if 'photo' in chat:
-                    photo = chat['photo']
-                    if 'big_file_id' in photo:
-                        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
-                        response = requests.post(url, json={'file_id': photo['big_file_id']}, timeout=10)
-                        response.raise_for_status()
-                        file_data = response.json()
-                        
-                        if file_data.get('ok'):
-                            file_path = file_data['result']['file_path']
-                            channel_photo_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
+                channel_photo_url = _mirror_chat_photo(chat) or ''
                 
-                subscribers_count = '0'
+                subscribers_count = 0
                 try:
                     url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMemberCount"
                     response = requests.post(url, json={'chat_id': channel_username}, timeout=10)
@@ -668,17 +589,11 @@ def verify_channel(channel_id):
                     count_data = response.json()
                     
                     if count_data.get('ok'):
-                        member_count = count_data['result']
-                        if member_count >= 1000:
-                            subscribers_count = f"{member_count // 1000}K"
-                        elif member_count > 0:
-                            subscribers_count = str(member_count)
-                        else:
-                            subscribers_count = '0'
-                        logger.info(f"📊 Channel subscribers: {subscribers_count} (raw: {member_count})")
+                        subscribers_count = max(count_data['result'], 0)
+                        logger.info(f"📊 Channel subscribers: {subscribers_count}")
                 except Exception as e:
                     logger.error(f"❌ Error getting subscribers count: {e}")
-                    subscribers_count = '0'
+                    subscribers_count = 0
                 
                 return {
                     'is_admin': is_bot_admin,
@@ -718,86 +633,19 @@ def verify_channel(channel_id):
             channel_telegram_id=result['telegram_channel_id']
         )
         BloggerChannel.set_verified(cursor, channel_id, True)
+
+        NotificationOutbox.enqueue(cursor, 'admin_channel', {'channel_id': channel_id})
         
         db.commit()
         
         logger.info(f"✅ Channel {channel_id} verified and saved with {result['subscribers_count']} subscribers")
         
-        try:
-            import requests
-            import json
-            import os
-            
-            BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '8501227640:AAEnvc8VZa5ga3_8uN5isjUH4cGKFaCmw8c')
-            ADMIN_ID = 6870552881
-            
-            logger.info(f"📤 Sending notification to admin about channel #{channel_id}")
-            
-            cursor.execute("""
-                SELECT bc.*, u.first_name, u.last_name, u.username, u.user_id
-                FROM blogger_channels bc
-                JOIN users u ON bc.user_id = u.user_id
-                WHERE bc.id = ?
-            """, (channel_id,))
-            
-            channel_row = cursor.fetchone()
-            if channel_row:
-                channel_data = dict(channel_row)
-                
-                username = f"@{channel_data['username']}" if channel_data['username'] else "Не указан"
-                full_name = f"{channel_data['first_name']} {channel_data['last_name']}".strip()
-                channel_name = channel_data.get('channel_name') or 'Не указано'
-                subscribers = channel_data.get('subscribers_count') or '0'
-                
-                message_text = (
-                    "🆕 <b>Новый канал на одобрение</b>\n\n"
-                    f"👤 <b>Блогер:</b> {full_name}\n"
-                    f"🆔 <b>ID:</b> <code>{channel_data['user_id']}</code>\n"
-                    f"📱 <b>Username:</b> {username}\n"
-                    f"📢 <b>Канал:</b> {channel_name}\n"
-                    f"👥 <b>Подписчики:</b> {subscribers}\n"
-                    f"🔗 <b>Ссылка:</b> {channel_data['channel_link']}\n"
-                    f"✅ <b>Бот добавлен:</b> Да\n\n"
-                    f"<i>Канал #{channel_id}</i>"
-                )
-                
-                keyboard = {
-                    "inline_keyboard": [
-                        [
-                            {"text": "✅ Одобрить", "callback_data": f"approve_channel_{channel_id}"},
-                            {"text": "❌ Отклонить", "callback_data": f"reject_channel_{channel_id}"}
-                        ]
-                    ]
-                }
-                
-                url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-                payload = {
-                    "chat_id": ADMIN_ID,
-                    "text": message_text,
-                    "parse_mode": "HTML",
-                    "reply_markup": json.dumps(keyboard)
-                }
-                
-                response = requests.post(url, json=payload, timeout=10)
-                response.raise_for_status()
-                result_msg = response.json()
-                
-                if result_msg.get('ok'):
-                    logger.info(f"✅ Admin notified successfully about channel #{channel_id}")
-                else:
-                    logger.error(f"❌ Telegram API error: {result_msg.get('description', 'Unknown error')}")
-            else:
-                logger.error(f"❌ Channel {channel_id} not found for notification")
-                
-        except Exception as e:
-            logger.error(f"❌ Error notifying admin: {e}", exc_info=True)
-        
         return jsonify({
             'verified': True,
             'approved': False,
             'message': 'Канал подтвержден! Заявка отправлена администратору на одобрение.',
             'channel_name': result['channel_name'],
-            'subscribers_count': result['subscribers_count']
+            'subscribers_count': format_count(result['subscribers_count'])
         })
         
     except Exception as e:
@@ -806,22 +654,11 @@ def verify_channel(channel_id):
 
 
 @blogger_channels_bp.route('/<int:channel_id>/update', methods=['POST'])
+@require_auth
 def update_channel(channel_id):
     try:
-        from app import validate_init_data
-        
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
         
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -867,22 +704,11 @@ def update_channel(channel_id):
 
 
 @blogger_channels_bp.route('/<int:channel_id>/schedule', methods=['GET', 'POST'])
+@require_auth
 def channel_schedule(channel_id):
     try:
-        from app import validate_init_data
-        
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
         
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -918,22 +744,11 @@ def channel_schedule(channel_id):
 
 
 @blogger_channels_bp.route('/<int:channel_id>/delete', methods=['DELETE'])
+@require_auth
 def delete_channel(channel_id):
     try:
-        from app import validate_init_data
-        
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
         
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -965,24 +780,13 @@ def delete_channel(channel_id):
 
 
 @blogger_channels_bp.route('/<int:channel_id>/photo/upload', methods=['POST'])
+@require_auth
 def upload_channel_photo(channel_id):
     try:
-        from app import validate_init_data
         import os
         from werkzeug.utils import secure_filename
         
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header or not auth_header.startswith('tma '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        init_data_raw = auth_header[4:]
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        
-        if not is_valid:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user_data = parsed_data.get('user', {})
-        user_id = user_data.get('id')
+        user_id = g.user_id
         
         db = get_db()
         cursor = db.cursor()
@@ -0,0 +1,155 @@
+"""
+Асинхронный доступ к SQLite для бота.
+
+Обработчики aiogram и планировщик работают в одном event loop, поэтому
+синхронный запрос (или ожидание блокировки до busy_timeout) останавливает
+polling, колбэки и публикацию постов разом. AsyncDatabase выполняет работу
+с базой в отдельном пуле потоков: каждый вызов берёт соединение из
+database.pool, выполняет функцию и коммитит (или откатывает при ошибке).
+
+    row = await async_db.fetchone("SELECT * FROM users WHERE user_id = ?", (user_id,))
+    await async_db.run(_mark_post_published, post_id, message_ids)
+
+Функция для run() получает cursor первым аргументом - так же, как
+методы моделей в database/models.py.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+
+def _fetchone(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.fetchone()
+
+
+def _fetchall(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def _execute(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.rowcount
+
+
+def _insert(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.lastrowid
+
+
+class AsyncDatabase:
+    """Пул потоков для запросов к одному файлу БД.
+
+    Строки возвращаются как sqlite3.Row, как и у get_db_connection() в
+    боте, чтобы обработчики можно было переводить без правки доступа к
+    полям. Воркеров немного: SQLite всё равно пишет в один поток, а
+    читатели в WAL друг другу не мешают.
+    """
+
+    def __init__(self, database_path, max_workers=4, slow_call_threshold=0.2):
+        self.database_path = database_path
+        self.slow_call_threshold = slow_call_threshold
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bot-db')
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.errors = 0
+        self.slow_calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+
+    def _call(self, submitted_at, func, args, kwargs):
+        started = time.perf_counter()
+        conn = get_pool(self.database_path).acquire(row_factory=sqlite3.Row)
+        failed = False
+        try:
+            result = func(conn.cursor(), *args, **kwargs)
+            conn.commit()
+            return result
+        except Exception:
+            failed = True
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            self._record(func, started - submitted_at, time.perf_counter() - started, failed)
+
+    def _record(self, func, wait, elapsed, failed):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += elapsed
+            self.max_run = max(self.max_run, elapsed)
+            slow = elapsed > self.slow_call_threshold
+            self.slow_calls += slow
+
+        if slow:
+            name = getattr(func, '__qualname__', repr(func))
+            logger.warning(f"🐢 Slow DB call {name}: {elapsed * 1000:.0f} ms (queued {wait * 1000:.0f} ms)")
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить func(cursor, *args, **kwargs) в пуле потоков в одной транзакции."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(self._call, time.perf_counter(), func, args, kwargs)
+        )
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(_fetchone, sql, params)
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(_fetchall, sql, params)
+
+    async def execute(self, sql, params=()):
+        """Выполнить изменяющий запрос и закоммитить; возвращает rowcount."""
+        return await self.run(_execute, sql, params)
+
+    async def insert(self, sql, params=()):
+        """Выполнить INSERT и закоммитить; возвращает lastrowid."""
+        return await self.run(_insert, sql, params)
+
+    def stats(self):
+        with self._lock:
+            n = self.calls or 1
+            return {
+                'database': self.database_path,
+                'calls': self.calls,
+                'errors': self.errors,
+                'slow_calls': self.slow_calls,
+                'avg_wait_ms': self.total_wait / n * 1000,
+                'max_wait_ms': self.max_wait * 1000,
+                'avg_run_ms': self.total_run / n * 1000,
+                'max_run_ms': self.max_run * 1000,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_async_db(database_path):
+    path = os.path.abspath(database_path)
+    with _instances_lock:
+        instance = _instances.get(path)
+        if instance is None:
+            instance = _instances[path] = AsyncDatabase(path)
+    return instance
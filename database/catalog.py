@@ -0,0 +1,438 @@
+"""
+Материализованный каталог блогеров для /api/bloggers/list.
+
+Карточка канала (имя, аватар, цены, рейтинг) раньше собиралась заново на
+каждый запрос для всех каналов: JOIN с users и reviews, AVG(rating) и
+разбор channel_link регулярками. Теперь готовые карточки лежат в
+blogger_catalog, а триггеры (миграция 3) складывают id изменившихся каналов
+в catalog_dirty. refresh() пересобирает только эти каналы, а процесс
+держит снимок каталога в памяти, пока не сменится blogger_catalog_state.rev.
+
+Поиск по имени, @username и тематике идёт через FTS5-индекс blogger_search
+(миграция 8), который триггеры на blogger_channels держат в актуальном
+состоянии.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import re
+import threading
+import time
+
+from utils.media_cache import initials_avatar_url, thumbnail_url
+from utils.numbers import format_count, format_price
+from utils.singleflight import get_singleflight
+
+logger = logging.getLogger(__name__)
+
+
+REFRESH_BATCH_SIZE = 500
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# sort -> (колонка blogger_catalog, по убыванию). Каналы без подписчиков
+# не имеют цены за подписчика и в эту сортировку не попадают
+CATALOG_SORTS = {
+    'id': ('channel_id', False),
+    'price': ('price', False),
+    '-price': ('price', True),
+    'subscribers': ('subscribers', False),
+    '-subscribers': ('subscribers', True),
+    'rating': ('rating', False),
+    '-rating': ('rating', True),
+    'price_per_subscriber': ('price_per_subscriber', False),
+    '-price_per_subscriber': ('price_per_subscriber', True),
+}
+
+# Слова запроса: буквы и цифры, как их режет токенизатор unicode61
+_SEARCH_TERM = re.compile(r'[^\W_]+')
+MAX_SEARCH_TERMS = 8
+
+_CHANNEL_ROWS_SQL = """
+    SELECT bc.id, bc.user_id, bc.channel_name, bc.channel_link, bc.channel_username, bc.channel_id,
+           bc.channel_photo_url, bc.subscribers_count, bc.price, bc.price_permanent,
+           bc.topic_group_key, bc.topic_sub_key, bc.topic_sub_title,
+           bc.is_active, bc.is_verified,
+           u.username, u.first_name, u.last_name, u.user_type,
+           COALESCE(rs.rating_sum * 1.0 / rs.review_count, 0) as avg_rating
+    FROM blogger_channels bc
+    LEFT JOIN users u ON bc.user_id = u.user_id
+    LEFT JOIN rating_stats rs
+           ON rs.reviewed_id = bc.user_id AND rs.review_type = 'blogger' AND rs.review_count > 0
+    WHERE bc.id IN ({})
+"""
+
+
+def _topic_conditions(topics):
+    """SQL-условие по парам (topic_group_key, topic_sub_key или None) и его параметры."""
+    conditions = []
+    params = []
+    for group_key, sub_key in topics:
+        if sub_key:
+            conditions.append("(topic_group_key = ? AND topic_sub_key = ?)")
+            params.extend((group_key, sub_key))
+        else:
+            conditions.append("topic_group_key = ?")
+            params.append(group_key)
+    return f"({' OR '.join(conditions)})", params
+
+
+def build_match_query(text):
+    """Строка поиска -> выражение MATCH: каждое слово как префикс, все слова обязательны.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 (OR, NEAR, *, :) из
+    пользовательского ввода не интерпретируются. None, если слов нет.
+    """
+    terms = _SEARCH_TERM.findall(text or '')[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _channel_display_name(row):
+    channel_display = row.get('channel_name') or row.get('channel_username')
+    if not channel_display:
+        channel_display = f"@{row.get('username')}" if row.get('username') else f"ID: {row.get('user_id')}"
+    return channel_display
+
+
+class BloggerCatalog:
+
+    @staticmethod
+    def is_listed(row):
+        return row.get('is_active') == 1 and row.get('is_verified') == 1 and row.get('user_type') == 'blogger'
+
+    @staticmethod
+    def build_entry(row):
+        """Карточка канала в формате ответа /api/bloggers/list.
+
+        price/price_permanent в строке - REAL или NULL, subscribers_count -
+        INTEGER (миграция 5); строки для клиента собираются здесь.
+        """
+        price = row.get('price') or 0
+        price_display = format_price(price)
+
+        channel_display = _channel_display_name(row)
+
+        photo_url = row.get('channel_photo_url')
+        if photo_url:
+            photo_url = thumbnail_url(photo_url, 'medium')
+        else:
+            photo_url = initials_avatar_url(channel_display)
+
+        avg_rating = row.get('avg_rating', 0)
+        rating_display = round(avg_rating, 1) if avg_rating > 0 else 0
+
+        topic_sub_title = row.get('topic_sub_title', '')
+        if not topic_sub_title or topic_sub_title == '':
+            topic_sub_title = 'Без тематики'
+
+        return {
+            'channel_id': row.get('id'),
+            'user_id': row.get('user_id'),
+            'name': channel_display,
+            'image': photo_url,
+            'subscribers': format_count(row.get('subscribers_count')),
+            'price': f"{price_display} ₽ / 12ч",
+            'price_permanent': format_price(row.get('price_permanent') or 0),
+            'channel_link': row.get('channel_link', ''),
+            'telegram_channel_id': row.get('channel_id', ''),
+            'raw_price': float(price),
+            'topic_group_key': row.get('topic_group_key'),
+            'topic_sub_key': row.get('topic_sub_key'),
+            'topic_sub_title': topic_sub_title,
+            'rating': rating_display
+        }
+
+    @staticmethod
+    def _rebuild(cursor, channel_ids, rev):
+        placeholders = ', '.join('?' * len(channel_ids))
+        cursor.execute(_CHANNEL_ROWS_SQL.format(placeholders), channel_ids)
+        rows = {row['id']: row for row in cursor.fetchall()}
+
+        now = time.time()
+        upserts = []
+        removed = []
+        for channel_id in channel_ids:
+            row = rows.get(channel_id)
+            if row is None or not BloggerCatalog.is_listed(row):
+                removed.append((channel_id,))
+                continue
+            entry = BloggerCatalog.build_entry(row)
+            subscribers = row['subscribers_count'] or 0
+            upserts.append((
+                channel_id, entry['user_id'], entry['name'],
+                entry['topic_group_key'], entry['topic_sub_key'],
+                entry['raw_price'], subscribers, entry['rating'],
+                entry['raw_price'] / subscribers if subscribers > 0 else None,
+                json.dumps(entry, ensure_ascii=False), rev, now
+            ))
+
+        if upserts:
+            cursor.executemany("""
+                INSERT OR REPLACE INTO blogger_catalog (
+                    channel_id, user_id, name, topic_group_key, topic_sub_key,
+                    price, subscribers, rating, price_per_subscriber,
+                    payload, rev, updated_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, upserts)
+        if removed:
+            cursor.executemany("DELETE FROM blogger_catalog WHERE channel_id = ?", removed)
+        cursor.executemany("DELETE FROM catalog_dirty WHERE channel_id = ?", [(cid,) for cid in channel_ids])
+
+    @staticmethod
+    def has_pending(cursor):
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM catalog_dirty) AS pending")
+        row = cursor.fetchone()
+        return bool(row['pending'])
+
+    @staticmethod
+    def refresh(cursor):
+        """Пересобрать карточки из catalog_dirty в собственной транзакции.
+
+        Вызывается на соединении без открытой транзакции; возвращает число
+        пересобранных каналов.
+        """
+        conn = cursor.connection
+        # Под блокировкой записи: триггеры другого процесса не вклинятся
+        # между чтением catalog_dirty и его очисткой
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT channel_id FROM catalog_dirty")
+            dirty = [row['channel_id'] for row in cursor.fetchall()]
+            if not dirty:
+                conn.rollback()
+                return 0
+
+            cursor.execute("UPDATE blogger_catalog_state SET rev = rev + 1 WHERE id = 1")
+            rev = BloggerCatalog.get_revision(cursor)
+            for start in range(0, len(dirty), REFRESH_BATCH_SIZE):
+                BloggerCatalog._rebuild(cursor, dirty[start:start + REFRESH_BATCH_SIZE], rev)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        logger.info(f"📚 Blogger catalog refreshed: {len(dirty)} channels, rev={rev}")
+        return len(dirty)
+
+    @staticmethod
+    def get_revision(cursor):
+        cursor.execute("SELECT rev FROM blogger_catalog_state WHERE id = 1")
+        row = cursor.fetchone()
+        return row['rev'] if row else 0
+
+    @staticmethod
+    def query_page(cursor, topics=(), min_price=None, max_price=None,
+                   min_subscribers=None, max_subscribers=None, min_rating=None,
+                   sort='id', limit=DEFAULT_PAGE_SIZE, after=None):
+        """Страница каталога по фильтрам в порядке sort.
+
+        topics - пары (topic_group_key, topic_sub_key или None); after -
+        курсор из предыдущей страницы. Возвращает (payload-строки, курсор
+        следующей страницы или None). Страница читается по индексу
+        (ключ сортировки, channel_id) с места курсора, поэтому её цена
+        не зависит от размера каталога.
+        """
+        if sort not in CATALOG_SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        column, descending = CATALOG_SORTS[sort]
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        conditions = []
+        params = []
+        if topics:
+            topic_sql, topic_params = _topic_conditions(topics)
+            conditions.append(topic_sql)
+            params.extend(topic_params)
+
+        for sql, value in (
+            ("price >= ?", min_price),
+            ("price <= ?", max_price),
+            ("subscribers >= ?", min_subscribers),
+            ("subscribers <= ?", max_subscribers),
+            ("rating >= ?", min_rating),
+        ):
+            if value is not None:
+                conditions.append(sql)
+                params.append(value)
+
+        if column != 'channel_id':
+            conditions.append(f"{column} IS NOT NULL")
+
+        if after is not None:
+            cursor_sort, last_value, last_id = decode_cursor(after)
+            if cursor_sort != sort:
+                raise ValueError("Cursor belongs to a different sort")
+            op = '<' if descending else '>'
+            if column == 'channel_id':
+                conditions.append(f"channel_id {op} ?")
+                params.append(last_id)
+            else:
+                conditions.append(f"({column}, channel_id) {op} (?, ?)")
+                params.extend((last_value, last_id))
+
+        direction = 'DESC' if descending else 'ASC'
+        order = 'channel_id' if column == 'channel_id' else f"{column} {direction}, channel_id"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        cursor.execute(f"""
+            SELECT channel_id, {column} AS sort_value, payload
+            FROM blogger_catalog
+            {where}
+            ORDER BY {order} {direction}
+            LIMIT ?
+        """, params + [limit + 1])
+        rows = cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(sort, last['sort_value'], last['channel_id'])
+        return [row['payload'] for row in rows], next_cursor
+
+    @staticmethod
+    def search(cursor, query, topics=(), limit=DEFAULT_PAGE_SIZE):
+        """Карточки каналов по строке поиска, лучшие совпадения первыми.
+
+        Совпадения ищутся в индексе blogger_search (имя канала, @username,
+        подтема и группа тематики) с весами bm25 из миграции 8; в выдачу
+        попадают только каналы из каталога. Возвращает payload-строки.
+        """
+        match = build_match_query(query)
+        if match is None:
+            return []
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        conditions = ["blogger_search MATCH ?"]
+        params = [match]
+        if topics:
+            topic_sql, topic_params = _topic_conditions(topics)
+            conditions.append(topic_sql)
+            params.extend(topic_params)
+
+        cursor.execute(f"""
+            SELECT bc.payload
+            FROM blogger_search
+            JOIN blogger_catalog bc ON bc.channel_id = blogger_search.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY blogger_search.rank
+            LIMIT ?
+        """, params + [limit])
+        return [row['payload'] for row in cursor.fetchall()]
+
+
+def encode_cursor(sort, value, channel_id):
+    raw = json.dumps([sort, value, channel_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort, value, channel_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(channel_id, int):
+        raise ValueError("Invalid cursor")
+    return sort, value, channel_id
+
+
+def catalog_page_body(payloads, next_cursor):
+    """JSON-тело страницы из готовых карточек, без их повторного разбора."""
+    return '{"bloggers": [%s], "count": %d, "next_cursor": %s}' % (
+        ', '.join(payloads), len(payloads), json.dumps(next_cursor)
+    )
+
+
+_refresh_flight = get_singleflight('catalog_refresh')
+
+
+def catch_up(cursor):
+    """Пересобрать изменившиеся карточки, если соединение не в транзакции.
+
+    Одновременные запросы не выстраиваются в очередь за BEGIN IMMEDIATE
+    ради пустого catalog_dirty, а ждут одну пересборку.
+    """
+    if not cursor.connection.in_transaction and BloggerCatalog.has_pending(cursor):
+        _refresh_flight.do('refresh', BloggerCatalog.refresh, cursor)
+
+
+def catalog_version(cursor):
+    """Версия ответов каталога для ETag: ревизия после догона catalog_dirty."""
+    catch_up(cursor)
+    return (BloggerCatalog.get_revision(cursor),)
+
+
+class CatalogSnapshot:
+    """Каталог одной ревизии: готовые JSON-карточки по channel_id и тело ответа.
+
+    Карточки хранятся строками из blogger_catalog.payload и склеиваются в
+    тело без повторного разбора: json.dumps пишет payload с теми же
+    разделителями, что и весь ответ.
+    """
+
+    __slots__ = ('rev', 'payloads', 'body')
+
+    def __init__(self, rev, payloads):
+        self.rev = rev
+        self.payloads = payloads
+        self.body = '{"bloggers": [%s], "count": %d}' % (
+            ', '.join(payloads[channel_id] for channel_id in sorted(payloads)),
+            len(payloads)
+        )
+
+    @property
+    def count(self):
+        return len(self.payloads)
+
+    @property
+    def bloggers(self):
+        return [json.loads(self.payloads[channel_id]) for channel_id in sorted(self.payloads)]
+
+
+def _load_snapshot(cursor, rev, previous):
+    if previous is None:
+        cursor.execute("SELECT channel_id, payload FROM blogger_catalog")
+        return CatalogSnapshot(rev, {row['channel_id']: row['payload'] for row in cursor.fetchall()})
+
+    # Догружаем только карточки новее предыдущего снимка; удалённые
+    # каналы находим по списку id (он читается из первичного ключа)
+    payloads = dict(previous.payloads)
+    cursor.execute("SELECT channel_id, payload FROM blogger_catalog WHERE rev > ?", (previous.rev,))
+    for row in cursor.fetchall():
+        payloads[row['channel_id']] = row['payload']
+
+    cursor.execute("SELECT channel_id FROM blogger_catalog")
+    listed = {row['channel_id'] for row in cursor.fetchall()}
+    for channel_id in payloads.keys() - listed:
+        del payloads[channel_id]
+    return CatalogSnapshot(rev, payloads)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot(cursor):
+    """Актуальный снимок каталога: догоняет catalog_dirty и дочитывает таблицу только при смене rev."""
+    global _snapshot
+
+    catch_up(cursor)
+
+    rev = BloggerCatalog.get_revision(cursor)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.rev == rev:
+        return snapshot
+
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.rev != rev:
+            # rev меньше снимка бывает только при пересоздании базы - читаем заново
+            previous = snapshot if snapshot is not None and snapshot.rev < rev else None
+            snapshot = _snapshot = _load_snapshot(cursor, rev, previous)
+    return snapshot
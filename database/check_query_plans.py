@@ -0,0 +1,311 @@
+"""
+Проверка планов запросов: EXPLAIN QUERY PLAN для каждой SQL-строки в коде.
+
+Скрипт разбирает *.py проекта через ast, собирает строковые литералы,
+похожие на SQL (SELECT/INSERT/UPDATE/DELETE/WITH), и прогоняет их через
+EXPLAIN QUERY PLAN на свежей базе, собранной миграциями. В f-строки
+подставляются образцы из FSTRING_SAMPLES - каждый вариант планируется
+отдельно; f-строка без образца для какого-то выражения тоже считается
+ошибкой. Полный проход (SCAN) по горячей таблице считается регрессией, и
+скрипт завершается с кодом 1. Намеренные полные проходы перечислены в
+ALLOWED_SCANS с причиной.
+
+    python database/check_query_plans.py [-v]
+"""
+
+import ast
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s+\S', re.IGNORECASE)
+SCAN_DETAIL = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+WHERE_CLAUSE = re.compile(r'\bWHERE\b(.*?)(?=\bORDER\s+BY\b|\bGROUP\s+BY\b|\bLIMIT\b|\)|$)', re.IGNORECASE | re.DOTALL)
+QUALIFIER = re.compile(r'\b(\w+)\.\w+')
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+NOT_ALIAS = {
+    'where', 'on', 'join', 'left', 'inner', 'cross', 'outer', 'order', 'group',
+    'limit', 'set', 'using', 'values', 'union', 'select', 'having', 'natural',
+}
+
+# Таблицы, которые растут вместе с трафиком; полный проход по ним недопустим
+HOT_TABLES = {
+    'users',
+    'chat_messages',
+    'conversations',
+    'ad_posts',
+    'blogger_channels',
+    'blogger_applications',
+    'reviews',
+    'offers',
+    'offer_publications',
+    'escrow_transactions',
+    'withdrawal_requests',
+    'payments',
+    'ton_payments',
+    'notification_outbox',
+    'user_events',
+    'orders',
+    'advertisements',
+    'blogger_catalog',
+}
+
+SKIP_DIRS = {'__pycache__', 'benchmarks', 'static', 'templates', '.git'}
+# Миграции и одноразовые скрипты обходят таблицы целиком намеренно
+SKIP_FILES = {
+    os.path.join('database', 'migrations.py'),
+    os.path.join('database', 'check_query_plans.py'),
+    os.path.join('payment', 'init_payment_db.py'),
+}
+
+# (файл, фрагмент SQL) -> причина, по которой полный проход допустим
+ALLOWED_SCANS = {
+    (os.path.join('database', 'notification_outbox.py'), 'AS sent_recent'):
+        'мониторинг очереди; отправленные записи чистит purge_sent',
+    (os.path.join('database', 'rating_model.py'), 'GROUP BY reviewed_id, review_type'):
+        'полный пересчёт агрегатов: миграция и ручная сверка',
+    (os.path.join('database', 'conversation_model.py'), 'GROUP BY user_id, contact_id, channel_id'):
+        'полная пересборка списка чатов: миграция и ручная сверка',
+    (os.path.join('database', 'catalog.py'), 'SELECT channel_id, payload FROM blogger_catalog'):
+        'первый снимок каталога в памяти (CatalogSnapshot) читает все карточки',
+    (os.path.join('database', 'catalog.py'), 'SELECT channel_id FROM blogger_catalog'):
+        'сверка снимка с каталогом: список id по покрывающему индексу',
+    (os.path.join('database', 'recommendations.py'), 'FROM blogger_catalog ORDER BY channel_id'):
+        'снимок признаков каталога для рекомендаций строится по всем каналам',
+}
+
+# Подстановки для выражений f-строк, которые встречаются во многих запросах
+FSTRING_DEFAULTS = {
+    'placeholders': '?, ?, ?',
+    '_FEATURE_COLUMNS': '*',
+}
+
+# (файл, фрагмент f-строки с {выражениями}) -> варианты подстановок;
+# каждый вариант - запрос, который код действительно может построить
+FSTRING_SAMPLES = {
+    ('blogger_channels.py', "SET {', '.join(updates)}"): [
+        {"', '.join(updates)": 'price = ?, updated_at = CURRENT_TIMESTAMP'},
+    ],
+    ('app.py', '{before_clause}'): [
+        {'before_clause': '', 'limit_clause': ''},
+        {'before_clause': 'AND r.id < ?', 'limit_clause': 'LIMIT ?'},
+    ],
+    (os.path.join('database', 'catalog.py'), 'FROM blogger_catalog\n            {where}'): [
+        {'column': 'channel_id', 'where': '', 'order': 'channel_id', 'direction': 'ASC'},
+        {'column': 'channel_id', 'where': 'WHERE channel_id > ?', 'order': 'channel_id', 'direction': 'ASC'},
+        {'column': 'price', 'where': 'WHERE price IS NOT NULL AND (price, channel_id) > (?, ?)',
+         'order': 'price ASC, channel_id', 'direction': 'ASC'},
+        {'column': 'subscribers', 'where': 'WHERE subscribers >= ? AND subscribers IS NOT NULL',
+         'order': 'subscribers DESC, channel_id', 'direction': 'DESC'},
+        {'column': 'rating', 'where': 'WHERE (topic_group_key = ?) AND rating IS NOT NULL',
+         'order': 'rating DESC, channel_id', 'direction': 'DESC'},
+        {'column': 'channel_id', 'where': 'WHERE ((topic_group_key = ? AND topic_sub_key = ?)) AND price <= ?',
+         'order': 'channel_id', 'direction': 'ASC'},
+    ],
+    (os.path.join('database', 'catalog.py'), 'FROM blogger_search'): [
+        {"' AND '.join(conditions)": 'blogger_search MATCH ?'},
+        {"' AND '.join(conditions)": 'blogger_search MATCH ? AND (topic_group_key = ?)'},
+    ],
+    (os.path.join('database', 'models.py'), 'FROM chat_messages cm'): [
+        {"' AND '.join(conditions)": base + extra, 'order': order}
+        for base in ['min(cm.sender_id, cm.receiver_id) = ? AND max(cm.sender_id, cm.receiver_id) = ? '
+                     'AND COALESCE(cm.channel_id, 0) = ?']
+        for extra, order in (('', 'DESC'), (' AND cm.id < ?', 'DESC'), (' AND cm.id > ?', 'ASC'))
+    ],
+}
+
+
+def iter_python_files(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for filename in filenames:
+            if filename.endswith('.py'):
+                path = os.path.join(dirpath, filename)
+                rel = os.path.relpath(path, root)
+                if rel not in SKIP_FILES:
+                    yield path, rel
+
+
+def fstring_template(node):
+    """Текст f-строки с {выражениями} на месте подстановок."""
+    return ''.join(
+        value.value if isinstance(value, ast.Constant) else '{' + ast.unparse(value.value) + '}'
+        for value in node.values
+    )
+
+
+def fstring_variants(rel, node, template):
+    """Запросы из f-строки по образцам; KeyError с выражением, для которого образца нет."""
+    variants = [
+        variant for (sample_file, fragment), samples in FSTRING_SAMPLES.items()
+        if sample_file == rel and fragment in template
+        for variant in samples
+    ] or [{}]
+    for variant in variants:
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+                continue
+            expression = ast.unparse(value.value)
+            if expression in variant:
+                parts.append(variant[expression])
+            elif expression in FSTRING_DEFAULTS:
+                parts.append(FSTRING_DEFAULTS[expression])
+            else:
+                raise KeyError(expression)
+        yield ''.join(parts)
+
+
+def iter_sql_strings(path, rel):
+    """(строка, SQL, None) для литералов и вариантов f-строк; (строка, None, выражение) - нет образца."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    # Куски f-строк - не самостоятельные запросы, их план строится по всей f-строке
+    fstring_parts = {
+        id(value)
+        for node in ast.walk(tree) if isinstance(node, ast.JoinedStr)
+        for value in node.values
+    }
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            template = fstring_template(node)
+            if not SQL_START.match(template):
+                continue
+            try:
+                variants = list(fstring_variants(rel, node, template))
+            except KeyError as e:
+                yield node.lineno, None, e.args[0]
+                continue
+            for sql in variants:
+                yield node.lineno, sql, None
+        elif (isinstance(node, ast.Constant) and isinstance(node.value, str)
+                and id(node) not in fstring_parts and SQL_START.match(node.value)):
+            yield node.lineno, node.value, None
+
+
+def table_aliases(sql):
+    """EXPLAIN QUERY PLAN пишет псевдоним (SCAN ap), а не имя таблицы."""
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+def build_database(path):
+    import database.db as db
+
+    db.DATABASE_PATH = path
+    if not db.init_db():
+        raise RuntimeError("init_db failed")
+    conn = sqlite3.connect(path)
+    # Пустые таблицы: пусть планировщик выбирает индексы так, как на живой базе
+    conn.execute("ANALYZE")
+    return conn
+
+
+def partial_indexes(conn):
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+    return {name for name, sql in rows if re.search(r'\bWHERE\b', sql, re.IGNORECASE)}
+
+
+def filters_table(sql, alias):
+    """Может ли WHERE запроса проверять строки alias.
+
+    Условие на таблицу, которую план обходит через SCAN, не попало в
+    индекс и проверяется по каждой прочитанной строке. Неквалифицированные
+    колонки считаются относящимися к любой таблице.
+    """
+    for clause in WHERE_CLAUSE.findall(sql):
+        qualifiers = set(QUALIFIER.findall(clause))
+        if not qualifiers or alias in qualifiers:
+            return True
+    return False
+
+
+def is_hot_scan(detail, sql, aliases, partial, stops_at_limit):
+    m = SCAN_DETAIL.match(detail)
+    if not m or aliases.get(m.group(1), m.group(1)) not in HOT_TABLES:
+        return False
+    index = m.group(2)
+    # Проход по частичному индексу читает только отобранные строки
+    if index and index in partial:
+        return False
+    # Проход в порядке выдачи (по индексу или rowid) останавливается на
+    # LIMIT - но только без условий на эту таблицу: иначе до LIMIT
+    # подходящих строк можно прочитать её целиком
+    if stops_at_limit and not filters_table(sql, m.group(1)):
+        return False
+    return True
+
+
+def is_allowed(rel, sql):
+    for (allowed_file, fragment), _reason in ALLOWED_SCANS.items():
+        if allowed_file == rel and fragment in sql:
+            return True
+    return False
+
+
+def check(verbose=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, 'plans.db'))
+        partial = partial_indexes(conn)
+        checked = 0
+        skipped = []
+        failures = []
+        unplanned = []
+
+        for path, rel in iter_python_files(BASE_DIR):
+            for lineno, sql, missing in iter_sql_strings(path, rel):
+                if sql is None:
+                    unplanned.append((rel, lineno, missing))
+                    continue
+                params = (None,) * sql.count('?')
+                try:
+                    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                except sqlite3.Error as e:
+                    skipped.append((rel, lineno, str(e)))
+                    continue
+
+                checked += 1
+                aliases = table_aliases(sql)
+                # С временным B-деревом для сортировки строки читаются все до выдачи первой
+                stops_at_limit = (re.search(r'\bLIMIT\b', sql, re.IGNORECASE) is not None
+                                  and not any('TEMP B-TREE' in row[3] for row in plan))
+                scans = [row[3] for row in plan if is_hot_scan(row[3], sql, aliases, partial, stops_at_limit)]
+
+                if scans and not is_allowed(rel, sql):
+                    failures.append((rel, lineno, scans, ' '.join(sql.split())))
+                elif verbose:
+                    print(f"ok   {rel}:{lineno}  {' | '.join(r[3] for r in plan)}")
+
+        conn.close()
+
+    for rel, lineno, error in skipped:
+        if verbose:
+            print(f"skip {rel}:{lineno}  ({error})")
+
+    for rel, lineno, scans, sql in failures:
+        print(f"SCAN {rel}:{lineno}")
+        print(f"     {sql[:200]}")
+        for detail in scans:
+            print(f"     -> {detail}")
+
+    for rel, lineno, expression in unplanned:
+        print(f"NO SAMPLE {rel}:{lineno}  f-string expression {{{expression}}} is missing in FSTRING_SAMPLES")
+
+    print(f"\nChecked {checked} statements, skipped {len(skipped)}, "
+          f"table scans on hot tables: {len(failures)}, f-strings without samples: {len(unplanned)}")
+    return not failures and not unplanned
+
+
+if __name__ == '__main__':
+    ok = check(verbose='-v' in sys.argv)
+    sys.exit(0 if ok else 1)
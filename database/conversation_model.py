@@ -0,0 +1,121 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Сколько символов сообщения хранится для превью в списке чатов
+PREVIEW_LENGTH = 100
+
+
+class Conversation:
+    """Список чатов пользователя: одна строка на (user_id, contact_id, channel_id).
+
+    На каждое сообщение приходится две строки - у отправителя и у
+    получателя - с последним сообщением (id, отправитель, начало текста,
+    время) и числом непрочитанных у владельца строки. channel_id хранится
+    как 0 для сообщений без канала (NULL в chat_messages), чтобы входить в
+    первичный ключ; положительный - blogger_channels, отрицательный -
+    blogger_applications. Ведут таблицу ChatMessage.create и
+    ChatMessage.mark_as_read в той же транзакции, поэтому список чатов -
+    одно чтение по индексу, сколько бы сообщений ни было в переписке.
+    """
+
+    @staticmethod
+    def record_message(cursor, message_id):
+        """Учесть новое сообщение chat_messages.id = message_id у обеих сторон."""
+        cursor.execute("""
+            INSERT INTO conversations (
+                user_id, contact_id, channel_id, last_message_id, last_sender_id,
+                preview, last_message_time, unread_count
+            )
+            SELECT sender_id, receiver_id, COALESCE(channel_id, 0), id, sender_id,
+                   substr(message, 1, ?), created_at, 0
+            FROM chat_messages WHERE id = ?
+            UNION ALL
+            SELECT receiver_id, sender_id, COALESCE(channel_id, 0), id, sender_id,
+                   substr(message, 1, ?), created_at, is_read = 0
+            FROM chat_messages WHERE id = ?
+            ON CONFLICT (user_id, contact_id, channel_id) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_sender_id = excluded.last_sender_id,
+                preview = excluded.preview,
+                last_message_time = excluded.last_message_time,
+                unread_count = unread_count + excluded.unread_count
+        """, (PREVIEW_LENGTH, message_id, PREVIEW_LENGTH, message_id))
+
+    @staticmethod
+    def mark_read(cursor, user_id, contact_id, channel_id=None):
+        cursor.execute("""
+            UPDATE conversations SET unread_count = 0
+            WHERE user_id = ? AND contact_id = ? AND channel_id = ? AND unread_count != 0
+        """, (user_id, contact_id, channel_id or 0))
+
+    @staticmethod
+    def get_unread_total(cursor, user_id):
+        cursor.execute("""
+            SELECT COALESCE(SUM(unread_count), 0) AS count
+            FROM conversations
+            WHERE user_id = ?
+        """, (user_id,))
+        row = cursor.fetchone()
+        return row['count'] if isinstance(row, dict) else row[0]
+
+    @staticmethod
+    def list_for_user(cursor, user_id):
+        """Чаты пользователя от свежих к старым с данными собеседника и канала."""
+        cursor.execute("""
+            SELECT
+                u.user_id,
+                u.first_name,
+                u.last_name,
+                u.username,
+                u.photo_url,
+                u.blogger_photo_url,
+                u.user_type,
+                c.last_message_time,
+                NULLIF(c.channel_id, 0) AS channel_id,
+                c.unread_count,
+                c.preview AS last_message,
+                c.last_sender_id AS last_message_sender_id,
+                bc.channel_link,
+                bc.channel_username,
+                bc.channel_name,
+                bc.channel_photo_url,
+                ba.channel_link AS app_channel_link,
+                ba.channel_username AS app_channel_username
+            FROM conversations c
+            JOIN users u ON u.user_id = c.contact_id
+            LEFT JOIN blogger_channels bc ON bc.id = c.channel_id AND c.channel_id > 0
+            LEFT JOIN blogger_applications ba ON ba.id = -c.channel_id AND c.channel_id < 0
+            WHERE c.user_id = ?
+            ORDER BY c.last_message_time DESC
+        """, (user_id,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def rebuild(cursor):
+        """Пересобрать список чатов по chat_messages целиком (ручная сверка)."""
+        cursor.execute("DELETE FROM conversations")
+        cursor.execute("""
+            INSERT INTO conversations (
+                user_id, contact_id, channel_id, last_message_id, last_sender_id,
+                preview, last_message_time, unread_count
+            )
+            SELECT s.user_id, s.contact_id, s.channel_id, cm.id, cm.sender_id,
+                   substr(cm.message, 1, ?), cm.created_at, s.unread_count
+            FROM (
+                SELECT user_id, contact_id, channel_id,
+                       MAX(id) AS last_message_id, SUM(unread) AS unread_count
+                FROM (
+                    SELECT sender_id AS user_id, receiver_id AS contact_id,
+                           COALESCE(channel_id, 0) AS channel_id, id, 0 AS unread
+                    FROM chat_messages
+                    UNION ALL
+                    SELECT receiver_id, sender_id, COALESCE(channel_id, 0), id, is_read = 0
+                    FROM chat_messages
+                )
+                GROUP BY user_id, contact_id, channel_id
+            ) s
+            JOIN chat_messages cm ON cm.id = s.last_message_id
+        """, (PREVIEW_LENGTH,))
+        logger.info(f"💬 Conversations rebuilt: {cursor.rowcount} rows")
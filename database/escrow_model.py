@@ -1,6 +1,9 @@
 
 import logging
 from datetime import datetime
+
+from .rows import row_to_dict, rows_to_dicts
+
 logger = logging.getLogger(__name__)
 
 
@@ -68,7 +71,7 @@ class EscrowTransaction:
         """, (ad_post_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
     
 
@@ -175,7 +178,7 @@ class EscrowTransaction:
             ORDER BY created_at DESC
             LIMIT ?
         """, (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
     
 
 
@@ -0,0 +1,40 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MediaFile:
+    """Файлы медиакэша (utils/media_cache.py).
+
+    media_files - одна строка на содержимое (sha256), telegram_files -
+    какой файл Telegram (file_unique_id) уже скачан и под каким sha256.
+    """
+
+    @staticmethod
+    def get_by_sha256(cursor, sha256):
+        cursor.execute("SELECT * FROM media_files WHERE sha256 = ?", (sha256,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def get_by_telegram_id(cursor, file_unique_id):
+        cursor.execute("""
+            SELECT mf.*
+            FROM telegram_files tf
+            JOIN media_files mf ON mf.sha256 = tf.sha256
+            WHERE tf.file_unique_id = ?
+        """, (file_unique_id,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def save(cursor, sha256, ext, size, width=None, height=None):
+        cursor.execute("""
+            INSERT OR IGNORE INTO media_files (sha256, ext, size, width, height)
+            VALUES (?, ?, ?, ?, ?)
+        """, (sha256, ext, size, width, height))
+
+    @staticmethod
+    def link_telegram_file(cursor, file_unique_id, sha256):
+        cursor.execute("""
+            INSERT OR REPLACE INTO telegram_files (file_unique_id, sha256)
+            VALUES (?, ?)
+        """, (file_unique_id, sha256))
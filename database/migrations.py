@@ -0,0 +1,858 @@
+"""
+Версионируемые миграции схемы users.db.
+
+Номер применённой миграции хранится в PRAGMA user_version. Каждая
+миграция выполняется ровно один раз в своей транзакции (BEGIN IMMEDIATE):
+Flask и бот могут стартовать одновременно, поэтому версия перечитывается
+уже под блокировкой записи. Для актуальной базы init_db сводится к одному
+чтению user_version.
+
+Новая миграция - функция с декоратором @migration(<следующий номер>, ...).
+Уже выпущенные миграции не редактируются.
+"""
+
+import logging
+import re
+
+from .models import (
+    CREATE_USERS_TABLE,
+    CREATE_ORDERS_TABLE,
+    CREATE_ADVERTISEMENTS_TABLE,
+    CREATE_BLOGGER_APPLICATIONS_TABLE,
+    CREATE_BLOGGER_SCHEDULE_TABLE,
+    CREATE_CHAT_MESSAGES_TABLE,
+    CREATE_AD_POSTS_TABLE,
+    CREATE_OFFERS_TABLE,
+    CREATE_OFFER_PUBLICATIONS_TABLE,
+    CREATE_REVIEWS_TABLE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_schema_version(conn):
+    row = conn.execute("PRAGMA user_version").fetchone()
+    return row['user_version'] if isinstance(row, dict) else row[0]
+
+
+def run_migrations(conn):
+    """Применить недостающие миграции; возвращает список применённых версий."""
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог успеть применить миграцию, пока мы ждали блокировку
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            logger.info(f"  📝 Migration {version}: {description}")
+            func(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        logger.info(f"  ✅ Migration {version} applied")
+    return applied
+
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row['name'] for row in cursor.fetchall()}
+
+
+def _add_missing_columns(cursor, table, columns):
+    existing = _columns(cursor, table)
+    for name, ddl in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+            logger.info(f"    ✅ Added column {name} to {table}")
+
+
+def _retype_columns(cursor, table, columns):
+    """Сменить объявленный тип TEXT-колонок пересозданием таблицы.
+
+    SQLite не меняет тип колонки через ALTER TABLE, поэтому таблица
+    копируется во временную, создаётся заново по исправленному CREATE из
+    sqlite_master и заполняется обратно. columns: {колонка: (новое
+    объявление, SQL-выражение над старым значением с {} на месте колонки)}.
+    Индексы и триггеры таблицы пересоздаются, счётчик AUTOINCREMENT
+    сохраняется. Внешние ключи в соединениях не включены, поэтому DROP
+    не каскадирует на зависимые таблицы.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    create_sql = cursor.fetchone()['sql']
+
+    retyped = {}
+    for name, (ddl, expression) in columns.items():
+        pattern = re.compile(rf'(?<![\w"]){name}\s+TEXT(\s+DEFAULT\s+(\'[^\']*\'|[\w.-]+))?', re.IGNORECASE)
+        create_sql, replaced = pattern.subn(f"{name} {ddl}", create_sql)
+        if replaced:
+            retyped[name] = expression
+    if not retyped:
+        return
+
+    table_columns = [row['name'] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+    cursor.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """, (table,))
+    dependents = [row['sql'] for row in cursor.fetchall()]
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    sequence = cursor.fetchone()
+
+    column_list = ', '.join(f'"{name}"' for name in table_columns)
+    select_list = ', '.join(
+        retyped[name].format(f'"{name}"') if name in retyped else f'"{name}"'
+        for name in table_columns
+    )
+    cursor.execute(f"CREATE TEMP TABLE _retype_{table} AS SELECT * FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {select_list} FROM temp._retype_{table}")
+    cursor.execute(f"DROP TABLE temp._retype_{table}")
+    for sql in dependents:
+        cursor.execute(sql)
+    if sequence:
+        cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (sequence['seq'], table))
+
+    logger.info(f"    ✅ Retyped {', '.join(retyped)} in {table}")
+
+
+@migration(1, 'baseline schema')
+def _baseline_schema(cursor):
+    # База могла быть создана до появления миграций: все CREATE идемпотентны,
+    # а недостающие колонки старых таблиц добавляются ниже
+    for ddl in (
+        CREATE_USERS_TABLE,
+        CREATE_ORDERS_TABLE,
+        CREATE_ADVERTISEMENTS_TABLE,
+        CREATE_BLOGGER_APPLICATIONS_TABLE,
+        CREATE_BLOGGER_SCHEDULE_TABLE,
+        CREATE_CHAT_MESSAGES_TABLE,
+        CREATE_AD_POSTS_TABLE,
+        CREATE_OFFERS_TABLE,
+        CREATE_OFFER_PUBLICATIONS_TABLE,
+        CREATE_REVIEWS_TABLE,
+    ):
+        cursor.execute(ddl)
+
+    from .escrow_model import EscrowTransaction
+    from .withdrawal_model import WithdrawalModel
+    from .notification_outbox import NotificationOutbox
+    EscrowTransaction.create_table(cursor)
+    WithdrawalModel.create_table(cursor)
+    NotificationOutbox.create_table(cursor)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blogger_channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            channel_link TEXT NOT NULL,
+            channel_id TEXT DEFAULT '',
+            channel_name TEXT DEFAULT '',
+            channel_photo_url TEXT DEFAULT '',
+            subscribers_count TEXT DEFAULT '0',
+            price TEXT DEFAULT '',
+            price_permanent TEXT DEFAULT '',
+            topic_group_key TEXT DEFAULT '',
+            topic_group_title TEXT DEFAULT '',
+            topic_sub_key TEXT DEFAULT '',
+            topic_sub_title TEXT DEFAULT '',
+            is_active INTEGER DEFAULT 1,
+            is_verified INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS channel_schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER NOT NULL,
+            weekday_short TEXT NOT NULL,
+            from_time TEXT NOT NULL,
+            to_time TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (channel_id) REFERENCES blogger_channels (id) ON DELETE CASCADE
+        )
+    """)
+
+    # Платёжные таблицы раньше создавались прямо в обработчиках платежей
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payment_id TEXT UNIQUE NOT NULL,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            currency TEXT DEFAULT 'RUB',
+            status TEXT NOT NULL,
+            description TEXT,
+            confirmation_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            paid_at TIMESTAMP,
+            metadata TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments(user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_payment_id ON payments(payment_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ton_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_rub REAL NOT NULL,
+            amount_ton REAL NOT NULL,
+            amount_nano INTEGER NOT NULL,
+            ton_price REAL NOT NULL,
+            receiver_wallet TEXT NOT NULL,
+            tx_hash TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            payload TEXT,
+            created_at TEXT NOT NULL,
+            completed_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ton_payments_user_id ON ton_payments(user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ton_payments_tx_hash ON ton_payments(tx_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ton_payments_status ON ton_payments(status)")
+
+    # Премиум-посты и FSM-состояния бота использовались, но нигде не создавались
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS premium_post_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            status TEXT DEFAULT 'waiting',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS premium_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            post_text TEXT,
+            post_images TEXT DEFAULT '[]',
+            telegram_message_id INTEGER,
+            telegram_chat_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bot_fsm_states (
+            user_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            data TEXT DEFAULT '{}',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Колонки, добавленные в таблицы после их первого выпуска
+    _add_missing_columns(cursor, 'users', [
+        ('user_type', "TEXT DEFAULT 'user'"),
+        ('blogger_photo_url', "TEXT DEFAULT ''"),
+        ('blogger_price', "TEXT DEFAULT ''"),
+        ('blogger_price_permanent', "TEXT DEFAULT ''"),
+        ('blogger_subscribers', "TEXT DEFAULT ''"),
+        ('blogger_is_active', "INTEGER DEFAULT 0"),
+        ('referrer_id', "INTEGER"),
+        ('referral_commission_generated', "REAL DEFAULT 0.0"),
+        ('referral_commission_received', "REAL DEFAULT 0.0"),
+    ])
+    _add_missing_columns(cursor, 'blogger_applications', [
+        ('channel_id', "TEXT DEFAULT ''"),
+        ('rejection_reason', "TEXT DEFAULT ''"),
+        ('submitted_for_review', "INTEGER DEFAULT 0"),
+        ('channel_photo_url', "TEXT DEFAULT ''"),
+        ('topic_group_key', "TEXT DEFAULT ''"),
+        ('topic_group_title', "TEXT DEFAULT ''"),
+        ('topic_sub_key', "TEXT DEFAULT ''"),
+        ('topic_sub_title', "TEXT DEFAULT ''"),
+    ])
+    _add_missing_columns(cursor, 'blogger_channels', [
+        ('price_permanent', "TEXT DEFAULT ''"),
+    ])
+    _add_missing_columns(cursor, 'ad_posts', [
+        ('channel_id', "INTEGER DEFAULT NULL"),
+        ('telegram_message_ids', "TEXT DEFAULT ''"),
+        ('created_from_offer', "INTEGER DEFAULT 0"),
+        ('posted_at', "TIMESTAMP"),
+        ('deleted_at', "TIMESTAMP"),
+        ('is_premium_post', "INTEGER DEFAULT 0"),
+        ('premium_message_id', "INTEGER DEFAULT NULL"),
+        ('premium_chat_id', "INTEGER DEFAULT NULL"),
+    ])
+    _add_missing_columns(cursor, 'offer_publications', [
+        ('status', "TEXT DEFAULT 'active'"),
+    ])
+    _add_missing_columns(cursor, 'chat_messages', [
+        ('message_type', "TEXT DEFAULT 'text'"),
+        ('metadata', "TEXT DEFAULT ''"),
+        ('channel_id', "INTEGER DEFAULT NULL"),
+    ])
+    _add_missing_columns(cursor, 'reviews', [
+        ('review_text', "TEXT"),
+    ])
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_reviewed_id ON reviews(reviewed_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_reviewer_id ON reviews(reviewer_id)")
+
+    # Разовые исправления данных, которые раньше выполнялись при каждом старте
+    cursor.execute("""
+        UPDATE blogger_applications
+        SET channel_photo_url = (
+            SELECT blogger_photo_url
+            FROM users
+            WHERE users.user_id = blogger_applications.user_id
+        )
+        WHERE (channel_photo_url IS NULL OR channel_photo_url = '')
+        AND status = 'approved'
+        AND EXISTS (
+            SELECT 1 FROM users
+            WHERE users.user_id = blogger_applications.user_id
+            AND users.blogger_photo_url IS NOT NULL
+            AND users.blogger_photo_url != ''
+        )
+    """)
+    cursor.execute("""
+        UPDATE blogger_channels
+        SET subscribers_count = '0'
+        WHERE subscribers_count = '' OR subscribers_count IS NULL
+    """)
+
+
+@migration(2, 'indexes for hot query shapes')
+def _hot_query_indexes(cursor):
+    # Каждый индекс закрывает конкретные запросы; проверка планов:
+    # python database/check_query_plans.py
+    indexes = (
+        # Счётчики непрочитанных, поиск системных сообщений получателя,
+        # правая ветка "sender_id = ? OR receiver_id = ?" в списке чатов
+        "idx_chat_messages_receiver_unread ON chat_messages(receiver_id, is_read)",
+        # Переписка пары в канале по времени, mark_as_read, левая ветка OR
+        "idx_chat_messages_pair ON chat_messages(sender_id, receiver_id, channel_id, created_at)",
+
+        # process_scheduled_ad_posts_once: публикация и удаление по расписанию
+        "idx_ad_posts_status_scheduled ON ad_posts(status, scheduled_time)",
+        "idx_ad_posts_status_delete ON ad_posts(status, delete_time)",
+        # check_ad_post_slot и заявки блогера на подтверждение
+        "idx_ad_posts_blogger_status ON ad_posts(blogger_id, status, scheduled_time)",
+        # История заказов покупателя и посты в чате
+        "idx_ad_posts_buyer ON ad_posts(buyer_id, created_at)",
+
+        "idx_users_referrer ON users(referrer_id, created_at)",
+        # Поиск пользователя по @username в админ-командах бота
+        "idx_users_username_lower ON users(LOWER(username))",
+
+        "idx_blogger_channels_user ON blogger_channels(user_id, created_at)",
+        # Каталог блогеров читает только активные проверенные каналы
+        "idx_blogger_channels_listed ON blogger_channels(id, user_id) WHERE is_active = 1 AND is_verified = 1",
+
+        "idx_blogger_applications_user ON blogger_applications(user_id, created_at)",
+
+        "idx_offers_user ON offers(user_id, created_at)",
+        "idx_offers_created ON offers(created_at)",
+        "idx_offer_publications_blogger ON offer_publications(blogger_id)",
+        "idx_offer_publications_offer ON offer_publications(offer_id)",
+
+        "idx_orders_user ON orders(user_id, created_at)",
+        "idx_advertisements_user_status ON advertisements(user_id, status, created_at)",
+
+        "idx_notification_outbox_sent ON notification_outbox(sent_at) WHERE status = 'sent'",
+    )
+    for index in indexes:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index}")
+
+
+# Колонки, от которых зависит карточка канала в каталоге (database/catalog.py)
+CATALOG_CHANNEL_COLUMNS = (
+    'user_id', 'channel_name', 'channel_link', 'channel_id', 'channel_photo_url',
+    'subscribers_count', 'price', 'price_permanent', 'topic_group_key',
+    'topic_sub_key', 'topic_sub_title', 'is_active', 'is_verified',
+)
+CATALOG_USER_COLUMNS = ('username', 'first_name', 'last_name', 'user_type')
+
+
+def _create_catalog_triggers(cursor):
+    """Триггеры, помечающие каналы каталога устаревшими (catalog_dirty)."""
+    mark_user_channels = (
+        "INSERT OR IGNORE INTO catalog_dirty (channel_id) "
+        "SELECT id FROM blogger_channels WHERE user_id = {}"
+    )
+    triggers = {
+        'trg_catalog_channel_insert': """
+            AFTER INSERT ON blogger_channels BEGIN
+                INSERT OR IGNORE INTO catalog_dirty (channel_id) VALUES (NEW.id);
+            END""",
+        'trg_catalog_channel_update': f"""
+            AFTER UPDATE OF {', '.join(CATALOG_CHANNEL_COLUMNS)} ON blogger_channels BEGIN
+                INSERT OR IGNORE INTO catalog_dirty (channel_id) VALUES (NEW.id);
+            END""",
+        'trg_catalog_channel_delete': """
+            AFTER DELETE ON blogger_channels BEGIN
+                INSERT OR IGNORE INTO catalog_dirty (channel_id) VALUES (OLD.id);
+            END""",
+        'trg_catalog_user_update': f"""
+            AFTER UPDATE OF {', '.join(CATALOG_USER_COLUMNS)} ON users BEGIN
+                {mark_user_channels.format('NEW.user_id')};
+            END""",
+        'trg_catalog_review_insert': f"""
+            AFTER INSERT ON reviews BEGIN
+                {mark_user_channels.format('NEW.reviewed_id')};
+            END""",
+        'trg_catalog_review_update': f"""
+            AFTER UPDATE OF rating, review_type, reviewed_id ON reviews BEGIN
+                {mark_user_channels.format('OLD.reviewed_id')};
+                {mark_user_channels.format('NEW.reviewed_id')};
+            END""",
+        'trg_catalog_review_delete': f"""
+            AFTER DELETE ON reviews BEGIN
+                {mark_user_channels.format('OLD.reviewed_id')};
+            END""",
+    }
+    for name, body in triggers.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {body}")
+
+
+@migration(3, 'materialized blogger catalog')
+def _blogger_catalog(cursor):
+    # Готовые карточки активных проверенных каналов для /api/bloggers/list
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blogger_catalog (
+            channel_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL DEFAULT '',
+            topic_group_key TEXT,
+            topic_sub_key TEXT,
+            price REAL NOT NULL DEFAULT 0,
+            subscribers INTEGER NOT NULL DEFAULT 0,
+            rating REAL NOT NULL DEFAULT 0,
+            payload TEXT NOT NULL,
+            rev INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    # Снимок в процессе дочитывает только карточки новее своей ревизии
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_blogger_catalog_rev ON blogger_catalog(rev)")
+    # Каналы, карточки которых нужно пересобрать
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_dirty (
+            channel_id INTEGER PRIMARY KEY
+        )
+    """)
+    # Номер версии каталога; растёт при каждом применённом обновлении
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blogger_catalog_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            rev INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO blogger_catalog_state (id, rev) VALUES (1, 0)")
+
+    _create_catalog_triggers(cursor)
+
+    # Первое обращение к каталогу соберёт все карточки
+    cursor.execute("INSERT OR IGNORE INTO catalog_dirty (channel_id) SELECT id FROM blogger_channels")
+
+
+@migration(4, 'blogger catalog sort columns and indexes')
+def _blogger_catalog_sorting(cursor):
+    # Цена за подписчика для сортировки; NULL у каналов без подписчиков
+    _add_missing_columns(cursor, 'blogger_catalog', (('price_per_subscriber', 'REAL'),))
+    cursor.execute("""
+        UPDATE blogger_catalog
+        SET price_per_subscriber = CASE WHEN subscribers > 0 THEN price / subscribers END
+    """)
+
+    # Keyset-пагинация: (ключ сортировки, channel_id) для всего каталога
+    # и с префиксом тематики для выборки по одной подтеме
+    indexes = []
+    for column in ('price', 'subscribers', 'rating', 'price_per_subscriber'):
+        indexes.append(f"idx_blogger_catalog_{column} ON blogger_catalog({column}, channel_id)")
+        indexes.append(
+            f"idx_blogger_catalog_topic_{column} "
+            f"ON blogger_catalog(topic_group_key, topic_sub_key, {column}, channel_id)"
+        )
+    indexes.append("idx_blogger_catalog_topic ON blogger_catalog(topic_group_key, topic_sub_key, channel_id)")
+    for index in indexes:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index}")
+
+
+@migration(5, 'typed numeric prices and subscriber counts')
+def _typed_prices_and_subscribers(cursor):
+    # Цены в рублях (REAL, NULL - не указана), подписчики - INTEGER.
+    # Старые значения вида "1 500", "12K" разбираются один раз здесь
+    from utils.numbers import parse_count, parse_price
+
+    conn = cursor.connection
+    conn.create_function('parse_count', 1, parse_count, deterministic=True)
+    conn.create_function('parse_price', 1, parse_price, deterministic=True)
+
+    _retype_columns(cursor, 'blogger_channels', {
+        'subscribers_count': ('INTEGER NOT NULL DEFAULT 0', 'parse_count({})'),
+        'price': ('REAL', 'parse_price({})'),
+        'price_permanent': ('REAL', 'parse_price({})'),
+    })
+    _retype_columns(cursor, 'users', {
+        'blogger_price': ('REAL', 'parse_price({})'),
+        'blogger_price_permanent': ('REAL', 'parse_price({})'),
+        'blogger_subscribers': ('INTEGER NOT NULL DEFAULT 0', 'parse_count({})'),
+    })
+
+    # Цены вида "1 500" раньше давали в карточке raw_price = 0 - пересобираем
+    cursor.execute("INSERT OR IGNORE INTO catalog_dirty (channel_id) SELECT id FROM blogger_channels")
+
+
+@migration(6, 'rating aggregates')
+def _rating_stats(cursor):
+    # Число отзывов, сумма и гистограмма оценок; ведёт RatingStats.record_review
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rating_stats (
+            reviewed_id INTEGER NOT NULL,
+            review_type TEXT NOT NULL,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_1 INTEGER NOT NULL DEFAULT 0,
+            rating_2 INTEGER NOT NULL DEFAULT 0,
+            rating_3 INTEGER NOT NULL DEFAULT 0,
+            rating_4 INTEGER NOT NULL DEFAULT 0,
+            rating_5 INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (reviewed_id, review_type)
+        ) WITHOUT ROWID
+    """)
+    # Лента отзывов блогера от новых к старым
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_reviewed_type ON reviews(reviewed_id, review_type, id)")
+
+    # Агрегаты по уже оставленным отзывам
+    cursor.execute("""
+        INSERT INTO rating_stats (
+            reviewed_id, review_type, review_count, rating_sum,
+            rating_1, rating_2, rating_3, rating_4, rating_5, updated_at
+        )
+        SELECT reviewed_id, review_type, COUNT(*), SUM(rating),
+               SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+               CURRENT_TIMESTAMP
+        FROM reviews
+        GROUP BY reviewed_id, review_type
+    """)
+
+
+@migration(7, 'normalized channel usernames')
+def _channel_usernames(cursor):
+    # @username из channel_link считается при записи ссылки; здесь - для старых строк
+    from utils.channel_links import extract_channel_username
+
+    cursor.connection.create_function('extract_channel_username', 1, extract_channel_username, deterministic=True)
+    for table in ('blogger_channels', 'blogger_applications'):
+        _add_missing_columns(cursor, table, (('channel_username', 'TEXT'),))
+        cursor.execute(f"UPDATE {table} SET channel_username = extract_channel_username(channel_link)")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_username ON {table}(channel_username COLLATE NOCASE)"
+        )
+
+
+@migration(8, 'full-text channel search')
+def _blogger_search(cursor):
+    # Названия групп тематик из utils.topics: в blogger_channels хранится
+    # только ключ группы, а искать нужно и по русскому названию
+    from utils.topics import TOPIC_GROUPS
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS topic_groups (
+            key TEXT PRIMARY KEY,
+            title TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.executemany(
+        "INSERT OR REPLACE INTO topic_groups (key, title) VALUES (?, ?)",
+        [(key, group['title']) for key, group in TOPIC_GROUPS.items()]
+    )
+
+    # FTS5 с внешним содержимым: текст не дублируется, индекс читает
+    # строки из представления (rebuild, snippet), а триггеры передают ему
+    # старые и новые значения. prefix='2 3' - готовые индексы префиксов
+    # для поиска по мере набора
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS blogger_search_source AS
+        SELECT bc.id, bc.channel_name, bc.channel_username, bc.topic_sub_title,
+               tg.title AS topic_group_title
+        FROM blogger_channels bc
+        LEFT JOIN topic_groups tg ON tg.key = bc.topic_group_key
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS blogger_search USING fts5(
+            channel_name, channel_username, topic_sub_title, topic_group_title,
+            content='blogger_search_source', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    # Вес совпадения: имя канала важнее @username, тот - важнее тематики
+    cursor.execute("INSERT INTO blogger_search (blogger_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0, 1.0)')")
+
+    new_values = """
+            new.id, new.channel_name, new.channel_username, new.topic_sub_title,
+            (SELECT title FROM topic_groups WHERE key = new.topic_group_key)
+    """
+    old_values = """
+            'delete', old.id, old.channel_name, old.channel_username, old.topic_sub_title,
+            (SELECT title FROM topic_groups WHERE key = old.topic_group_key)
+    """
+    columns = "rowid, channel_name, channel_username, topic_sub_title, topic_group_title"
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_blogger_search_insert
+        AFTER INSERT ON blogger_channels
+        BEGIN
+            INSERT INTO blogger_search ({columns}) VALUES ({new_values});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_blogger_search_delete
+        AFTER DELETE ON blogger_channels
+        BEGIN
+            INSERT INTO blogger_search (blogger_search, {columns}) VALUES ({old_values});
+        END
+    """)
+    # Цены и подписчики меняются часто и в индекс не входят
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_blogger_search_update
+        AFTER UPDATE OF channel_name, channel_username, topic_sub_title, topic_group_key ON blogger_channels
+        BEGIN
+            INSERT INTO blogger_search (blogger_search, {columns}) VALUES ({old_values});
+            INSERT INTO blogger_search ({columns}) VALUES ({new_values});
+        END
+    """)
+
+    cursor.execute("INSERT INTO blogger_search (blogger_search) VALUES ('rebuild')")
+
+
+@migration(9, 'table change counters')
+def _table_versions(cursor):
+    # Счётчик изменений на таблицу для ETag (utils/http_cache.py). Для users
+    # учитываются только поля профиля, которые попадают в ответы (имя и
+    # аватар автора отзыва): баланс и прочие служебные поля меняются часто
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    versioned = {
+        'reviews': None,
+        'blogger_schedules': None,
+        'offers': None,
+        'users': 'first_name, last_name, username, photo_url',
+    }
+    for table, update_columns in versioned.items():
+        cursor.execute("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (table,))
+        update_event = f"UPDATE OF {update_columns}" if update_columns else "UPDATE"
+        for name, event in (('insert', 'INSERT'), ('update', update_event), ('delete', 'DELETE')):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{name}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            """)
+
+
+@migration(10, 'media cache')
+def _media_cache(cursor):
+    # Файлы медиакэша по sha256 содержимого (utils/media_cache.py) и
+    # соответствие file_unique_id Telegram -> файл, чтобы не скачивать повторно
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS media_files (
+            sha256 TEXT PRIMARY KEY,
+            ext TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS telegram_files (
+            file_unique_id TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+
+    # Карточки без фото переходят с ui-avatars.com на локальные аватары
+    cursor.execute("INSERT OR IGNORE INTO catalog_dirty (channel_id) SELECT id FROM blogger_channels")
+
+
+@migration(11, 'conversation index')
+def _conversations(cursor):
+    # Последнее сообщение и непрочитанные по чатам; ведёт ChatMessage
+    # (database/conversation_model.py), channel_id = 0 - чат без канала
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            user_id INTEGER NOT NULL,
+            contact_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL DEFAULT 0,
+            last_message_id INTEGER NOT NULL,
+            last_sender_id INTEGER NOT NULL,
+            preview TEXT NOT NULL DEFAULT '',
+            last_message_time TIMESTAMP,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, contact_id, channel_id)
+        ) WITHOUT ROWID
+    """)
+    # Список чатов пользователя от свежих к старым
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_time ON conversations(user_id, last_message_time)")
+
+    # Чаты по уже отправленным сообщениям: каждое сообщение попадает в чат
+    # отправителя и в чат получателя, непрочитанные считаются получателю;
+    # превью - первые 100 символов
+    cursor.execute("""
+        INSERT INTO conversations (
+            user_id, contact_id, channel_id, last_message_id, last_sender_id,
+            preview, last_message_time, unread_count
+        )
+        SELECT s.user_id, s.contact_id, s.channel_id, cm.id, cm.sender_id,
+               substr(cm.message, 1, 100), cm.created_at, s.unread_count
+        FROM (
+            SELECT user_id, contact_id, channel_id,
+                   MAX(id) AS last_message_id, SUM(unread) AS unread_count
+            FROM (
+                SELECT sender_id AS user_id, receiver_id AS contact_id,
+                       COALESCE(channel_id, 0) AS channel_id, id, 0 AS unread
+                FROM chat_messages
+                UNION ALL
+                SELECT receiver_id, sender_id, COALESCE(channel_id, 0), id, is_read = 0
+                FROM chat_messages
+            )
+            GROUP BY user_id, contact_id, channel_id
+        ) s
+        JOIN chat_messages cm ON cm.id = s.last_message_id
+    """)
+
+
+@migration(12, 'chat thread index')
+def _chat_thread_index(cursor):
+    # Переписка пары в обе стороны одним диапазоном: пара без учёта
+    # направления, канал (0 - без канала) и id для курсоров
+    # ChatMessage.get_conversation
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_thread ON chat_messages(
+            min(sender_id, receiver_id), max(sender_id, receiver_id), COALESCE(channel_id, 0), id
+        )
+    """)
+
+
+@migration(13, 'user event stream')
+def _user_events(cursor):
+    # События для /api/stream (database/user_events.py); created_at - unix time
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            created_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        )
+    """)
+    # Досылка пропущенного при переподключении и очистка старых событий
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_events_user ON user_events(user_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_events_created ON user_events(created_at)")
+
+    message = "json_object('message_id', NEW.id, 'sender_id', NEW.sender_id, " \
+              "'receiver_id', NEW.receiver_id, 'channel_id', NEW.channel_id)"
+    unread = "json_object('unread_count', (SELECT SUM(unread_count) FROM conversations WHERE user_id = NEW.user_id))"
+    ad_post = "json_object('post_id', NEW.id, 'status', NEW.status, 'channel_id', NEW.channel_id, " \
+              "'buyer_id', NEW.buyer_id, 'blogger_id', NEW.blogger_id)"
+    triggers = {
+        'trg_chat_messages_event': ("AFTER INSERT ON chat_messages", [
+            ('NEW.receiver_id', 'chat_message', message, None),
+            ('NEW.sender_id', 'chat_message', message, 'NEW.sender_id != NEW.receiver_id'),
+        ]),
+        'trg_conversations_event_insert': ("AFTER INSERT ON conversations WHEN NEW.unread_count > 0", [
+            ('NEW.user_id', 'unread', unread, None),
+        ]),
+        'trg_conversations_event_update': (
+            "AFTER UPDATE OF unread_count ON conversations WHEN NEW.unread_count != OLD.unread_count", [
+                ('NEW.user_id', 'unread', unread, None),
+            ]),
+        'trg_users_event_balance': ("AFTER UPDATE OF balance ON users WHEN NEW.balance IS NOT OLD.balance", [
+            ('NEW.user_id', 'balance', "json_object('balance', NEW.balance)", None),
+        ]),
+        'trg_ad_posts_event_insert': ("AFTER INSERT ON ad_posts", [
+            ('NEW.buyer_id', 'ad_post', ad_post, None),
+            ('NEW.blogger_id', 'ad_post', ad_post, 'NEW.blogger_id != NEW.buyer_id'),
+        ]),
+        'trg_ad_posts_event_status': ("AFTER UPDATE OF status ON ad_posts WHEN NEW.status IS NOT OLD.status", [
+            ('NEW.buyer_id', 'ad_post', ad_post, None),
+            ('NEW.blogger_id', 'ad_post', ad_post, 'NEW.blogger_id != NEW.buyer_id'),
+        ]),
+        'trg_payments_event_status': ("AFTER UPDATE OF status ON payments WHEN NEW.status IS NOT OLD.status", [
+            ('NEW.user_id', 'payment', "json_object('payment_id', NEW.payment_id, 'status', NEW.status)", None),
+        ]),
+        'trg_ton_payments_event_status': ("AFTER UPDATE OF status ON ton_payments WHEN NEW.status IS NOT OLD.status", [
+            ('NEW.user_id', 'ton_payment', "json_object('payment_id', NEW.id, 'status', NEW.status)", None),
+        ]),
+        'trg_premium_posts_event': ("AFTER INSERT ON premium_posts", [
+            ('NEW.user_id', 'premium_post', "json_object('post_id', NEW.id, 'session_id', NEW.session_id)", None),
+        ]),
+    }
+    for name, (event, inserts) in triggers.items():
+        statements = []
+        for user_id, kind, payload, condition in inserts:
+            where = f" WHERE {condition}" if condition else ''
+            statements.append(
+                f"INSERT INTO user_events (user_id, kind, payload) SELECT {user_id}, '{kind}', {payload}{where};"
+            )
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {event}
+            BEGIN
+                {' '.join(statements)}
+            END
+        """)
+
+
+@migration(14, 'chat notification coalescing')
+def _notification_coalescing(cursor):
+    # Уведомления с одинаковым coalesce_key бот отправляет одним сообщением
+    # (сейчас - new_message по получателю, NotificationOutbox.get_coalesced)
+    _add_missing_columns(cursor, 'notification_outbox', [('coalesce_key', 'TEXT')])
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_coalesce
+        ON notification_outbox(kind, coalesce_key)
+        WHERE status = 'pending'
+    """)
+
+
+@migration(15, 'drop unused TON payment events')
+def _drop_ton_payment_events(cursor):
+    # TON-платёж завершается синхронно в /api/payment/ton/confirm, поток
+    # событий его статус никому не доставлял
+    cursor.execute("DROP TRIGGER IF EXISTS trg_ton_payments_event_status")
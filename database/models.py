@@ -1,6 +1,14 @@
 
 
-import sqlite3
+import json
+import logging
+
+from utils.channel_links import extract_channel_username
+
+from .conversation_model import Conversation
+from .rows import row_to_dict, rows_to_dicts
+
+logger = logging.getLogger(__name__)
 
 CREATE_USERS_TABLE = """
 CREATE TABLE IF NOT EXISTS users (
@@ -260,7 +268,7 @@ class User:
         cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
     
 
@@ -346,7 +354,7 @@ class Order:
             ORDER BY created_at DESC 
             LIMIT ?
         """, (user_id, limit))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
     
     @staticmethod
     def get_order_count(cursor, user_id):
@@ -387,7 +395,7 @@ class Advertisement:
             WHERE user_id = ? AND status = 'active'
             ORDER BY created_at DESC
         """, (user_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
     
 
 
@@ -434,9 +442,9 @@ class BloggerApplication:
     def create(cursor, user_id, channel_link):
       
         cursor.execute("""
-            INSERT INTO blogger_applications (user_id, channel_link, status)
-            VALUES (?, ?, 'pending')
-        """, (user_id, channel_link))
+            INSERT INTO blogger_applications (user_id, channel_link, channel_username, status)
+            VALUES (?, ?, ?, 'pending')
+        """, (user_id, channel_link, extract_channel_username(channel_link)))
         return cursor.lastrowid
     
     @staticmethod
@@ -450,7 +458,7 @@ class BloggerApplication:
         """, (user_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
     
 
@@ -499,71 +507,100 @@ class BloggerApplication:
         """, (application_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
 
 
+# Страница истории чата по умолчанию и максимум для ?limit=
+CHAT_PAGE_SIZE = 50
+MAX_CHAT_PAGE_SIZE = 100
+
+
 class ChatMessage:
   
     
     @staticmethod
-    def create(cursor, sender_id, receiver_id, message, channel_id=None):
-       
+    def create(cursor, sender_id, receiver_id, message, channel_id=None, message_type='text', metadata=''):
+        """Сохранить сообщение и обновить список чатов обеих сторон (Conversation)."""
         cursor.execute("""
-            INSERT INTO chat_messages (sender_id, receiver_id, message, channel_id)
-            VALUES (?, ?, ?, ?)
-        """, (sender_id, receiver_id, message, channel_id))
-        return cursor.lastrowid
-    
-    @staticmethod
-    def get_conversation(cursor, user1_id, user2_id, channel_id=None, limit=50):
-  
-        if channel_id is not None:
-       
-            cursor.execute("""
-                SELECT cm.*, 
-                       u1.first_name as sender_first_name, 
-                       u1.last_name as sender_last_name,
-                       u1.username as sender_username,
-                       u2.first_name as receiver_first_name,
-                       u2.last_name as receiver_last_name,
-                       u2.username as receiver_username
-                FROM chat_messages cm
-                LEFT JOIN users u1 ON cm.sender_id = u1.user_id
-                LEFT JOIN users u2 ON cm.receiver_id = u2.user_id
-                WHERE ((cm.sender_id = ? AND cm.receiver_id = ?) 
-                   OR (cm.sender_id = ? AND cm.receiver_id = ?))
-                   AND cm.channel_id = ?
-                ORDER BY cm.created_at DESC
-                LIMIT ?
-            """, (user1_id, user2_id, user2_id, user1_id, channel_id, limit))
-        else:
-          
+            INSERT INTO chat_messages (sender_id, receiver_id, message, message_type, metadata, channel_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (sender_id, receiver_id, message, message_type, metadata, channel_id))
+        message_id = cursor.lastrowid
+        Conversation.record_message(cursor, message_id)
+        return message_id
+    
+    @staticmethod
+    def get_conversation(cursor, user1_id, user2_id, channel_id=None, limit=50, before_id=None, after_id=None):
+        """Страница переписки пары в канале, по возрастанию id.
+
+        Без курсоров - последние limit сообщений; before_id - limit сообщений
+        перед ним (подгрузка истории); after_id - первые limit сообщений после
+        него (новые с прошлого обновления). Условие на пару и канал записано
+        теми же выражениями, что и idx_chat_messages_thread, поэтому обе
+        стороны переписки читаются одним диапазоном индекса по id.
+        """
+        conditions = [
+            "min(cm.sender_id, cm.receiver_id) = ?",
+            "max(cm.sender_id, cm.receiver_id) = ?",
+            "COALESCE(cm.channel_id, 0) = ?",
+        ]
+        params = [min(user1_id, user2_id), max(user1_id, user2_id), channel_id or 0]
+        if before_id is not None:
+            conditions.append("cm.id < ?")
+            params.append(before_id)
+        if after_id is not None:
+            conditions.append("cm.id > ?")
+            params.append(after_id)
+        order = 'ASC' if after_id is not None else 'DESC'
+
+        cursor.execute(f"""
+            SELECT cm.*, 
+                   u1.first_name as sender_first_name, 
+                   u1.last_name as sender_last_name,
+                   u1.username as sender_username,
+                   u2.first_name as receiver_first_name,
+                   u2.last_name as receiver_last_name,
+                   u2.username as receiver_username
+            FROM chat_messages cm
+            LEFT JOIN users u1 ON cm.sender_id = u1.user_id
+            LEFT JOIN users u2 ON cm.receiver_id = u2.user_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY cm.id {order}
+            LIMIT ?
+        """, (*params, limit))
 
-            cursor.execute("""
-                SELECT cm.*, 
-                       u1.first_name as sender_first_name, 
-                       u1.last_name as sender_last_name,
-                       u1.username as sender_username,
-                       u2.first_name as receiver_first_name,
-                       u2.last_name as receiver_last_name,
-                       u2.username as receiver_username
-                FROM chat_messages cm
-                LEFT JOIN users u1 ON cm.sender_id = u1.user_id
-                LEFT JOIN users u2 ON cm.receiver_id = u2.user_id
-                WHERE ((cm.sender_id = ? AND cm.receiver_id = ?) 
-                   OR (cm.sender_id = ? AND cm.receiver_id = ?))
-                   AND cm.channel_id IS NULL
-                ORDER BY cm.created_at DESC
-                LIMIT ?
-            """, (user1_id, user2_id, user2_id, user1_id, limit))
-        
-    
-        rows = cursor.fetchall()
-        return [dict(row) for row in reversed(rows)]
+        messages = rows_to_dicts(cursor.fetchall())
+        return messages if after_id is not None else messages[::-1]
     
 
+    @staticmethod
+    def hide_submitted_review_requests(cursor, viewer_id, messages):
+        """Убрать запросы отзыва (system_review), на которые viewer_id уже ответил.
+
+        Отзывы по всем запросам страницы читаются одним запросом по
+        UNIQUE(post_id, reviewer_id, review_type), а не по запросу на сообщение.
+        """
+        prompts = {}
+        for message in messages:
+            if message.get('message_type') != 'system_review' or not message.get('metadata'):
+                continue
+            try:
+                metadata = json.loads(message['metadata']) if isinstance(message['metadata'], str) else message['metadata']
+                prompts[message['id']] = (str(metadata.get('post_id')), metadata.get('review_type'))
+            except Exception as e:
+                logger.error(f"Error checking review status: {str(e)}")
+        if not prompts:
+            return messages
 
+        post_ids = sorted({post_id for post_id, _ in prompts.values()})
+        placeholders = ', '.join('?' * len(post_ids))
+        cursor.execute(f"""
+            SELECT post_id, review_type FROM reviews
+            WHERE reviewer_id = ? AND post_id IN ({placeholders})
+        """, (viewer_id, *post_ids))
+        submitted = {(str(row['post_id']), row['review_type']) for row in cursor.fetchall()}
+        return [message for message in messages if prompts.get(message['id']) not in submitted]
 
     @staticmethod
     def mark_as_read(cursor, sender_id, receiver_id, channel_id=None):
@@ -582,16 +619,11 @@ class ChatMessage:
                 SET is_read = 1
                 WHERE sender_id = ? AND receiver_id = ? AND channel_id IS NULL AND is_read = 0
             """, (sender_id, receiver_id))
+        Conversation.mark_read(cursor, receiver_id, sender_id, channel_id)
     
     @staticmethod
     def get_unread_count(cursor, user_id):
- 
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM chat_messages 
-            WHERE receiver_id = ? AND is_read = 0
-        """, (user_id,))
-        return cursor.fetchone()['count']
+        return Conversation.get_unread_total(cursor, user_id)
 
 
 class AdPost:
@@ -600,65 +632,10 @@ class AdPost:
     @staticmethod
     def create(cursor, buyer_id, blogger_id, post_text, post_images, scheduled_time, delete_time, price, created_from_offer=0, channel_id=None, is_premium_post=0, premium_message_id=None, premium_chat_id=None):
     
-        try:
-            cursor.execute("""
-                INSERT INTO ad_posts (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, status, created_from_offer, is_premium_post, premium_message_id, premium_chat_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
-            """, (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, int(bool(created_from_offer)), int(bool(is_premium_post)), premium_message_id, premium_chat_id))
-        except sqlite3.OperationalError as e:
-          
-
-
-            if "no column named created_from_offer" in str(e):
-                cursor.execute("""
-                    ALTER TABLE ad_posts
-                    ADD COLUMN created_from_offer INTEGER DEFAULT 0
-                """)
-                cursor.execute("""
-                    INSERT INTO ad_posts (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, status, created_from_offer, is_premium_post, premium_message_id, premium_chat_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
-                """, (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, int(bool(created_from_offer)), int(bool(is_premium_post)), premium_message_id, premium_chat_id))
-            elif "no column named channel_id" in str(e):
-                cursor.execute("""
-                    ALTER TABLE ad_posts
-                    ADD COLUMN channel_id INTEGER DEFAULT NULL
-                """)
-                cursor.execute("""
-                    INSERT INTO ad_posts (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, status, created_from_offer, is_premium_post, premium_message_id, premium_chat_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
-                """, (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, int(bool(created_from_offer)), int(bool(is_premium_post)), premium_message_id, premium_chat_id))
-            elif "no column named is_premium_post" in str(e) or "no column named premium_message_id" in str(e) or "no column named premium_chat_id" in str(e):
-             
-                try:
-                    cursor.execute("ALTER TABLE ad_posts ADD COLUMN is_premium_post INTEGER DEFAULT 0")
-                except sqlite3.OperationalError:
-                    pass
-                try:
-
-
-
-            
-                    cursor.execute("ALTER TABLE ad_posts ADD COLUMN premium_message_id INTEGER DEFAULT NULL")
-                except sqlite3.OperationalError:
-
-
-
-
-
-
-                    pass
-                try:
-
-                    cursor.execute("ALTER TABLE ad_posts ADD COLUMN premium_chat_id INTEGER DEFAULT NULL")
-                except sqlite3.OperationalError:
-                    pass
-
-                cursor.execute("""
-                    INSERT INTO ad_posts (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, status, created_from_offer, is_premium_post, premium_message_id, premium_chat_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
-                """, (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, int(bool(created_from_offer)), int(bool(is_premium_post)), premium_message_id, premium_chat_id))
-            else:
-                raise
+        cursor.execute("""
+            INSERT INTO ad_posts (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, status, created_from_offer, is_premium_post, premium_message_id, premium_chat_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
+        """, (buyer_id, blogger_id, channel_id, post_text, post_images, scheduled_time, delete_time, price, int(bool(created_from_offer)), int(bool(is_premium_post)), premium_message_id, premium_chat_id))
         return cursor.lastrowid
     
     @staticmethod
@@ -679,7 +656,7 @@ class AdPost:
         """, (post_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
     
 
@@ -711,7 +688,7 @@ class AdPost:
             WHERE ap.blogger_id = ? AND ap.status = 'pending'
             ORDER BY ap.created_at DESC
         """, (blogger_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
 
 
 class Offer:
@@ -736,7 +713,7 @@ class Offer:
         """, (offer_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
     
 
@@ -749,7 +726,7 @@ class Offer:
             ORDER BY created_at DESC
             LIMIT ?
         """, (user_id, limit))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
 
     @staticmethod
     def get_all_offers(cursor, limit=50):
@@ -759,7 +736,7 @@ class Offer:
             ORDER BY created_at DESC
             LIMIT ?
         """, (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        return rows_to_dicts(cursor.fetchall())
 
 
 class OfferPublication:
@@ -768,24 +745,10 @@ class OfferPublication:
     @staticmethod
     def create(cursor, offer_id, blogger_id, scheduled_time):
       
-        try:
-            cursor.execute("""
-                INSERT INTO offer_publications (offer_id, blogger_id, scheduled_time, status)
-                VALUES (?, ?, ?, 'active')
-            """, (offer_id, blogger_id, scheduled_time))
-        except sqlite3.OperationalError as e:
-       
-            if "no column named status" in str(e):
-                cursor.execute("""
-                    ALTER TABLE offer_publications
-                    ADD COLUMN status TEXT DEFAULT 'active'
-                """)
-                cursor.execute("""
-                    INSERT INTO offer_publications (offer_id, blogger_id, scheduled_time, status)
-                    VALUES (?, ?, ?, 'active')
-                """, (offer_id, blogger_id, scheduled_time))
-            else:
-                raise
+        cursor.execute("""
+            INSERT INTO offer_publications (offer_id, blogger_id, scheduled_time, status)
+            VALUES (?, ?, ?, 'active')
+        """, (offer_id, blogger_id, scheduled_time))
         return cursor.lastrowid
 
 
@@ -800,7 +763,7 @@ class OfferPublication:
         """, (proposal_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return row_to_dict(row)
         return None
 
 
@@ -821,25 +784,11 @@ class OfferPublication:
     @staticmethod
     def update_status(cursor, proposal_id, status):
   
-        try:
-            cursor.execute("""
-                UPDATE offer_publications
-                SET status = ?
-                WHERE id = ?
-            """, (status, proposal_id))
-        except sqlite3.OperationalError as e:
-            if "no column named status" in str(e):
-                cursor.execute("""
-                    ALTER TABLE offer_publications
-                    ADD COLUMN status TEXT DEFAULT 'active'
-                """)
-                cursor.execute("""
-                    UPDATE offer_publications
-                    SET status = ?
-                    WHERE id = ?
-                """, (status, proposal_id))
-            else:
-                raise
+        cursor.execute("""
+            UPDATE offer_publications
+            SET status = ?
+            WHERE id = ?
+        """, (status, proposal_id))
 
 
 
@@ -864,6 +813,6 @@ class OfferPublication:
             ORDER BY op.created_at ASC
         """, (user_id, partner_id, partner_id, user_id))
         rows = cursor.fetchall() or []
-        return [dict(row) for row in rows]
+        return rows_to_dicts(rows)
 
 
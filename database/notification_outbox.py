@@ -0,0 +1,174 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _notification(row):
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'payload': json.loads(row['payload'] or '{}'),
+        'attempts': row['attempts'],
+        'created_at': row['created_at'],
+    }
+
+
+class NotificationOutbox:
+    """Очередь Telegram-уведомлений, созданных веб-обработчиками.
+
+    Flask кладёт запись в той же транзакции, что и бизнес-изменение, и сразу
+    отвечает клиенту. Доставляет процесс бота (notification_dispatcher в
+    telegram_bot.py): забирает пачки, повторяет с экспоненциальной задержкой
+    и записывает задержку доставки. Уведомления с общим coalesce_key
+    (сообщения чата одному получателю) ставятся с задержкой и уходят
+    одним сообщением.
+    """
+
+    MAX_ATTEMPTS = 8
+    BASE_RETRY_DELAY = 5        # секунд; 5, 10, 20, 40, ...
+    MAX_RETRY_DELAY = 15 * 60
+
+    @staticmethod
+    def create_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                latency_ms INTEGER,
+                last_error TEXT,
+                CHECK (status IN ('pending', 'sent', 'failed'))
+            )
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+            ON notification_outbox(next_attempt_at)
+            WHERE status = 'pending'
+        """)
+
+    @staticmethod
+    def enqueue(cursor, kind, payload=None, delay=0, coalesce_key=None):
+        """Добавить уведомление; коммит остаётся за вызывающим кодом.
+
+        delay - через сколько секунд отправлять (окно, в которое успевают
+        прийти следующие уведомления с тем же coalesce_key).
+        """
+        now = time.time()
+        cursor.execute("""
+            INSERT INTO notification_outbox (kind, payload, next_attempt_at, created_at, coalesce_key)
+            VALUES (?, ?, ?, ?, ?)
+        """, (kind, json.dumps(payload or {}, ensure_ascii=False), now + delay, now, coalesce_key))
+        return cursor.lastrowid
+
+    @staticmethod
+    def get_due(cursor, limit=50):
+        cursor.execute("""
+            SELECT id, kind, payload, attempts, created_at
+            FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        """, (time.time(), limit))
+        return [_notification(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_coalesced(cursor, kind, coalesce_key):
+        """Все ожидающие уведомления kind с этим coalesce_key, в том числе ещё не наступившие."""
+        cursor.execute("""
+            SELECT id, kind, payload, attempts, created_at
+            FROM notification_outbox
+            WHERE kind = ? AND coalesce_key = ? AND status = 'pending'
+            ORDER BY id
+        """, (kind, coalesce_key))
+        return [_notification(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def postpone(cursor, notification_ids, next_attempt_at):
+        """Отложить отправку, не расходуя попытку (лимит частоты, 429 от Telegram)."""
+        placeholders = ', '.join('?' * len(notification_ids))
+        cursor.execute(f"""
+            UPDATE notification_outbox
+            SET next_attempt_at = ?
+            WHERE id IN ({placeholders}) AND status = 'pending'
+        """, (next_attempt_at, *notification_ids))
+
+    @staticmethod
+    def mark_sent(cursor, notification_id, created_at):
+        now = time.time()
+        latency_ms = int((now - created_at) * 1000)
+        cursor.execute("""
+            UPDATE notification_outbox
+            SET status = 'sent', sent_at = ?, latency_ms = ?, attempts = attempts + 1
+            WHERE id = ?
+        """, (now, latency_ms, notification_id))
+        return latency_ms
+
+    @staticmethod
+    def mark_failed(cursor, notification_id, attempts, error):
+        attempts += 1
+        if attempts >= NotificationOutbox.MAX_ATTEMPTS:
+            cursor.execute("""
+                UPDATE notification_outbox
+                SET status = 'failed', attempts = ?, last_error = ?
+                WHERE id = ?
+            """, (attempts, str(error)[:500], notification_id))
+            return None
+
+        delay = min(
+            NotificationOutbox.BASE_RETRY_DELAY * 2 ** (attempts - 1),
+            NotificationOutbox.MAX_RETRY_DELAY
+        )
+        next_attempt_at = time.time() + delay
+        cursor.execute("""
+            UPDATE notification_outbox
+            SET attempts = ?, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+        """, (attempts, next_attempt_at, str(error)[:500], notification_id))
+        return next_attempt_at
+
+    @staticmethod
+    def mark_batch_sent(cursor, notifications):
+        """mark_sent для уведомлений, ушедших одним сообщением; возвращает наибольшую задержку."""
+        return max(
+            NotificationOutbox.mark_sent(cursor, n['id'], n['created_at'])
+            for n in notifications
+        )
+
+    @staticmethod
+    def mark_batch_failed(cursor, notifications, error):
+        """mark_failed для пачки; возвращает время следующей попытки или None, если все отброшены."""
+        next_attempts = [
+            NotificationOutbox.mark_failed(cursor, n['id'], n['attempts'], error)
+            for n in notifications
+        ]
+        return min((t for t in next_attempts if t is not None), default=None)
+
+    @staticmethod
+    def purge_sent(cursor, older_than_seconds=7 * 24 * 3600):
+        cursor.execute("""
+            DELETE FROM notification_outbox
+            WHERE status = 'sent' AND sent_at < ?
+        """, (time.time() - older_than_seconds,))
+        return cursor.rowcount
+
+    @staticmethod
+    def get_stats(cursor, window_seconds=3600):
+        cursor.execute("""
+            SELECT
+                SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) AS pending,
+                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) AS failed,
+                SUM(CASE WHEN status = 'sent' AND sent_at >= ? THEN 1 ELSE 0 END) AS sent_recent,
+                AVG(CASE WHEN status = 'sent' AND sent_at >= ? THEN latency_ms END) AS avg_latency_ms,
+                MAX(CASE WHEN status = 'sent' AND sent_at >= ? THEN latency_ms END) AS max_latency_ms
+            FROM notification_outbox
+        """, (time.time() - window_seconds,) * 3)
+        row = cursor.fetchone()
+        return dict(row) if row else {}
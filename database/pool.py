@@ -0,0 +1,207 @@
+"""
+Пул SQLite-соединений для Flask-приложения и процесса бота.
+
+Каждое соединение при создании получает настроенные PRAGMA (WAL,
+synchronous=NORMAL, busy_timeout, кэш страниц), поэтому читатели не
+блокируются пишущим планировщиком, а запись ждёт блокировку, а не падает
+сразу с "database is locked". Вызывающий код получает PooledConnection:
+интерфейс обычного sqlite3.Connection, но close() возвращает соединение
+в пул (незакоммиченная транзакция при этом откатывается, как и при
+закрытии настоящего соединения).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .rows import MappingConnection
+
+logger = logging.getLogger(__name__)
+
+
+BUSY_TIMEOUT_MS = 5000
+
+CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def _closed(*args, **kwargs):
+    raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+
+class PooledConnection:
+    """Обёртка над sqlite3.Connection, у которой close() возвращает соединение в пул."""
+
+    __slots__ = ('_pool', '_conn', '_acquired_at', 'cursor', 'execute', 'executemany', 'commit', 'rollback')
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._acquired_at = time.perf_counter()
+        # Горячие методы привязываем напрямую, без __getattr__
+        self.cursor = conn.cursor
+        self.execute = conn.execute
+        self.executemany = conn.executemany
+        self.commit = conn.commit
+        self.rollback = conn.rollback
+
+    @property
+    def row_factory(self):
+        return self._raw().row_factory
+
+    @row_factory.setter
+    def row_factory(self, value):
+        self._raw().row_factory = value
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def _raw(self):
+        if self._conn is None:
+            _closed()
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def __enter__(self):
+        self._raw().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._raw().__exit__(exc_type, exc, tb)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        # Соединение уже может быть у другого потока: поздний commit() или
+        # execute() через привязанные методы не должен до него дойти
+        self.cursor = self.execute = self.executemany = self.commit = self.rollback = _closed
+        self._pool.release(conn, time.perf_counter() - self._acquired_at)
+
+
+class ConnectionPool:
+    """LIFO-стек простаивающих соединений к одному файлу БД.
+
+    Если свободных соединений нет, создаётся новое: ожидание в пуле
+    заблокировало бы event loop бота при вложенных get_db_connection().
+    Лишние соединения сверх max_idle при возврате закрываются.
+    """
+
+    def __init__(self, database_path, max_idle=8):
+        self.database_path = database_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.acquisitions = 0
+        self.total_connect = 0.0
+        self.max_connect = 0.0
+        self.total_hold = 0.0
+        self.max_hold = 0.0
+        self.active = 0
+        self.max_active = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=MappingConnection
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self, row_factory=None):
+        conn = None
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+        connect_time = None
+        if conn is None:
+            started = time.perf_counter()
+            conn = self._connect()
+            connect_time = time.perf_counter() - started
+        conn.row_factory = row_factory
+
+        with self._lock:
+            self.acquisitions += 1
+            if connect_time is not None:
+                # acquire() не ждёт свободного соединения; дорого только открыть новое
+                self.created += 1
+                self.total_connect += connect_time
+                self.max_connect = max(self.max_connect, connect_time)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        return PooledConnection(self, conn)
+
+    def release(self, conn, hold):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+
+        with self._lock:
+            self.active -= 1
+            self.total_hold += hold
+            self.max_hold = max(self.max_hold, hold)
+            if conn is not None and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                conn = None
+
+        if conn is not None:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            n = self.acquisitions or 1
+            return {
+                'database': self.database_path,
+                'created': self.created,
+                'idle': len(self._idle),
+                'active': self.active,
+                'max_active': self.max_active,
+                'acquisitions': self.acquisitions,
+                'avg_connect_ms': self.total_connect / (self.created or 1) * 1000,
+                'max_connect_ms': self.max_connect * 1000,
+                'avg_hold_ms': self.total_hold / n * 1000,
+                'max_hold_ms': self.max_hold * 1000,
+            }
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database_path):
+    path = os.path.abspath(database_path)
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def pool_stats():
+    return [pool.stats() for pool in list(_pools.values())]
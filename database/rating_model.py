@@ -0,0 +1,109 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+
+class RatingStats:
+    """Агрегаты оценок по (reviewed_id, review_type).
+
+    rating_stats хранит число отзывов, сумму оценок и гистограмму 1-5.
+    Отзыв пишется только через record_review: она сохраняет строку в
+    reviews и в той же транзакции применяет к агрегатам разницу между
+    старой и новой оценкой, поэтому средний рейтинг читается одной
+    строкой, а не AVG по всем отзывам.
+    """
+
+    @staticmethod
+    def _apply(cursor, reviewed_id, review_type, rating, sign):
+        histogram = [sign if value == rating else 0 for value in RATING_VALUES]
+        cursor.execute("""
+            INSERT INTO rating_stats (
+                reviewed_id, review_type, review_count, rating_sum,
+                rating_1, rating_2, rating_3, rating_4, rating_5, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (reviewed_id, review_type) DO UPDATE SET
+                review_count = review_count + excluded.review_count,
+                rating_sum = rating_sum + excluded.rating_sum,
+                rating_1 = rating_1 + excluded.rating_1,
+                rating_2 = rating_2 + excluded.rating_2,
+                rating_3 = rating_3 + excluded.rating_3,
+                rating_4 = rating_4 + excluded.rating_4,
+                rating_5 = rating_5 + excluded.rating_5,
+                updated_at = CURRENT_TIMESTAMP
+        """, (reviewed_id, review_type, sign, sign * rating, *histogram))
+
+    @staticmethod
+    def record_review(cursor, post_id, reviewer_id, reviewed_id, rating, review_type, review_text=None):
+        """Сохранить (или заменить) отзыв и обновить агрегаты; коммит за вызывающим кодом."""
+        cursor.execute("""
+            SELECT reviewed_id, rating FROM reviews
+            WHERE post_id = ? AND reviewer_id = ? AND review_type = ?
+        """, (post_id, reviewer_id, review_type))
+        previous = cursor.fetchone()
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO reviews
+            (post_id, reviewer_id, reviewed_id, rating, review_text, review_type)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (post_id, reviewer_id, reviewed_id, rating, review_text, review_type))
+        review_id = cursor.lastrowid
+
+        if previous:
+            RatingStats._apply(cursor, previous['reviewed_id'], review_type, previous['rating'], -1)
+        RatingStats._apply(cursor, reviewed_id, review_type, rating, 1)
+        return review_id
+
+    @staticmethod
+    def get(cursor, reviewed_id, review_type=None):
+        """{'rating', 'count', 'histogram'} по одному типу отзывов или по всем."""
+        if review_type is None:
+            cursor.execute("""
+                SELECT SUM(review_count) AS review_count, SUM(rating_sum) AS rating_sum,
+                       SUM(rating_1) AS rating_1, SUM(rating_2) AS rating_2, SUM(rating_3) AS rating_3,
+                       SUM(rating_4) AS rating_4, SUM(rating_5) AS rating_5
+                FROM rating_stats
+                WHERE reviewed_id = ?
+            """, (reviewed_id,))
+        else:
+            cursor.execute("""
+                SELECT review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5
+                FROM rating_stats
+                WHERE reviewed_id = ? AND review_type = ?
+            """, (reviewed_id, review_type))
+        return RatingStats.summarize(cursor.fetchone())
+
+    @staticmethod
+    def get_average(cursor, reviewed_id, review_type=None):
+        return RatingStats.get(cursor, reviewed_id, review_type)['rating']
+
+    @staticmethod
+    def summarize(row):
+        count = (row['review_count'] if row else 0) or 0
+        if not count:
+            return {'rating': 0, 'count': 0, 'histogram': {value: 0 for value in RATING_VALUES}}
+        return {
+            'rating': round(row['rating_sum'] / count, 1),
+            'count': count,
+            'histogram': {value: row[f'rating_{value}'] for value in RATING_VALUES},
+        }
+
+    @staticmethod
+    def rebuild(cursor):
+        """Пересчитать агрегаты по таблице reviews целиком (ручная сверка)."""
+        cursor.execute("DELETE FROM rating_stats")
+        cursor.execute("""
+            INSERT INTO rating_stats (
+                reviewed_id, review_type, review_count, rating_sum,
+                rating_1, rating_2, rating_3, rating_4, rating_5, updated_at
+            )
+            SELECT reviewed_id, review_type, COUNT(*), SUM(rating),
+                   SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+                   CURRENT_TIMESTAMP
+            FROM reviews
+            GROUP BY reviewed_id, review_type
+        """)
+        logger.info(f"⭐ Rating stats rebuilt: {cursor.rowcount} rows")
@@ -0,0 +1,347 @@
+"""
+Рекомендации каналов покупателю для /api/bloggers/recommended.
+
+Каждый канал каталога получает оценку: близость к тематикам и ценам
+прошлых заказов покупателя (ad_posts), рейтинг, охват, цена за 1000
+подписчиков и свободные слоты блогера на неделю вперёд. Признаки всех
+каналов лежат в массивах NumPy, собранных из blogger_catalog для той же
+ревизии, что и снимок каталога; при смене rev дочитываются только
+изменившиеся карточки. Оценка считается сразу для всего массива, без
+цикла по каналам в Python.
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+    logging.warning("⚠️ numpy not installed. Recommendations fall back to catalog rating order.")
+
+from .catalog import MAX_PAGE_SIZE, BloggerCatalog, catch_up
+
+logger = logging.getLogger(__name__)
+
+
+# Вклад признаков в итоговую оценку; каждый признак нормирован в [0, 1]
+RECOMMENDATION_WEIGHTS = {
+    'topic': 3.0,
+    'price_fit': 1.5,
+    'rating': 1.0,
+    'reach': 1.0,
+    'value': 1.0,
+    'availability': 1.0,
+}
+
+# Совпадение группы тематики без совпадения подтемы
+GROUP_MATCH_WEIGHT = 0.5
+# Сколько последних заказов покупателя учитывается в профиле
+BUYER_HISTORY_LIMIT = 200
+# Минимальная ширина ценового диапазона покупателя (в логарифме цены)
+MIN_PRICE_SIGMA = 0.5
+
+BOOKED_STATUSES = ('pending', 'approved')
+AVAILABILITY_HORIZON = timedelta(days=7)
+AVAILABILITY_TTL = 60
+
+
+class ChannelFeatures:
+    """Признаки каналов одной ревизии каталога: по элементу массива на канал.
+
+    Массивы не меняются после сборки: запрос, начавший оценку по снимку,
+    дочитывает его, даже если параллельно собирается следующий.
+    """
+
+    __slots__ = (
+        'rev', 'channel_ids', 'user_ids', 'group_codes', 'sub_codes',
+        'price', 'subscribers', 'rating', 'positions', '_derived',
+    )
+
+    def __init__(self, rev, channel_ids, user_ids, group_codes, sub_codes, price, subscribers, rating):
+        self.rev = rev
+        self.channel_ids = channel_ids
+        self.user_ids = user_ids
+        self.group_codes = group_codes
+        self.sub_codes = sub_codes
+        self.price = price
+        self.subscribers = subscribers
+        self.rating = rating
+        self.positions = {int(channel_id): i for i, channel_id in enumerate(channel_ids)}
+        self._derived = None
+
+    @property
+    def count(self):
+        return len(self.channel_ids)
+
+    def derived(self):
+        """Признаки, не зависящие от покупателя; считаются один раз на ревизию."""
+        if self._derived is None:
+            price_per_1k = np.full(self.count, np.nan)
+            has_subscribers = self.subscribers > 0
+            price_per_1k[has_subscribers] = self.price[has_subscribers] / self.subscribers[has_subscribers] * 1000
+
+            priced = ~np.isnan(price_per_1k) & (self.price > 0)
+            value = np.zeros(self.count)
+            if priced.any():
+                median = np.median(price_per_1k[priced])
+                value[priced] = 1 / (1 + price_per_1k[priced] / median) if median > 0 else 1
+
+            max_reach = np.log1p(self.subscribers.max()) if self.count else 0
+            reach = np.log1p(self.subscribers) / max_reach if max_reach > 0 else np.zeros(self.count)
+
+            log_price = np.full(self.count, np.nan)
+            log_price[self.price > 0] = np.log(self.price[self.price > 0])
+
+            owners, owner_index = np.unique(self.user_ids, return_inverse=True)
+            self._derived = {
+                'value': value,
+                'reach': reach,
+                'rating': np.clip(self.rating / 5, 0, 1),
+                'log_price': log_price,
+                'owners': owners,
+                'owner_index': owner_index,
+            }
+        return self._derived
+
+
+# Коды тематик общие для всех ревизий: (group_key,) и (group_key, sub_key) -> int
+_topic_codes = {}
+_topic_codes_lock = threading.Lock()
+
+_FEATURE_COLUMNS = "channel_id, user_id, topic_group_key, topic_sub_key, price, subscribers, rating"
+
+
+def _topic_code(key):
+    code = _topic_codes.get(key)
+    if code is None:
+        with _topic_codes_lock:
+            code = _topic_codes.setdefault(key, len(_topic_codes))
+    return code
+
+
+def _feature_row(row):
+    group_key = row['topic_group_key'] or ''
+    return (
+        row['channel_id'], row['user_id'],
+        _topic_code((group_key,)), _topic_code((group_key, row['topic_sub_key'] or '')),
+        row['price'] or 0, row['subscribers'] or 0, row['rating'] or 0,
+    )
+
+
+def _build_features(rev, rows):
+    columns = list(zip(*rows)) if rows else [()] * 7
+    return ChannelFeatures(
+        rev,
+        np.array(columns[0], dtype=np.int64),
+        np.array(columns[1], dtype=np.int64),
+        np.array(columns[2], dtype=np.int32),
+        np.array(columns[3], dtype=np.int32),
+        np.array(columns[4], dtype=np.float64),
+        np.array(columns[5], dtype=np.float64),
+        np.array(columns[6], dtype=np.float64),
+    )
+
+
+def _load_features(cursor, rev, previous):
+    if previous is None:
+        cursor.execute(f"SELECT {_FEATURE_COLUMNS} FROM blogger_catalog ORDER BY channel_id")
+        return _build_features(rev, [_feature_row(row) for row in cursor.fetchall()])
+
+    # Как и снимок каталога: дочитываем карточки новее предыдущей
+    # ревизии и выкидываем каналы, которых больше нет в каталоге
+    cursor.execute(f"SELECT {_FEATURE_COLUMNS} FROM blogger_catalog WHERE rev > ?", (previous.rev,))
+    changed = [_feature_row(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT channel_id FROM blogger_catalog ORDER BY channel_id")
+    listed = np.fromiter((row['channel_id'] for row in cursor.fetchall()), dtype=np.int64)
+
+    arrays = [
+        previous.channel_ids, previous.user_ids, previous.group_codes, previous.sub_codes,
+        previous.price, previous.subscribers, previous.rating,
+    ]
+    keep = np.isin(previous.channel_ids, listed, assume_unique=True)
+    updated_positions = []
+    updated_rows = []
+    appended = []
+    for row in changed:
+        position = previous.positions.get(row[0])
+        if position is None:
+            appended.append(row)
+        else:
+            updated_positions.append(position)
+            updated_rows.append(row)
+
+    arrays = [array.copy() for array in arrays]
+    if updated_rows:
+        for array, values in zip(arrays, zip(*updated_rows)):
+            array[updated_positions] = values
+    arrays = [array[keep] for array in arrays]
+    if appended:
+        arrays = [
+            np.concatenate((array, np.array(values, dtype=array.dtype)))
+            for array, values in zip(arrays, zip(*appended))
+        ]
+    return ChannelFeatures(rev, *arrays)
+
+
+_features = None
+_features_lock = threading.Lock()
+
+
+def get_channel_features(cursor):
+    """Признаки каналов для текущей ревизии каталога; пересборка только при смене rev."""
+    global _features
+
+    catch_up(cursor)
+    rev = BloggerCatalog.get_revision(cursor)
+    features = _features
+    if features is not None and features.rev == rev:
+        return features
+
+    with _features_lock:
+        features = _features
+        if features is None or features.rev != rev:
+            previous = features if features is not None and features.rev < rev else None
+            features = _features = _load_features(cursor, rev, previous)
+    return features
+
+
+_availability = None
+_availability_lock = threading.Lock()
+
+
+def _load_bookings(cursor):
+    """(blogger_id, занятые слоты, дни в расписании) по заказам на неделю вперёд."""
+    now = datetime.now()
+    placeholders = ', '.join('?' * len(BOOKED_STATUSES))
+    cursor.execute(f"""
+        SELECT ap.blogger_id, COUNT(*) AS booked,
+               (SELECT COUNT(DISTINCT bs.weekday_short) FROM blogger_schedules bs
+                WHERE bs.user_id = ap.blogger_id) AS schedule_days
+        FROM ad_posts ap
+        WHERE ap.status IN ({placeholders})
+          AND ap.scheduled_time BETWEEN ? AND ?
+        GROUP BY ap.blogger_id
+    """, (*BOOKED_STATUSES,
+          now.strftime('%Y-%m-%d %H:%M:%S'),
+          (now + AVAILABILITY_HORIZON).strftime('%Y-%m-%d %H:%M:%S')))
+    return cursor.fetchall()
+
+
+def get_availability(cursor, features):
+    """Доля свободных слотов блогера на неделю (1 - свободен) для каждого канала.
+
+    Слот - день из расписания блогера (без расписания - любой день
+    недели). Заказы меняются независимо от каталога, поэтому результат
+    кэшируется на AVAILABILITY_TTL секунд, а не до смены rev.
+    """
+    global _availability
+
+    cached = _availability
+    now = time.monotonic()
+    if cached is None or now - cached[0] > AVAILABILITY_TTL:
+        with _availability_lock:
+            cached = _availability
+            if cached is None or now - cached[0] > AVAILABILITY_TTL:
+                rows = _load_bookings(cursor)
+                busy_ids = np.array([row['blogger_id'] for row in rows], dtype=np.int64)
+                capacity = np.array([row['schedule_days'] or 7 for row in rows], dtype=np.float64)
+                booked = np.array([row['booked'] for row in rows], dtype=np.float64)
+                cached = _availability = (now, busy_ids, np.clip(1 - booked / capacity, 0, 1))
+
+    _, busy_ids, free_share = cached
+    derived = features.derived()
+    owners = derived['owners']
+    per_owner = np.ones(len(owners))
+    if len(busy_ids) and len(owners):
+        positions = np.searchsorted(owners, busy_ids)
+        found = positions < len(owners)
+        found[found] = owners[positions[found]] == busy_ids[found]
+        per_owner[positions[found]] = free_share[found]
+    return per_owner[derived['owner_index']]
+
+
+def get_buyer_profile(cursor, buyer_id):
+    """Тематики и цены последних заказов покупателя.
+
+    Возвращает {'topics': {код тематики: доля заказов}, 'price_mu',
+    'price_sigma'} - центр и ширину ценового диапазона в логарифме цены
+    (None, если цен в истории нет).
+    """
+    cursor.execute("""
+        SELECT bc.topic_group_key, bc.topic_sub_key, ap.price
+        FROM ad_posts ap
+        LEFT JOIN blogger_channels bc ON bc.id = ap.channel_id
+        WHERE ap.buyer_id = ?
+        ORDER BY ap.created_at DESC
+        LIMIT ?
+    """, (buyer_id, BUYER_HISTORY_LIMIT))
+    rows = cursor.fetchall()
+
+    topics = {}
+    with_topic = [row for row in rows if row['topic_group_key']]
+    for row in with_topic:
+        for key in ((row['topic_group_key'],), (row['topic_group_key'], row['topic_sub_key'] or '')):
+            code = _topic_codes.get(key)
+            if code is not None:
+                topics[code] = topics.get(code, 0) + 1 / len(with_topic)
+
+    log_prices = [math.log(row['price']) for row in rows if row['price'] and row['price'] > 0]
+    price_mu = price_sigma = None
+    if log_prices:
+        price_mu = sum(log_prices) / len(log_prices)
+        variance = sum((value - price_mu) ** 2 for value in log_prices) / len(log_prices)
+        price_sigma = max(math.sqrt(variance), MIN_PRICE_SIGMA)
+    return {'topics': topics, 'price_mu': price_mu, 'price_sigma': price_sigma}
+
+
+def score_channels(features, profile, availability):
+    """Оценка каждого канала под профиль покупателя (массив длины features.count)."""
+    derived = features.derived()
+
+    preferences = np.zeros(len(_topic_codes) + 1)
+    for code, share in profile['topics'].items():
+        preferences[code] = share
+    topic = preferences[features.sub_codes] + GROUP_MATCH_WEIGHT * preferences[features.group_codes]
+
+    price_fit = np.zeros(features.count)
+    if profile['price_mu'] is not None:
+        log_price = derived['log_price']
+        priced = ~np.isnan(log_price)
+        price_fit[priced] = np.exp(-0.5 * ((log_price[priced] - profile['price_mu']) / profile['price_sigma']) ** 2)
+
+    return (
+        RECOMMENDATION_WEIGHTS['topic'] * topic / (1 + GROUP_MATCH_WEIGHT)
+        + RECOMMENDATION_WEIGHTS['price_fit'] * price_fit
+        + RECOMMENDATION_WEIGHTS['rating'] * derived['rating']
+        + RECOMMENDATION_WEIGHTS['reach'] * derived['reach']
+        + RECOMMENDATION_WEIGHTS['value'] * derived['value']
+        + RECOMMENDATION_WEIGHTS['availability'] * availability
+    )
+
+
+def recommend_channels(cursor, buyer_id, limit):
+    """[(channel_id, оценка)] лучших каналов для покупателя, свои каналы исключены."""
+    features = get_channel_features(cursor)
+    if not features.count:
+        return []
+
+    scores = score_channels(
+        features,
+        get_buyer_profile(cursor, buyer_id),
+        get_availability(cursor, features),
+    )
+    scores[features.user_ids == buyer_id] = -np.inf
+
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE, features.count))
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [
+        (int(features.channel_ids[i]), float(scores[i]))
+        for i in top if np.isfinite(scores[i])
+    ]
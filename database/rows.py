@@ -0,0 +1,59 @@
+"""
+Преобразование строк SQLite в dict.
+
+Имена колонок зависят только от запроса, поэтому MappingCursor запоминает
+их один раз на выполненный запрос (cursor.description - один и тот же
+объект для всех строк результата), а dict_factory собирает строку одним
+dict(zip()) без цикла по description на каждой строке.
+"""
+
+import sqlite3
+
+
+class MappingCursor(sqlite3.Cursor):
+    """Курсор с кэшем имён колонок текущего запроса."""
+
+    _description = None
+    _fields = ()
+
+
+class MappingConnection(sqlite3.Connection):
+    """Соединение, у которого cursor() и execute() отдают MappingCursor."""
+
+    def cursor(self, factory=MappingCursor):
+        return super().cursor(factory)
+
+    # Встроенные execute*() создают обычный Cursor в обход cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def dict_factory(cursor, row):
+    description = cursor.description
+    try:
+        if cursor._description is description:
+            return dict(zip(cursor._fields, row))
+    except AttributeError:
+        # Обычный sqlite3.Cursor: кэшировать негде
+        return {col[0]: value for col, value in zip(description, row)}
+
+    # Держим ссылку на description, чтобы сравнение по is не ошиблось
+    cursor._description = description
+    cursor._fields = fields = tuple(col[0] for col in description)
+    return dict(zip(fields, row))
+
+
+def row_to_dict(row):
+    """dict для строки любого курсора; строки dict_factory не копируются."""
+    if row is None or type(row) is dict:
+        return row
+    return dict(row)
+
+
+def rows_to_dicts(rows):
+    if not rows or type(rows[0]) is dict:
+        return rows
+    return [dict(row) for row in rows]
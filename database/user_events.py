@@ -0,0 +1,57 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UserEvents:
+    """Журнал событий для потока /api/stream (utils/event_hub.py).
+
+    Строки пишут триггеры миграции 13 в той же транзакции, что и само
+    изменение: новое сообщение, счётчик непрочитанных, баланс, статус
+    рекламного поста или платежа, полученный ботом премиум-пост. Поэтому
+    событие видно ровно тогда, когда изменение закоммичено, - неважно,
+    Flask его сделал или процесс бота. payload - JSON, собранный
+    json_object() в триггере.
+    """
+
+    # Переподключившийся клиент досылает пропущенное из этого окна
+    RETENTION_SECONDS = 3600
+
+    @staticmethod
+    def get_last_id(cursor):
+        cursor.execute("SELECT MAX(id) AS last_id FROM user_events")
+        row = cursor.fetchone()
+        return (row['last_id'] if isinstance(row, dict) else row[0]) or 0
+
+    @staticmethod
+    def get_after(cursor, after_id, limit=500):
+        """События всех пользователей с id > after_id по возрастанию id."""
+        cursor.execute("""
+            SELECT id, user_id, kind, payload
+            FROM user_events
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (after_id, limit))
+        return cursor.fetchall()
+
+    @staticmethod
+    def get_for_user(cursor, user_id, after_id, limit=500):
+        """Пропущенные события пользователя для повторного подключения (Last-Event-ID)."""
+        cursor.execute("""
+            SELECT id, user_id, kind, payload
+            FROM user_events
+            WHERE user_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (user_id, after_id, limit))
+        return cursor.fetchall()
+
+    @staticmethod
+    def purge(cursor, older_than_seconds=RETENTION_SECONDS):
+        cursor.execute("""
+            DELETE FROM user_events
+            WHERE created_at < ?
+        """, (time.time() - older_than_seconds,))
+        return cursor.rowcount
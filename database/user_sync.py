@@ -0,0 +1,215 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+
+UPSERT_USER_SQL = """
+    INSERT INTO users (user_id, first_name, last_name, username, photo_url, language_code, is_premium)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        username = excluded.username,
+        photo_url = excluded.photo_url,
+        language_code = excluded.language_code,
+        is_premium = excluded.is_premium,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def user_fingerprint(user_data):
+    """Кортеж Telegram-полей пользователя в том виде, в каком они лежат в users."""
+    return (
+        user_data.get('first_name', '') or '',
+        user_data.get('last_name', '') or '',
+        user_data.get('username', '') or '',
+        user_data.get('photo_url', '') or '',
+        user_data.get('language_code', 'ru') or 'ru',
+        1 if user_data.get('is_premium', False) else 0,
+    )
+
+
+class UserSyncCache:
+    """Write-behind синхронизация профиля Telegram-пользователя с таблицей users.
+
+    Для каждого user_id помним отпечаток последних записанных полей. Если поля
+    не менялись и окно stale_after не истекло, запрос к БД не нужен вовсе.
+    Изменения складываются в pending (последняя версия на пользователя) и
+    пишутся фоновым потоком одной транзакцией пачками по batch_size.
+    Новый пользователь вставляется сразу - обработчик может тут же его читать.
+    """
+
+    def __init__(self, database_path, stale_after=6 * 3600, flush_interval=5.0,
+                 batch_size=200, max_entries=50000):
+        self.database_path = database_path
+        self.stale_after = stale_after
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+
+        self._known = OrderedDict()   # user_id -> (fingerprint, synced_at)
+        self._pending = {}            # user_id -> fingerprint
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.skipped = 0
+        self.queued = 0
+        self.flushed = 0
+
+    def sync(self, db, user_data, referrer_id=None):
+        user_id = user_data.get('id')
+        if not user_id:
+            return
+
+        fingerprint = user_fingerprint(user_data)
+        now = time.time()
+
+        with self._lock:
+            entry = self._known.get(user_id)
+            if entry is not None:
+                self._known.move_to_end(user_id)
+                known_fingerprint, synced_at = entry
+                if known_fingerprint == fingerprint and now - synced_at < self.stale_after:
+                    self.skipped += 1
+                    return
+                self._enqueue(user_id, fingerprint, now)
+                return
+
+        # Пользователя в кэше процесса ещё нет - читаем строку (без блокировки на запись)
+        cursor = db.cursor()
+        cursor.execute(
+            """
+            SELECT first_name, last_name, username, photo_url, language_code, is_premium
+            FROM users WHERE user_id = ?
+            """,
+            (user_id,)
+        )
+        row = cursor.fetchone()
+
+        if row is None:
+            self._insert_new_user(db, user_id, fingerprint, referrer_id)
+            with self._lock:
+                self._remember(user_id, fingerprint, now)
+            return
+
+        stored_fingerprint = user_fingerprint({
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'username': row['username'],
+            'photo_url': row['photo_url'],
+            'language_code': row['language_code'],
+            'is_premium': row['is_premium'],
+        })
+        with self._lock:
+            if stored_fingerprint == fingerprint:
+                self._remember(user_id, fingerprint, now)
+            else:
+                self._enqueue(user_id, fingerprint, now)
+
+    def _insert_new_user(self, db, user_id, fingerprint, referrer_id):
+        cursor = db.cursor()
+        if referrer_id:
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO users (
+                    user_id, first_name, last_name, username, photo_url,
+                    language_code, is_premium, referrer_id
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, *fingerprint, referrer_id)
+            )
+        else:
+            cursor.execute(UPSERT_USER_SQL, (user_id, *fingerprint))
+        db.commit()
+
+    def _remember(self, user_id, fingerprint, synced_at):
+        self._known[user_id] = (fingerprint, synced_at)
+        self._known.move_to_end(user_id)
+        while len(self._known) > self.max_entries:
+            self._known.popitem(last=False)
+
+    def _enqueue(self, user_id, fingerprint, now):
+        self._pending[user_id] = fingerprint
+        self._remember(user_id, fingerprint, now)
+        self.queued += 1
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, name='user-sync-flusher', daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Ошибка фоновой синхронизации пользователей: {e}")
+
+    def flush(self):
+        """Записывает накопленные изменения; возвращает число записанных строк."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch = self._pending
+            self._pending = {}
+
+        rows = [(user_id, *fingerprint) for user_id, fingerprint in batch.items()]
+        try:
+            conn = get_pool(self.database_path).acquire()
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    conn.executemany(UPSERT_USER_SQL, rows[start:start + self.batch_size])
+                    conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            # Возвращаем в очередь то, что не успело перезаписаться более свежими данными
+            with self._lock:
+                for user_id, fingerprint in batch.items():
+                    self._pending.setdefault(user_id, fingerprint)
+            raise
+
+        self.flushed += len(rows)
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'known': len(self._known),
+                'pending': len(self._pending),
+                'skipped': self.skipped,
+                'queued': self.queued,
+                'flushed': self.flushed,
+            }
+
+
+_user_sync = None
+
+
+def get_user_sync(database_path):
+    global _user_sync
+    if _user_sync is None:
+        _user_sync = UserSyncCache(database_path)
+        atexit.register(_flush_at_exit)
+    return _user_sync
+
+
+def _flush_at_exit():
+    try:
+        if _user_sync is not None:
+            _user_sync.flush()
+    except Exception as e:
+        logger.error(f"❌ Не удалось сбросить очередь пользователей при выходе: {e}")
@@ -4,17 +4,10 @@ API endpoints для работы с платежами
 """
 
 import logging
-import os
-import time
-import json
-import hmac
-import hashlib
-from urllib.parse import parse_qsl, unquote
 from flask import Blueprint, request, jsonify, g
-from functools import wraps
 from database import get_db
 from database.models import User
-from database.db import create_or_update_user
+from database.notification_outbox import NotificationOutbox
 from .yookassa_service import YooKassaService
 from .payment_model import PaymentModel
 from .tonconnect_service import TonConnectService
@@ -25,177 +18,22 @@ from datetime import datetime
 import sys
 sys.path.append('..')
 from utils.sanitizer import InputSanitizer
+from utils.auth import auth_required
 
 logger = logging.getLogger(__name__)
 
 # Создаём Blueprint для платёжных маршрутов
 payment_bp = Blueprint('payment', __name__, url_prefix='/api/payment')
 
-# Telegram Bot Token и время жизни initData (как в app.py)
-BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '8501227640:AAEnvc8VZa5ga3_8uN5isjUH4cGKFaCmw8c')
-INIT_DATA_EXPIRATION = 86400  # 24 часа для TON платежей (транзакция может занять время)
+# initData проверяется в before_request (utils.auth); платёжным роутам
+# разрешён срок жизни 24 часа - TON-транзакция может занять время
+INIT_DATA_EXPIRATION = 86400
 
-
-def validate_init_data(init_data_raw):
-    """
-    Проверка Telegram InitData (укороченная версия из app.py).
-    Возвращает (is_valid, parsed_data).
-    """
-    logger.info("=" * 60)
-    logger.info("🔐 НАЧАЛО ВАЛИДАЦИИ INITDATA (PAYMENT)")
-    logger.info(f"InitData length: {len(init_data_raw)} chars")
-    logger.info(f"🔑 BOT_TOKEN в использовании: {BOT_TOKEN[:20]}...{BOT_TOKEN[-10:]}")
-    
-    try:
-        parsed_data = dict(parse_qsl(init_data_raw))
-        logger.info(f"📋 Parsed keys: {list(parsed_data.keys())}")
-        
-        # LOG ALL PARSED DATA (except user - too long)
-        logger.info("📋 ДЕТАЛИ PARSED DATA:")
-        for key, value in parsed_data.items():
-            if key != 'user':
-                logger.info(f"   {key} = {value}")
-            else:
-                logger.info(f"   user = {value[:100]}..." if len(value) > 100 else f"   user = {value}")
-
-        received_hash = parsed_data.pop('hash', None)
-        if not received_hash:
-            logger.warning("❌ InitData validation failed: no hash")
-            logger.info("=" * 60)
-            return False, None
-        
-        logger.info(f"🔑 Received hash (FULL): {received_hash}")
-
-        auth_date = parsed_data.get('auth_date')
-        if not auth_date:
-            logger.warning("❌ InitData validation failed: no auth_date")
-            logger.info("=" * 60)
-            return False, None
-
-        try:
-            auth_timestamp = int(auth_date)
-            current_timestamp = int(time.time())
-            age_seconds = current_timestamp - auth_timestamp
-            
-            logger.info(f"⏰ Auth date: {datetime.fromtimestamp(auth_timestamp)}")
-            logger.info(f"⏰ Current time: {datetime.fromtimestamp(current_timestamp)}")
-            logger.info(f"⏰ Age: {age_seconds} seconds ({age_seconds/60:.1f} minutes)")
-            
-            if age_seconds > INIT_DATA_EXPIRATION:
-                logger.warning(f"❌ InitData validation failed: expired (age={age_seconds}s, max={INIT_DATA_EXPIRATION}s)")
-                logger.info("=" * 60)
-                return False, None
-            else:
-                logger.info(f"✅ InitData not expired ({INIT_DATA_EXPIRATION - age_seconds}s remaining)")
-        except ValueError:
-            logger.warning("❌ InitData validation failed: invalid auth_date format")
-            logger.info("=" * 60)
-            return False, None
-
-        data_check_arr = [f"{k}={v}" for k, v in sorted(parsed_data.items())]
-        data_check_string = '\n'.join(data_check_arr)
-        
-        logger.info(f"📝 Data check string created ({len(data_check_string)} chars)")
-        logger.info(f"📝 DATA CHECK STRING (FULL):")
-        logger.info(data_check_string)
-
-        logger.info(f"🔐 Creating secret key with BOT_TOKEN: {BOT_TOKEN}")
-        secret_key = hmac.new(
-            key="WebAppData".encode(),
-            msg=BOT_TOKEN.encode(),
-            digestmod=hashlib.sha256
-        ).digest()
-        logger.info(f"🔐 Secret key generated (hex): {secret_key.hex()}")
-
-        calculated_hash = hmac.new(
-            key=secret_key,
-            msg=data_check_string.encode(),
-            digestmod=hashlib.sha256
-        ).hexdigest()
-        
-        logger.info(f"🔐 Calculated hash (FULL): {calculated_hash}")
-
-        if calculated_hash != received_hash:
-            logger.error(f"❌ HASH MISMATCH!")
-            logger.error(f"   Expected (calculated): {calculated_hash}")
-            logger.error(f"   Received (from TG):    {received_hash}")
-            logger.error(f"   BOT_TOKEN used: {BOT_TOKEN}")
-            logger.info("=" * 60)
-            return False, None
-        
-        logger.info("✅ Hash match! InitData is valid!")
-
-        # Парсим user если он есть
-        if 'user' in parsed_data:
-            try:
-                parsed_data['user'] = json.loads(unquote(parsed_data['user']))
-                user = parsed_data['user']
-                logger.info(f"👤 User: {user.get('first_name')} {user.get('last_name')} (@{user.get('username')}, ID: {user.get('id')})")
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"❌ Error parsing user data: {e}")
-
-        logger.info(f"✅ InitData validation successful for user_id={parsed_data.get('user', {}).get('id', 'unknown')}")
-        logger.info("✅ ВАЛИДАЦИЯ УСПЕШНА")
-        logger.info("=" * 60)
-        return True, parsed_data
-
-    except Exception as e:
-        logger.error(f"❌ Ошибка валидации InitData (payment): {e}", exc_info=True)
-        logger.info("=" * 60)
-        return False, None
-
-
-def require_auth(f):
-    """
-    Decorator для проверки авторизации по Telegram InitData
-    (отдельная реализация для платёжных роутов,
-    логика такая же, как в app.py).
-    """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        endpoint = f"{request.method} {request.path}"
-        
-        logger.info("=" * 60)
-        logger.info(f"🔐 ПРОВЕРКА АВТОРИЗАЦИИ (PAYMENT): {endpoint}")
-
-        auth_header = request.headers.get('Authorization', '')
-        logger.info(f"📋 Authorization header length: {len(auth_header)}")
-        logger.info(f"📋 Authorization header (first 50): {auth_header[:50]}")
-        logger.info(f"📋 Authorization header (last 50): {auth_header[-50:]}")
-        
-        if not auth_header or not auth_header.startswith('tma '):
-            logger.warning(f"❌ No/invalid Authorization header for {endpoint}")
-            logger.warning(f"   Header: '{auth_header[:100]}'")
-            logger.info("=" * 60)
-            return jsonify({'error': 'Unauthorized'}), 401
-
-        init_data_raw = auth_header[4:]
-        logger.info(f"📋 InitData length after 'tma ': {len(init_data_raw)}")
-
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        if not is_valid:
-            logger.error(f"❌ Authorization FAILED for {endpoint} (payment)")
-            logger.error(f"   InitData was: {init_data_raw[:100]}...{init_data_raw[-100:]}")
-            logger.info("=" * 60)
-            return jsonify({'error': 'Доступ запрещён'}), 403
-
-        # Сохраняем данные в g, как в app.py
-        g.init_data = parsed_data
-        g.user = parsed_data.get('user', {})
-        g.user_id = g.user.get('id')  # Добавляем user_id для удобства
-        
-        logger.info(f"✅ Authorization SUCCESS for user_id={g.user_id}")
-        logger.info("=" * 60)
-
-        # Синхронизируем пользователя с БД
-        try:
-            create_or_update_user(g.user)
-        except Exception as e:
-            logger.error(f"❌ Error syncing user to database (payment): {e}", exc_info=True)
-
-        return f(*args, **kwargs)
-
-    return decorated_function
+require_auth = auth_required(
+    max_age=INIT_DATA_EXPIRATION,
+    invalid_status=403,
+    invalid_error='Доступ запрещён'
+)
 
 
 @payment_bp.route('/create', methods=['POST'])
@@ -248,9 +86,6 @@ def create_payment():
         db = get_db()
         cursor = db.cursor()
         
-        # Проверяем наличие таблицы платежей
-        PaymentModel.create_table(cursor)
-        
         # Создаём запись о платеже
         PaymentModel.create(
             cursor=cursor,
@@ -573,9 +408,6 @@ def create_ton_payment():
         db = get_db()
         cursor = db.cursor()
         
-        # Проверяем наличие таблицы TON платежей
-        TonPaymentModel.create_table(cursor)
-        
         # ВАЖНО: Преобразуем user_id в int перед сохранением
         user_id_int = int(user_id)
         logger.info(f"💾 Сохраняем платёж с user_id={user_id_int} (type: {type(user_id_int)})")
@@ -847,19 +679,14 @@ def test_auth():
         logger.info("=" * 60)
         logger.info("🧪 TEST AUTH ENDPOINT")
         
-        auth_header = request.headers.get('Authorization', '')
-        logger.info(f"📋 Authorization header length: {len(auth_header)}")
-        
-        if not auth_header or not auth_header.startswith('tma '):
+        if g.auth_error in ('missing', 'format'):
             logger.warning("❌ No/invalid Authorization header")
             return jsonify({'error': 'No Authorization header'}), 400
-        
-        init_data_raw = auth_header[4:]
-        logger.info(f"📋 InitData length: {len(init_data_raw)}")
-        
-        is_valid, parsed_data = validate_init_data(init_data_raw)
-        
-        if not is_valid:
+
+        init_data_raw = request.headers.get('Authorization', '')[4:]
+        parsed_data = g.init_data
+
+        if g.auth_error is not None:
             logger.error("❌ Validation FAILED")
             logger.info("=" * 60)
             return jsonify({
@@ -867,7 +694,7 @@ def test_auth():
                 'error': 'Validation failed',
                 'init_data_length': len(init_data_raw)
             }), 403
-        
+
         user = parsed_data.get('user', {})
         
         logger.info("✅ Validation SUCCESS")
@@ -970,20 +797,15 @@ def create_withdrawal_request():
             SET balance = ?, updated_at = CURRENT_TIMESTAMP
             WHERE user_id = ?
         """, (new_balance, user_id))
+
+        # Уведомление администратору отправит бот (notification_outbox)
+        NotificationOutbox.enqueue(cursor, 'admin_withdrawal', {'request_id': request_id})
         
         db.commit()
         
         logger.info(f"✅ Withdrawal request created: ID={request_id}")
         logger.info(f"💰 Balance updated: {balance} -> {new_balance}")
         
-        # Отправляем уведомление администратору через бота
-        try:
-            from telegram_bot import notify_admin_about_withdrawal_sync
-            notify_admin_about_withdrawal_sync(request_id)
-            logger.info("✅ Admin notified about withdrawal request")
-        except Exception as e:
-            logger.error(f"❌ Error notifying admin: {e}")
-        
         logger.info("=" * 60)
         
         return jsonify({
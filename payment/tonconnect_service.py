@@ -5,6 +5,8 @@ import asyncio
 import requests
 from typing import Optional, Dict, Any
 
+from utils.singleflight import get_singleflight
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,6 +14,9 @@ TON_RECEIVER_WALLET = "UQBavjrc7HNs-X4nk2jYnQsvKysd24od3sXW5lWacI9Gyxc4"
 TON_MANIFEST_URL = "https://beta.heisen.online/tonconnect-manifest.json"
 NANO_TON = 1_000_000_000  
 
+# Пачка одновременных пополнений ждёт один запрос курса, а не шлёт каждый свой
+_ton_price_flight = get_singleflight('ton_price')
+
 
 class TonConnectService:
  
@@ -23,6 +28,9 @@ class TonConnectService:
         logger.info("✅ TON Connect сервис инициализирован")
     
     def get_ton_price_rub(self) -> float:
+        return _ton_price_flight.do('rub', self._fetch_ton_price_rub)
+
+    def _fetch_ton_price_rub(self) -> float:
    
         try:
       
@@ -90,6 +90,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initOfferPage();
     loadUserProfile();
     loadUserBalance();
+    startEventStream();
     preloadModalAnimations(); // Предзагрузка анимаций
     loadLanguagePreference(); // Загрузка языковых настроек
     // Wait slightly for auth data to be ready before loading bloggers
@@ -159,6 +160,14 @@ function initTelegramWebApp() {
     }
 }
 
+// Avatar with initials served by the app (/avatars/<bg>/<initials>.svg) instead of ui-avatars.com
+// Инициалы считаются так же, как utils/media_cache.get_initials на сервере
+function initialsAvatarUrl(name, background = '2481cc') {
+    const words = String(name || '').match(/[\p{L}\p{N}]+/gu) || [];
+    const initials = words.slice(0, 2).map(word => word[0]).join('').toUpperCase().slice(0, 2) || '?';
+    return `/avatars/${background}/${encodeURIComponent(initials)}.svg`;
+}
+
 // Helper function to make authenticated requests
 async function authenticatedFetch(url, options = {}) {
     // Check if we have initData
@@ -235,7 +244,7 @@ async function loadUserProfile() {
             userAvatar.src = userProfile.photo_url;
         } else {
             // Generate avatar from name
-            userAvatar.src = `https://ui-avatars.com/api/?name=${encodeURIComponent(fullName)}&background=2481cc&color=fff&size=200`;
+            userAvatar.src = initialsAvatarUrl(fullName);
         }
         
         // Check if user is blogger and update button
@@ -349,22 +358,7 @@ async function loadUserBalance() {
         }
         
         const data = await response.json();
-        
-        // Update balance in profile page
-        const balanceElement = document.getElementById('user-balance');
-        if (balanceElement) {
-            const rawBalance = data.balance ?? 0;
-            const formatted = formatBalanceCompact(rawBalance);
-            balanceElement.textContent = formatted;
-        }
-        
-        // Update balance in buy page
-        const balanceElementBuy = document.getElementById('user-balance-buy');
-        if (balanceElementBuy) {
-            const rawBalance = data.balance ?? 0;
-            const formatted = formatBalanceCompact(rawBalance);
-            balanceElementBuy.textContent = formatted;
-        }
+        renderUserBalance(data.balance);
     } catch (error) {
         console.error('Error loading balance:', error);
         
@@ -382,6 +376,106 @@ async function loadUserBalance() {
     }
 }
 
+// Show balance in profile and buy page pills
+function renderUserBalance(balance) {
+    const formatted = formatBalanceCompact(balance ?? 0);
+    
+    // Update balance in profile page
+    const balanceElement = document.getElementById('user-balance');
+    if (balanceElement) {
+        balanceElement.textContent = formatted;
+    }
+    
+    // Update balance in buy page
+    const balanceElementBuy = document.getElementById('user-balance-buy');
+    if (balanceElementBuy) {
+        balanceElementBuy.textContent = formatted;
+    }
+}
+
+// ===== EVENT STREAM =====
+
+// Поток событий сервера (/api/stream): новые сообщения, непрочитанные,
+// баланс, статусы рекламных постов, премиум-поста и платежей.
+// Пока поток подключён, периодический опрос этих данных пропускается;
+// при обрыве браузер переподключается сам и сервер досылает пропущенное
+let eventStream = null;
+let eventStreamConnected = false;
+
+function isEventStreamConnected() {
+    return eventStreamConnected;
+}
+
+function refreshChatsListIfVisible() {
+    const chatPage = document.getElementById('chat-page');
+    if (chatPage && chatPage.classList.contains('active')) {
+        loadChatsList();
+    }
+}
+
+function startEventStream() {
+    if (!initDataRaw || typeof EventSource === 'undefined' || eventStream) return;
+    
+    // EventSource не умеет передавать заголовки - initData идёт в query
+    eventStream = new EventSource(`/api/stream?tma=${encodeURIComponent(initDataRaw)}`);
+    
+    eventStream.onopen = () => {
+        eventStreamConnected = true;
+    };
+    
+    eventStream.onerror = () => {
+        eventStreamConnected = false;
+        // Закрытый поток (например, истёк initData) не переподключается - остаётся опрос
+        if (eventStream && eventStream.readyState === EventSource.CLOSED) {
+            eventStream = null;
+        }
+    };
+    
+    eventStream.addEventListener('chat_message', (event) => {
+        const data = JSON.parse(event.data);
+        const currentUserId = Number(userData?.id || userData?.user_id);
+        const chatPartnerId = Number(data.sender_id) === currentUserId ? data.receiver_id : data.sender_id;
+        if (
+            currentChatBlogger &&
+            Number(currentChatBlogger.user_id) === Number(chatPartnerId) &&
+            Number(currentChatBlogger.channel_id || 0) === Number(data.channel_id || 0)
+        ) {
+            loadChatMessages({ isAutoRefresh: true });
+        }
+        refreshChatsListIfVisible();
+    });
+    
+    eventStream.addEventListener('unread', () => {
+        refreshChatsListIfVisible();
+    });
+    
+    eventStream.addEventListener('balance', (event) => {
+        renderUserBalance(JSON.parse(event.data).balance);
+    });
+    
+    eventStream.addEventListener('ad_post', (event) => {
+        const data = JSON.parse(event.data);
+        if (
+            currentChatBlogger &&
+            [data.buyer_id, data.blogger_id].map(Number).includes(Number(currentChatBlogger.user_id))
+        ) {
+            loadChatMessages({ isAutoRefresh: true });
+        }
+        loadUserStats();
+    });
+    
+    eventStream.addEventListener('premium_post', (event) => {
+        if (JSON.parse(event.data).session_id === window.premiumPostSessionId) {
+            checkPremiumPostStatus();
+        }
+    });
+    
+    // Статусы платежей слушает payment.js
+    eventStream.addEventListener('payment', (event) => {
+        window.dispatchEvent(new CustomEvent('app:payment', { detail: JSON.parse(event.data) }));
+    });
+}
+
 // Navigation
 function initNavigation() {
     const navButtons = document.querySelectorAll('.nav-btn');
@@ -603,52 +697,34 @@ function initSearch() {
 }
 
 // Apply filter function
+// Сортировка выполняется на сервере: карточки перезагружаются с нужным sort
+const CATALOG_SORT_BY_FILTER = {
+    all: 'id',
+    popular: '-subscribers', // от большего количества подписчиков к меньшему
+    price: 'price' // от меньшей цены к большей
+};
+
 function applyFilter(filter) {
     console.log(`Applying filter: ${filter}`);
-    
-    const feed = document.getElementById('bloggers-feed');
-    if (!feed) return;
-    
-    const cards = Array.from(feed.querySelectorAll('.blogger-card-wrapper'));
-    
-    if (filter === 'popular') {
-        // Сортировка по популярности: от большего количества подписчиков к меньшему
-        cards.sort((a, b) => {
-            const subsA = parseInt(a.dataset.subscribers || '0');
-            const subsB = parseInt(b.dataset.subscribers || '0');
-            return subsB - subsA; // От большего к меньшему
-        });
-    } else if (filter === 'price') {
-        // Сортировка по цене: от меньшей к большей
-        cards.sort((a, b) => {
-            const priceA = parseInt(a.dataset.price || '0');
-            const priceB = parseInt(b.dataset.price || '0');
-            return priceA - priceB; // От меньшего к большему
-        });
-    }
-    // Если filter === 'all', оставляем исходный порядок (не сортируем)
-    
-    // Перестраиваем DOM в новом порядке
-    cards.forEach(card => feed.appendChild(card));
+
+    catalogSort = CATALOG_SORT_BY_FILTER[filter] || 'id';
+    loadBloggers();
 }
 
 // Perform search function
+// Поиск идёт на сервере (/api/bloggers/search); запрос уходит после паузы в наборе
+const SEARCH_DEBOUNCE_MS = 250;
+let searchTimer = null;
+
 function performSearch(query) {
     console.log(`Searching for: ${query}`);
-    
-    // Filter existing blogger cards
-    const feed = document.getElementById('bloggers-feed');
-    const cards = feed.querySelectorAll('.blogger-card-wrapper');
-    const lowerQuery = query.toLowerCase();
-    
-    cards.forEach(card => {
-        const name = card.querySelector('.blogger-channel-name').textContent.toLowerCase();
-        if (name.includes(lowerQuery)) {
-            card.style.display = 'block';
-        } else {
-            card.style.display = 'none';
-        }
-    });
+
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        if (query === catalogQuery) return;
+        catalogQuery = query;
+        loadBloggers();
+    }, SEARCH_DEBOUNCE_MS);
 }
 
 // Handle "Add offer" button click on Offer page
@@ -767,6 +843,14 @@ const TOPIC_GROUPS = {
 let selectedTopics = new Set();
 let allBloggers = [];
 
+// Catalog paging state (/api/bloggers/list?sort=...&cursor=...)
+const CATALOG_PAGE_SIZE = 30;
+let catalogSort = 'id';
+let catalogQuery = '';
+let catalogNextCursor = null;
+let catalogRequestId = 0;
+let catalogObserver = null;
+
 // Initialize topics menu
 function initTopicsMenu() {
     const menu = document.getElementById('topics-menu');
@@ -858,38 +942,9 @@ function toggleTopic(groupKey, subKey, element) {
 }
 
 // Apply topics filter
+// Фильтр по тематикам выполняется на сервере (?topics=group:sub,...)
 function applyTopicsFilter() {
-    const feed = document.getElementById('bloggers-feed');
-    if (!feed) return;
-    
-    const cards = feed.querySelectorAll('.blogger-card-wrapper');
-    
-    if (selectedTopics.size === 0) {
-        // Show all if no topics selected
-        cards.forEach(card => {
-            card.style.display = 'block';
-        });
-    } else {
-        // Filter by selected topics
-        cards.forEach(card => {
-            const groupKey = card.dataset.topicGroupKey || '';
-            const subKey = card.dataset.topicSubKey || '';
-            
-            // Only filter if we have valid topic keys
-            if (!groupKey || !subKey) {
-                // Hide bloggers without topic data when filtering
-                card.style.display = 'none';
-                return;
-            }
-            
-            const topicKey = `${groupKey}:${subKey}`;
-            if (selectedTopics.has(topicKey)) {
-                card.style.display = 'block';
-            } else {
-                card.style.display = 'none';
-            }
-        });
-    }
+    loadBloggers();
 }
 
 // Toggle topics dropdown
@@ -933,134 +988,183 @@ function toggleTopicsDropdown() {
 
 // Close topics dropdown when clicking outside (handled by overlay click handler in initFilters)
 
-// Load bloggers list
-async function loadBloggers() {
-    console.log('🔄 loadBloggers() called');
+// Build catalog query for the current sort, topics and search string
+function buildCatalogUrl(cursor) {
+    if (catalogQuery) {
+        // Результаты поиска ранжируются по релевантности и приходят одной страницей
+        const params = new URLSearchParams({
+            q: catalogQuery,
+            limit: String(CATALOG_PAGE_SIZE)
+        });
+        if (selectedTopics.size > 0) {
+            params.set('topics', Array.from(selectedTopics).join(','));
+        }
+        return `/api/bloggers/search?${params.toString()}`;
+    }
+
+    const params = new URLSearchParams({
+        sort: catalogSort,
+        limit: String(CATALOG_PAGE_SIZE)
+    });
+    if (selectedTopics.size > 0) {
+        params.set('topics', Array.from(selectedTopics).join(','));
+    }
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return `/api/bloggers/list?${params.toString()}`;
+}
+
+// Create a card for one catalog entry
+function createBloggerCard(blogger) {
+    // Подготавливаем данные блогера
+    const bloggerData = {
+        id: blogger.channel_id || blogger.id, // ДОБАВЛЕНО: id канала для разделения чатов
+        channel_id: blogger.channel_id || blogger.id, // ДОБАВЛЕНО: channel_id для разделения чатов
+        user_id: blogger.user_id,
+        photo_url: blogger.image,
+        name: blogger.name,
+        subscribers: formatNumber(blogger.subscribers),
+        subscribers_raw: blogger.subscribers, // Сохраняем исходное значение для сортировки
+        price: blogger.price,
+        price_raw: blogger.raw_price || 0, // Сохраняем числовое значение цены для сортировки
+        pricePermanent: blogger.price_permanent || null,
+        channel_link: blogger.channel_link,
+        topic_group_key: blogger.topic_group_key || '',
+        topic_sub_key: blogger.topic_sub_key || '',
+        topic_sub_title: blogger.topic_sub_title || '',
+        rating: blogger.rating || 0,
+        image: blogger.image // ДОБАВЛЕНО: сохраняем image для совместимости
+    };
+
+    // Check if xssProtection is available
+    if (!window.xssProtection || !window.xssProtection.createSafeBloggerCard) {
+        console.error('❌ window.xssProtection.createSafeBloggerCard not available!');
+        console.error('window.xssProtection:', window.xssProtection);
+        return null;
+    }
+
+    // Используем БЕЗОПАСНУЮ функцию создания карточки
+    const card = window.xssProtection.createSafeBloggerCard(bloggerData);
+
+    if (!card) {
+        console.error('❌ Failed to create card for blogger:', blogger.name);
+        return null;
+    }
+
+    // Добавляем рейтинг если есть (безопасно)
+    if (bloggerData.rating > 0) {
+        const avatarWrapper = card.querySelector('.blogger-avatar-wrapper');
+        if (avatarWrapper) {
+            const badge = document.createElement('div');
+            badge.className = 'blogger-rating-badge';
+
+            const value = document.createElement('span');
+            value.className = 'rating-value';
+            value.textContent = bloggerData.rating;
+
+            const star = document.createElement('span');
+            star.className = 'rating-star';
+            star.textContent = '⭐';
+
+            badge.appendChild(value);
+            badge.appendChild(star);
+            avatarWrapper.appendChild(badge);
+        }
+    }
+
+    return card;
+}
+
+// Load the next catalog page when the end of the feed becomes visible
+function observeCatalogEnd(feed) {
+    if (catalogObserver) {
+        catalogObserver.disconnect();
+        catalogObserver = null;
+    }
+    feed.querySelector('.catalog-sentinel')?.remove();
+    if (!catalogNextCursor) return;
+
+    const sentinel = document.createElement('div');
+    sentinel.className = 'catalog-sentinel';
+    feed.appendChild(sentinel);
+
+    catalogObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            catalogObserver.disconnect();
+            catalogObserver = null;
+            loadBloggers(true);
+        }
+    }, { rootMargin: '400px' });
+    catalogObserver.observe(sentinel);
+}
+
+// Load bloggers list (first page, or the next one when append = true)
+async function loadBloggers(append = false) {
+    console.log('🔄 loadBloggers() called', { append, sort: catalogSort });
     try {
         // Need auth data first
         if (!initDataRaw) {
             console.warn('⚠️ No initDataRaw, retrying in 500ms...');
             // Wait a bit and try again if initData not ready
-            setTimeout(loadBloggers, 500);
+            setTimeout(() => loadBloggers(append), 500);
             return;
         }
+        if (append && !catalogNextCursor) return;
+
+        // Ответ на устаревший запрос (сменили сортировку/тематику) отбрасываем
+        const requestId = ++catalogRequestId;
+        const url = buildCatalogUrl(append ? catalogNextCursor : null);
+        console.log(`📡 Fetching bloggers from ${url}...`);
+        const response = await authenticatedFetch(url);
 
-        console.log('📡 Fetching bloggers from /api/bloggers/list...');
-        const response = await authenticatedFetch('/api/bloggers/list');
-        console.log('📡 Response status:', response.status, response.ok);
-        
         if (!response.ok) {
             console.error('❌ Response not OK:', response.status, response.statusText);
             throw new Error('Failed to load bloggers');
         }
-        
+
         const data = await response.json();
-        console.log('📊 Bloggers data received:', data);
-        console.log('📊 Bloggers count:', data.bloggers ? data.bloggers.length : 0);
-        
+        if (requestId !== catalogRequestId) return;
+
         const feed = document.getElementById('bloggers-feed');
-        
+
         if (!feed) {
             console.error('❌ bloggers-feed element not found!');
             return;
         }
-        
-        console.log('✅ Feed element found');
-        
-        // Store all bloggers for filtering
-        allBloggers = data.bloggers || [];
-        console.log('📦 Stored allBloggers:', allBloggers.length);
-        
-        if (allBloggers.length > 0) {
-            console.log('🎨 Creating blogger cards...');
+
+        const page = data.bloggers || [];
+        catalogNextCursor = data.next_cursor || null;
+        console.log('📊 Bloggers page received:', page.length, 'next:', Boolean(catalogNextCursor));
+
+        // Store loaded bloggers
+        allBloggers = append ? allBloggers.concat(page) : page;
+
+        if (!append) {
             feed.innerHTML = ''; // Clear existing content
-            
-            allBloggers.forEach((blogger, index) => {
-                console.log(`🔨 Creating card ${index + 1}/${allBloggers.length} for:`, blogger.name);
-                console.log(`   📊 Blogger data from API:`, blogger); // DEBUG: Показываем все данные
-                console.log(`   🔑 channel_id:`, blogger.channel_id); // DEBUG: Показываем channel_id
-                
-                // Подготавливаем данные блогера
-                const bloggerData = {
-                    id: blogger.channel_id || blogger.id, // ДОБАВЛЕНО: id канала для разделения чатов
-                    channel_id: blogger.channel_id || blogger.id, // ДОБАВЛЕНО: channel_id для разделения чатов
-                    user_id: blogger.user_id,
-                    photo_url: blogger.image,
-                    name: blogger.name,
-                    subscribers: formatNumber(blogger.subscribers),
-                    subscribers_raw: blogger.subscribers, // Сохраняем исходное значение для сортировки
-                    price: blogger.price,
-                    price_raw: blogger.raw_price || 0, // Сохраняем числовое значение цены для сортировки
-                    pricePermanent: blogger.price_permanent || null,
-                    channel_link: blogger.channel_link,
-                    topic_group_key: blogger.topic_group_key || '',
-                    topic_sub_key: blogger.topic_sub_key || '',
-                    topic_sub_title: blogger.topic_sub_title || '',
-                    rating: blogger.rating || 0,
-                    image: blogger.image // ДОБАВЛЕНО: сохраняем image для совместимости
-                };
-                
-                console.log(`   ✅ Prepared bloggerData:`, bloggerData); // DEBUG: Показываем подготовленные данные
-                console.log(`   ✅ bloggerData.channel_id:`, bloggerData.channel_id); // DEBUG
-                console.log(`   ✅ bloggerData.id:`, bloggerData.id); // DEBUG
-                
-                // Check if xssProtection is available
-                if (!window.xssProtection || !window.xssProtection.createSafeBloggerCard) {
-                    console.error('❌ window.xssProtection.createSafeBloggerCard not available!');
-                    console.error('window.xssProtection:', window.xssProtection);
-                    return;
-                }
-                
-                // Используем БЕЗОПАСНУЮ функцию создания карточки
-                const card = window.xssProtection.createSafeBloggerCard(bloggerData);
-                
-                if (!card) {
-                    console.error('❌ Failed to create card for blogger:', blogger.name);
-                    return;
-                }
-                
-                // Добавляем рейтинг если есть (безопасно)
-                if (bloggerData.rating > 0) {
-                    const avatarWrapper = card.querySelector('.blogger-avatar-wrapper');
-                    if (avatarWrapper) {
-                        const badge = document.createElement('div');
-                        badge.className = 'blogger-rating-badge';
-                        
-                        const value = document.createElement('span');
-                        value.className = 'rating-value';
-                        value.textContent = bloggerData.rating;
-                        
-                        const star = document.createElement('span');
-                        star.className = 'rating-star';
-                        star.textContent = '⭐';
-                        
-                        badge.appendChild(value);
-                        badge.appendChild(star);
-                        avatarWrapper.appendChild(badge);
-                    }
+        }
+
+        if (allBloggers.length > 0) {
+            page.forEach(blogger => {
+                const card = createBloggerCard(blogger);
+                if (card) {
+                    feed.appendChild(card);
                 }
-                
-                feed.appendChild(card);
-                console.log(`✅ Card ${index + 1} added to feed`);
             });
-            
-            console.log('✅ All cards created, applying topics filter...');
-            // Apply topics filter if any selected
-            applyTopicsFilter();
-            console.log('✅ Topics filter applied');
+            observeCatalogEnd(feed);
         } else {
             console.log('⚠️ No bloggers found, showing empty state');
             feed.innerHTML = `
                 <div class="empty-state" style="padding: 40px 20px; text-align: center; color: #888;">
                     <i data-lucide="users" style="width: 48px; height: 48px; margin-bottom: 16px; opacity: 0.5;"></i>
-                    <p>Пока нет активных блогеров</p>
+                    <p>${catalogQuery ? 'Ничего не найдено' : 'Пока нет активных блогеров'}</p>
                 </div>
             `;
             lucide.createIcons();
         }
-        
+
         console.log('✅ loadBloggers() completed successfully');
-        
+
     } catch (error) {
         console.error('❌ Error loading bloggers:', error);
         console.error('Error stack:', error.stack);
@@ -1600,7 +1704,7 @@ function createOrderCard(order) {
     // Channel info
     const channelName = order.channel_name || `@${order.blogger_username || 'unknown'}`;
     const channelLink = order.channel_link || '#';
-    const channelPhoto = order.channel_photo_url || 'https://ui-avatars.com/api/?name=' + encodeURIComponent(channelName) + '&background=2481cc&color=fff&size=80';
+    const channelPhoto = order.channel_photo_url || initialsAvatarUrl(channelName);
     
     return `
         <div class="order-card">
@@ -1860,7 +1964,7 @@ function createActiveAdCard(ad) {
     // Channel info
     const channelName = ad.channel_name || `@${ad.blogger_username || 'unknown'}`;
     const channelLink = ad.channel_link || '#';
-    const channelPhoto = ad.channel_photo_url || 'https://ui-avatars.com/api/?name=' + encodeURIComponent(channelName) + '&background=2481cc&color=fff&size=80';
+    const channelPhoto = ad.channel_photo_url || initialsAvatarUrl(channelName);
     
     return `
         <div class="order-card">
@@ -2281,9 +2385,9 @@ document.addEventListener('click', function(e) {
     }
 });
 
-// Refresh data periodically
+// Refresh data periodically (while the event stream is down)
 setInterval(() => {
-    if (initDataRaw && userData) {
+    if (initDataRaw && userData && !isEventStreamConnected()) {
         loadUserStats();
         loadUserBalance();
     }
@@ -4115,7 +4219,12 @@ function openPremiumEmojiModal() {
     if (window.premiumPostCheckInterval) {
         clearInterval(window.premiumPostCheckInterval);
     }
-    window.premiumPostCheckInterval = setInterval(checkPremiumPostStatus, 2000);
+    // Пока открыт поток событий, пост приходит событием premium_post
+    window.premiumPostCheckInterval = setInterval(() => {
+        if (!isEventStreamConnected()) {
+            checkPremiumPostStatus();
+        }
+    }, 2000);
 }
 
 // Закрыть модальное окно для премиум-эмодзи
@@ -5696,7 +5805,7 @@ function renderReferralData(data) {
 
         const avatar = document.createElement('img');
         avatar.className = 'referral-avatar';
-        avatar.src = ref.photo_url || `https://ui-avatars.com/api/?name=${encodeURIComponent(ref.display_name || 'User')}&background=111827&color=f9fafb&size=200`;
+        avatar.src = ref.photo_url || initialsAvatarUrl(ref.display_name || 'User', '111827');
         avatar.alt = ref.display_name || 'User';
 
         const main = document.createElement('div');
@@ -7436,7 +7545,7 @@ async function openChatModal(bloggerData) {
         } else {
             // Покупатель видит имя и фото канала/блогера
             displayName = bloggerData.name || '@channel';
-            displayAvatar = bloggerData.photo_url || bloggerData.image || `https://ui-avatars.com/api/?name=${encodeURIComponent(displayName)}&background=2481cc&color=fff&size=48`;
+            displayAvatar = bloggerData.photo_url || bloggerData.image || initialsAvatarUrl(displayName);
             
             // Скрываем аватарку канала
             if (channelAvatarElement) {
@@ -7453,7 +7562,7 @@ async function openChatModal(bloggerData) {
         avatarImg.alt = displayName;
         avatarImg.onerror = function() {
             console.error('Failed to load avatar:', displayAvatar); // DEBUG
-            this.src = `https://ui-avatars.com/api/?name=${encodeURIComponent(displayName)}&background=2481cc&color=fff&size=48`;
+            this.src = initialsAvatarUrl(displayName);
         };
         
         // Clear and set content
@@ -7483,15 +7592,31 @@ async function openChatModal(bloggerData) {
         tg.BackButton.onClick(closeChatModal);
     }
     
-    // Сбрасываем последний ID сообщений для нового диалога
+    // Сбрасываем последний ID сообщений и загруженную историю для нового диалога
     lastChatMessageId = null;
+    resetChatHistory();
+
+    // Подгрузка более старых сообщений при прокрутке к началу чата
+    const messagesContainer = document.getElementById('chat-messages');
+    if (messagesContainer) {
+        messagesContainer.onscroll = () => {
+            if (messagesContainer.scrollTop < 50 && chatHistory.hasMore && !chatHistory.isLoadingOlder) {
+                loadChatMessages({ isHistoryLoad: true });
+            }
+        };
+    }
 
     // Загружаем сообщения как первый рендер (будет красивая анимация старых сообщений)
     await loadChatMessages({ isInitialLoad: true });
     
     // Запускаем автообновление без "первой" анимации —
-    // при нём будут анимироваться только реально новые сообщения
-    chatRefreshInterval = setInterval(() => loadChatMessages({ isAutoRefresh: true }), 5000);
+    // при нём будут анимироваться только реально новые сообщения.
+    // Пока открыт поток событий, новые сообщения приходят событием chat_message
+    chatRefreshInterval = setInterval(() => {
+        if (!isEventStreamConnected()) {
+            loadChatMessages({ isAutoRefresh: true });
+        }
+    }, 5000);
     
     // Initialize Lucide icons
     setTimeout(() => {
@@ -7550,12 +7675,32 @@ function closeChatModal() {
 // ID последнего отрисованного сообщения, чтобы анимацию применять только к новым
 let lastChatMessageId = null;
 
+// Загруженные сообщения открытого чата и курсоры по id:
+// firstId - для подгрузки истории (before_id), lastId - для новых (after_id)
+let chatHistory = null;
+
+function resetChatHistory() {
+    chatHistory = {
+        messages: [],
+        firstId: null,
+        lastId: null,
+        hasMore: false,
+        isLoadingOlder: false,
+        adPostsKey: null
+    };
+}
+
+resetChatHistory();
+
 // Загрузка сообщений чата
 // options:
 // - isInitialLoad: true, когда чат открывается пользователем через кнопку (первый рендер)
 // - isAutoRefresh: true, когда чат обновляется по таймеру, пока пользователь сидит в чате
+// - isHistoryLoad: true, когда подгружается страница более старых сообщений
+// Кроме первого рендера с сервера запрашиваются только сообщения после
+// уже загруженных, а при isHistoryLoad - страница перед ними
 async function loadChatMessages(options = {}) {
-    const { isInitialLoad = false, isAutoRefresh = false } = options;
+    const { isInitialLoad = false, isAutoRefresh = false, isHistoryLoad = false } = options;
     if (!currentChatBlogger || !currentChatBlogger.user_id) {
         console.error('No blogger data available');
         return;
@@ -7563,16 +7708,50 @@ async function loadChatMessages(options = {}) {
     
     try {
         // Загружаем обычные сообщения с учетом channel_id
-        const channelParam = currentChatBlogger.channel_id ? `?channel_id=${currentChatBlogger.channel_id}` : '';
-        const response = await authenticatedFetch(`/api/chat/messages/${currentChatBlogger.user_id}${channelParam}`);
+        const params = new URLSearchParams();
+        if (currentChatBlogger.channel_id) {
+            params.set('channel_id', currentChatBlogger.channel_id);
+        }
+        const isIncremental = !isInitialLoad && !isHistoryLoad && chatHistory.lastId !== null;
+        if (isHistoryLoad) {
+            if (chatHistory.firstId === null) return;
+            params.set('before_id', chatHistory.firstId);
+            chatHistory.isLoadingOlder = true;
+        } else if (isIncremental) {
+            params.set('after_id', chatHistory.lastId);
+        }
+        const query = params.toString();
+        let response;
+        try {
+            response = await authenticatedFetch(`/api/chat/messages/${currentChatBlogger.user_id}${query ? `?${query}` : ''}`);
+        } finally {
+            chatHistory.isLoadingOlder = false;
+        }
         
-        console.log(`📥 Loading messages: blogger=${currentChatBlogger.user_id}, channel=${currentChatBlogger.channel_id || 'none'}`); // DEBUG
+        console.log(`📥 Loading messages: blogger=${currentChatBlogger.user_id}, channel=${currentChatBlogger.channel_id || 'none'}, ${query}`); // DEBUG
         
         if (!response.ok) {
             throw new Error('Failed to load messages');
         }
         
         const data = await response.json();
+        const newMessages = data.messages || [];
+        if (isHistoryLoad) {
+            chatHistory.messages = newMessages.concat(chatHistory.messages);
+        } else if (isIncremental) {
+            chatHistory.messages = chatHistory.messages.concat(newMessages);
+        } else {
+            chatHistory.messages = newMessages;
+        }
+        if (isHistoryLoad || !isIncremental) {
+            chatHistory.hasMore = Boolean(data.has_more);
+            if (data.first_id !== null && data.first_id !== undefined) {
+                chatHistory.firstId = data.first_id;
+            }
+        }
+        if (!isHistoryLoad && data.last_id !== null && data.last_id !== undefined) {
+            chatHistory.lastId = data.last_id;
+        }
         const messagesContainer = document.getElementById('chat-messages');
         
         if (!messagesContainer) return;
@@ -7634,13 +7813,20 @@ async function loadChatMessages(options = {}) {
             console.error('Error loading ad posts:', e);
         }
 
-        if ((data.messages && data.messages.length > 0) || adPosts.length > 0) {
+        // Ничего не изменилось с прошлого обновления - не перерисовываем чат
+        const adPostsKey = JSON.stringify(adPosts);
+        if (isIncremental && newMessages.length === 0 && adPostsKey === chatHistory.adPostsKey) {
+            return;
+        }
+        chatHistory.adPostsKey = adPostsKey;
+
+        if (chatHistory.messages.length > 0 || adPosts.length > 0) {
             // Полностью перерисовываем чат, объединяя обычные сообщения и карточки постов по времени
             messagesContainer.innerHTML = '';
 
             const combinedItems = [];
 
-            (data.messages || []).forEach(message => {
+            chatHistory.messages.forEach(message => {
                 combinedItems.push({
                     type: 'message',
                     createdAt: message.created_at,
@@ -8189,7 +8375,7 @@ function renderReviewRequest(reviewData) {
     
     // Fallback на placeholder если аватарки нет
     if (!avatarUrl || avatarUrl === '/static/pic/default-avatar.png') {
-        avatarUrl = `https://ui-avatars.com/api/?name=User&background=2481cc&color=fff&size=200`;
+        avatarUrl = initialsAvatarUrl('User');
     }
     
     const rating = reviewData.rating || 0;
@@ -8201,7 +8387,7 @@ function renderReviewRequest(reviewData) {
     
     reviewElement.innerHTML = `
         <div class="review-avatar-wrapper">
-            <img src="${avatarUrl}" alt="Avatar" class="review-avatar" onerror="this.src='https://ui-avatars.com/api/?name=User&background=2481cc&color=fff&size=200'">
+            <img src="${avatarUrl}" alt="Avatar" class="review-avatar" onerror="this.src='${initialsAvatarUrl('User')}'">
             <div class="review-rating-badge">
                 <span class="review-rating-value">${rating}</span>
                 <svg class="review-rating-star" xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 24 24" fill="currentColor">
@@ -8326,6 +8512,8 @@ function renderReviewRequest(reviewData) {
             if (response.ok) {
                 // Clear saved state
                 delete reviewCardStates[reviewData.id];
+                // Сервер больше не отдаёт запрос отзыва - убираем его и из загруженной истории
+                chatHistory.messages = chatHistory.messages.filter(message => Number(message.id) !== Number(reviewData.id));
                 
                 const responseData = await response.json();
                 
@@ -8542,7 +8730,7 @@ async function loadChatsList() {
                 const displayPhoto = conversation.buyer_photo || conversation.photo_url;
                 
                 // ИСПРАВЛЕНИЕ: Добавляем fallback для аватарки если photo_url пустой
-                const avatarUrl = displayPhoto || `https://ui-avatars.com/api/?name=${encodeURIComponent(displayName)}&background=2481cc&color=fff&size=200`;
+                const avatarUrl = displayPhoto || initialsAvatarUrl(displayName);
                 
                 // Создаем HTML с аватаркой канала справа (только для блогера)
                 let channelAvatarHtml = '';
@@ -8556,7 +8744,7 @@ async function loadChatsList() {
                 
                 chatItem.innerHTML = `
                     <div class="chat-item-avatar">
-                        <img src="${avatarUrl}" alt="${displayName}" onerror="this.src='https://ui-avatars.com/api/?name=${encodeURIComponent(displayName)}&background=2481cc&color=fff&size=200'">
+                        <img src="${avatarUrl}" alt="${displayName}" onerror="this.src='${initialsAvatarUrl(displayName)}'">
                     </div>
                     <div class="chat-item-content">
                         <div class="chat-item-header">
@@ -2,6 +2,7 @@ class PaymentManager {
     constructor() {
         this.currentPaymentId = null;
         this.checkInterval = null;
+        this.paymentEventHandler = null;
     }
     async createPayment(amount) {
         try {
@@ -60,29 +61,50 @@ class PaymentManager {
         this.currentPaymentId = paymentId;
         let checkCount = 0;
         const maxChecks = 60; 
-        if (this.checkInterval) {
-            clearInterval(this.checkInterval);
-        }
-        this.checkInterval = setInterval(async () => {
-            checkCount++;
+        this.stopStatusCheck();
+        // true, если платёж завершён (успешно или отменён)
+        const check = async () => {
             try {
                 const status = await this.checkPaymentStatus(paymentId);
+                // Проверку уже завершил параллельный вызов (событие и таймер)
+                if (!this.checkInterval) {
+                    return true;
+                }
                 if (status.status === 'succeeded' && status.paid) {
                     console.log('✅ Платёж успешно завершён!');
                     this.stopStatusCheck();
                     if (onSuccess) onSuccess(status);
+                    return true;
                 } else if (status.status === 'canceled') {
                     console.log('❌ Платёж отменён');
                     this.stopStatusCheck();
                     if (onCancel) onCancel(status);
-                } else if (checkCount >= maxChecks) {
-                    console.log('⏱️ Превышено время ожидания платежа');
-                    this.stopStatusCheck();
-                    if (onCancel) onCancel({ status: 'timeout' });
+                    return true;
                 }
             } catch (error) {
                 console.error('❌ Ошибка проверки статуса:', error);
             }
+            return false;
+        };
+        // Смена статуса приходит из потока событий (app.js) - проверяем сразу
+        this.paymentEventHandler = (event) => {
+            if (event.detail && event.detail.payment_id === paymentId) {
+                check();
+            }
+        };
+        window.addEventListener('app:payment', this.paymentEventHandler);
+        // Опрос остаётся: статус в payments обновляет сам /status/<id> (или
+        // вебхук YooKassa, который может не прийти), событие лишь ускоряет
+        this.checkInterval = setInterval(async () => {
+            checkCount++;
+            if (await check()) {
+                return;
+            }
+            if (checkCount >= maxChecks && this.checkInterval) {
+                console.log('⏱️ Превышено время ожидания платежа');
+                this.stopStatusCheck();
+                if (onCancel) onCancel({ status: 'timeout' });
+            }
         }, 5000); 
     }
     stopStatusCheck() {
@@ -90,6 +112,10 @@ class PaymentManager {
             clearInterval(this.checkInterval);
             this.checkInterval = null;
         }
+        if (this.paymentEventHandler) {
+            window.removeEventListener('app:payment', this.paymentEventHandler);
+            this.paymentEventHandler = null;
+        }
     }
     async getPaymentHistory(limit = 10) {
         try {
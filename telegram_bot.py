@@ -2,8 +2,8 @@ import asyncio
 import logging
 import os
 import sqlite3
-import re
 import json
+import time
 import requests
 from datetime import datetime, timezone, timedelta
 
@@ -15,6 +15,7 @@ except ImportError:
     pass  # dotenv не установлен, используем системные переменные
 
 from aiogram import Bot, Dispatcher, F, BaseMiddleware
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.types import (
     Message,
@@ -31,7 +32,19 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from typing import Callable, Dict, Any, Awaitable
+from database.async_db import get_async_db
 from database.db import init_db
+from database.models import ChatMessage
+from database.notification_outbox import NotificationOutbox
+from database.pool import get_pool
+from database.rating_model import RatingStats
+from database.user_events import UserEvents
+from utils.channel_links import extract_channel_username
+from utils.flood_control import FloodControl
+from utils.loop_lag import LoopLagMonitor
+from utils.media_cache import mirror_chat_photo
+from utils.singleflight import get_async_singleflight, singleflight_totals
+from utils.topics import TOPIC_GROUPS
 
 logging.basicConfig(
     level=logging.INFO,
@@ -49,106 +62,6 @@ DATABASE_PATH = 'users.db'
 
 MOSCOW_TZ = timezone(timedelta(hours=3))
 
-TOPIC_GROUPS = {
-    "news_media": {
-        "title": "🔷 Новости и медиа",
-        "subtopics": [
-            ("world_news", "Новости мира"),
-            ("city_news", "Новости городов"),
-            ("economy_news", "Экономические новости"),
-            ("entertainment_news", "Развлекательные новости"),
-        ],
-    },
-    "business_finance": {
-        "title": "🔷 Бизнес и финансы",
-        "subtopics": [
-            ("personal_finance", "Личные финансы"),
-            ("investments", "Инвестиции"),
-            ("trading", "Трейдинг"),
-            ("crypto", "Криптовалюты"),
-            ("real_estate", "Недвижимость"),
-            ("entrepreneurship", "Предпринимательство"),
-            ("marketing_ads", "Маркетинг и реклама"),
-        ],
-    },
-    "education": {
-        "title": "🔷 Образование",
-        "subtopics": [
-            ("courses", "Курсы и обучение"),
-            ("exams", "ЕГЭ/ОГЭ"),
-            ("languages", "Иностранные языки"),
-            ("it_education", "IT-образование"),
-            ("psychology", "Психология"),
-            ("science_pop", "Научно-популярный контент"),
-        ],
-    },
-    "technology": {
-        "title": "🔷 Технологии",
-        "subtopics": [
-            ("it_news", "IT новости"),
-            ("dev", "Разработка"),
-            ("gadgets", "Гаджеты"),
-            ("ai", "Искусственный интеллект"),
-            ("cybersec", "Кибербезопасность"),
-        ],
-    },
-    "fun": {
-        "title": "🔷 Юмор и развлечения",
-        "subtopics": [
-            ("memes", "Мемы"),
-            ("jokes", "Приколы"),
-            ("entertainment_content", "Развлекательный контент"),
-            ("stories", "Истории, рассказы"),
-        ],
-    },
-    "literature": {
-        "title": "🔷 Литература и творчество",
-        "subtopics": [
-            ("author_texts", "Авторские тексты"),
-            ("writers", "Писатели, поэты"),
-            ("fanfiction", "Фанфикшн"),
-            ("illustrations", "Иллюстрации"),
-        ],
-    },
-    "lifestyle": {
-        "title": "🔷 Лайфстайл",
-        "subtopics": [
-            ("self_growth", "Саморазвитие"),
-            ("motivation", "Мотивация"),
-            ("relationship_psychology", "Психология отношений"),
-            ("fashion", "Мода"),
-            ("style", "Стиль"),
-            ("travel", "Путешествия"),
-        ],
-    },
-    "health": {
-        "title": "🔷 Здоровье",
-        "subtopics": [
-            ("sport", "Спорт"),
-            ("nutrition", "Питание"),
-            ("healthy_life", "Здоровый образ жизни"),
-            ("medicine", "Медицина"),
-        ],
-    },
-    "gaming": {
-        "title": "🔷 Игры и гейминг",
-        "subtopics": [
-            ("mobile_games", "Мобильные игры"),
-            ("pc_console", "ПК и консоли"),
-            ("guides_reviews", "Гайды, читы, обзоры"),
-        ],
-    },
-    "hobbies": {
-        "title": "🔷 Хобби",
-        "subtopics": [
-            ("music", "Музыка"),
-            ("movies", "Фильмы"),
-            ("anime", "Аниме"),
-            ("auto_moto", "Авто/мото"),
-        ],
-    },
-}
-
 
 def _resolve_photo_input(path: str):
     """
@@ -189,10 +102,31 @@ class PremiumPostStates(StatesGroup):
 
 
 def get_db_connection():
-    """Создать подключение к базе данных"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Взять подключение к базе данных из пула (close() возвращает его в пул)"""
+    return get_pool(DATABASE_PATH).acquire(row_factory=sqlite3.Row)
+
+
+# Запросы из корутин: выполняются в пуле потоков, event loop не ждёт SQLite
+async_db = get_async_db(DATABASE_PATH)
+loop_lag_monitor = LoopLagMonitor()
+
+
+# Одновременные запросы аватара одного пользователя (пачка завершённых
+# постов одного покупателя) делят один get_chat и одно скачивание фото
+telegram_chat_flight = get_async_singleflight('bot_get_chat')
+
+
+async def _fetch_user_photo_url(user_id):
+    chat = await bot.get_chat(user_id)
+    if not chat.photo:
+        return None
+    # Скачивание и запись в медиакэш - в пуле потоков базы, не в event loop
+    return await async_db.run(mirror_chat_photo, chat.photo)
+
+
+async def get_user_photo_url(user_id):
+    """URL аватара пользователя Telegram или None, если аватара нет."""
+    return await telegram_chat_flight.do(user_id, _fetch_user_photo_url, user_id)
 
 
 def dict_from_row(row):
@@ -296,7 +230,7 @@ def notify_admin_about_application_sync(application_id: int):
 
 
 async def notify_admin_about_application(application_id: int):
-    notify_admin_about_application_sync(application_id)
+    await asyncio.to_thread(notify_admin_about_application_sync, application_id)
 
 
 def notify_admin_about_channel_sync(channel_id: int):
@@ -337,7 +271,7 @@ def notify_admin_about_channel_sync(channel_id: int):
         username = f"@{channel_data['username']}" if channel_data['username'] else "Не указан"
         full_name = f"{channel_data['first_name']} {channel_data['last_name']}".strip()
         channel_name = channel_data.get('channel_name') or 'Не указано'
-        subscribers = channel_data.get('subscribers_count') or '0'
+        subscribers = channel_data.get('subscribers_count') or 0
         
         message_text = (
             "🆕 <b>Новый канал на одобрение</b>\n\n"
@@ -399,7 +333,7 @@ def notify_admin_about_channel_sync(channel_id: int):
 
 
 async def notify_admin_about_channel(channel_id: int):
-    notify_admin_about_channel_sync(channel_id)
+    await asyncio.to_thread(notify_admin_about_channel_sync, channel_id)
 
 
 def notify_admin_about_withdrawal_sync(request_id: int):
@@ -516,7 +450,7 @@ def notify_admin_about_withdrawal_sync(request_id: int):
 
 async def notify_admin_about_withdrawal(request_id: int):
     """Отправить уведомление админу о запросе на вывод средств (async обертка для совместимости)"""
-    notify_admin_about_withdrawal_sync(request_id)
+    await asyncio.to_thread(notify_admin_about_withdrawal_sync, request_id)
 
 
 
@@ -669,6 +603,111 @@ async def handle_topic_back(callback: CallbackQuery):
         await callback.answer("❌ Ошибка при обработке кнопки назад", show_alert=True)
 
 
+def _fetch_channel_info(channel_id):
+    """Название, число подписчиков и фото (из getChat) канала через Bot API.
+
+    Синхронные запросы requests - вызывать через asyncio.to_thread.
+    Ошибка getChat пробрасывается; без getChatMemberCount подписчиков 0.
+    """
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
+    response = requests.post(url, json={'chat_id': channel_id}, timeout=10)
+    response.raise_for_status()
+    chat_data = response.json()
+    if not chat_data.get('ok'):
+        raise Exception(f"Telegram API error: {chat_data.get('description')}")
+
+    chat = chat_data['result']
+    channel_name = chat.get('title', '')
+    logger.info(f"✅ Got channel name: {channel_name}")
+
+    subscribers_count = 0
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMemberCount"
+    response = requests.post(url, json={'chat_id': channel_id}, timeout=10)
+    response.raise_for_status()
+    count_data = response.json()
+    if count_data.get('ok'):
+        member_count = count_data['result']
+        subscribers_count = max(member_count, 0)
+        logger.info(f"✅ Got subscribers count: {subscribers_count} (raw: {member_count})")
+    return channel_name, subscribers_count, chat.get('photo')
+
+
+def _approve_application(cursor, app_data, group_key, group_title, sub_key, subtopic_title,
+                         channel_name, channel_photo_url, subscribers_count):
+    """Одобрить заявку с тематикой: статус заявки, тип пользователя и канал в blogger_channels."""
+    application_id = app_data["id"]
+    user_id = app_data["user_id"]
+    channel_link = app_data.get("channel_link", "")
+    channel_id = app_data.get("channel_id", "") or ""
+
+    cursor.execute(
+        """
+        UPDATE blogger_applications
+        SET status = 'approved',
+            topic_group_key = ?,
+            topic_group_title = ?,
+            topic_sub_key = ?,
+            topic_sub_title = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (group_key, group_title, sub_key, subtopic_title, application_id),
+    )
+
+    cursor.execute(
+        """
+        UPDATE users
+        SET user_type = 'blogger', updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = ?
+        """,
+        (user_id,),
+    )
+
+    logger.info(f"🔍 Checking if channel exists in blogger_channels for user {user_id}")
+    cursor.execute("""
+        SELECT id FROM blogger_channels 
+        WHERE user_id = ? AND channel_link = ?
+    """, (user_id, channel_link))
+    existing_channel = cursor.fetchone()
+
+    if not existing_channel:
+        logger.info(f"💾 Inserting into blogger_channels: user_id={user_id}, channel_id='{channel_id}', name='{channel_name}', subs='{subscribers_count}'")
+        cursor.execute("""
+            INSERT INTO blogger_channels (
+                user_id, channel_link, channel_username, channel_id, channel_name,
+                channel_photo_url, subscribers_count,
+                topic_group_key, topic_group_title,
+                topic_sub_key, topic_sub_title,
+                is_verified, is_active
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 1)
+        """, (
+            user_id, channel_link, extract_channel_username(channel_link), channel_id, channel_name,
+            channel_photo_url, subscribers_count,
+            group_key, group_title, sub_key, subtopic_title
+        ))
+        logger.info(f"✅ Created channel #{cursor.lastrowid} in blogger_channels for user {user_id}")
+    else:
+        existing_channel_id = existing_channel['id']
+        logger.info(f"⚠️ Channel already exists in blogger_channels (id={existing_channel_id}), updating with channel_id: '{channel_id}'")
+        cursor.execute("""
+            UPDATE blogger_channels
+            SET channel_id = ?,
+                channel_name = ?,
+                channel_photo_url = ?,
+                subscribers_count = ?,
+                topic_group_key = ?,
+                topic_group_title = ?,
+                topic_sub_key = ?,
+                topic_sub_title = ?,
+                is_verified = 1,
+                is_active = 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (channel_id, channel_name, channel_photo_url, subscribers_count,
+              group_key, group_title, sub_key, subtopic_title, existing_channel_id))
+        logger.info(f"✅ Updated existing channel #{existing_channel_id}")
+
+
 @dp.callback_query(F.data.startswith("blog_topic_sub:"))
 async def handle_topic_subtopic(callback: CallbackQuery):
     """
@@ -693,13 +732,8 @@ async def handle_topic_subtopic(callback: CallbackQuery):
             await callback.answer("❌ Неизвестная подкатегория", show_alert=True)
             return
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM blogger_applications WHERE id = ?", (application_id,))
-        row = cursor.fetchone()
+        row = await async_db.fetchone("SELECT * FROM blogger_applications WHERE id = ?", (application_id,))
         if not row:
-            conn.close()
             await callback.answer("❌ Заявка не найдена", show_alert=True)
             return
 
@@ -714,165 +748,30 @@ async def handle_topic_subtopic(callback: CallbackQuery):
         logger.info(f"   channel_link: {channel_link}")
         logger.info(f"   channel_id: '{channel_id}' (empty: {not channel_id})")
         
-        if not channel_id:
-            logger.warning(f"⚠️ WARNING: channel_id is empty for application {application_id}! Will create channel without Telegram data.")
-
-        cursor.execute(
-            """
-            UPDATE blogger_applications
-            SET status = 'approved',
-                topic_group_key = ?,
-                topic_group_title = ?,
-                topic_sub_key = ?,
-                topic_sub_title = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-            """,
-            (group_key, group["title"], sub_key, subtopic_title, application_id),
-        )
-
-        cursor.execute(
-            """
-            UPDATE users
-            SET user_type = 'blogger', updated_at = CURRENT_TIMESTAMP
-            WHERE user_id = ?
-            """,
-            (user_id,),
-        )
-
-        logger.info(f"🔍 Checking if channel exists in blogger_channels for user {user_id}")
-        
-        cursor.execute("""
-            SELECT id FROM blogger_channels 
-            WHERE user_id = ? AND channel_link = ?
-        """, (user_id, channel_link))
-        
-        existing_channel = cursor.fetchone()
-        
         channel_name = ""
         channel_photo_url = ""
-        subscribers_count = "0"
+        subscribers_count = 0
         
         logger.info(f"📊 Fetching channel data with channel_id: '{channel_id}'")
         
         if channel_id:
             try:
-                import requests
-                
                 logger.info(f"🔄 Fetching channel data from Telegram API for channel_id: {channel_id}")
-                
-                url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
-                response = requests.post(url, json={'chat_id': channel_id}, timeout=10)
-                response.raise_for_status()
-                chat_data = response.json()
-                
-                if chat_data.get('ok'):
-                    chat = chat_data['result']
-                    channel_name = chat.get('title', '')
-                    logger.info(f"✅ Got channel name: {channel_name}")
-                    
-                    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMemberCount"
-                    response = requests.post(url, json={'chat_id': channel_id}, timeout=10)
-                    response.raise_for_status()
-                    count_data = response.json()
-                    
-                    if count_data.get('ok'):
-                        member_count = count_data['result']
-                        subscribers_count = str(member_count) if member_count > 0 else "0"
-                        logger.info(f"✅ Got subscribers count: {subscribers_count} (raw: {member_count})")
-                    
-                    if 'photo' in chat and 'big_file_id' in chat['photo']:
-                        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
-                        response = requests.post(url, json={'file_id': chat['photo']['big_file_id']}, timeout=10)
-                        response.raise_for_status()
-                        file_data = response.json()
-                        
-                        if file_data.get('ok'):
-                            file_path = file_data['result']['file_path']
-                            channel_photo_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-                            logger.info(f"✅ Got channel photo URL")
-                    
-                    logger.info(f"✅ Got channel data: name={channel_name}, subs={subscribers_count}, photo={bool(channel_photo_url)}")
-                else:
-                    logger.error(f"❌ Telegram API error: {chat_data.get('description')}")
+                channel_name, subscribers_count, photo = await asyncio.to_thread(_fetch_channel_info, channel_id)
+                # Аватар скачивается в медиакэш один раз по file_unique_id (в пуле потоков базы)
+                channel_photo_url = await async_db.run(mirror_chat_photo, photo) or ''
+                logger.info(f"✅ Got channel data: name={channel_name}, subs={subscribers_count}, photo={bool(channel_photo_url)}")
             except Exception as e:
                 logger.error(f"❌ Error getting channel data from Telegram: {e}")
         else:
-            logger.warning(f"⚠️ channel_id is empty! Creating channel without Telegram data")
+            logger.warning(f"⚠️ WARNING: channel_id is empty for application {application_id}! Will create channel without Telegram data.")
         
         logger.info(f"📝 Will create channel with: name='{channel_name}', subs='{subscribers_count}', channel_id='{channel_id}'")
-        
-        if not existing_channel:
-            logger.info(f"💾 Inserting into blogger_channels: user_id={user_id}, channel_id='{channel_id}', name='{channel_name}', subs='{subscribers_count}'")
-            
-            try:
-                cursor.execute("""
-                    INSERT INTO blogger_channels (
-                        user_id, channel_link, channel_id, channel_name,
-                        channel_photo_url, subscribers_count,
-                        topic_group_key, topic_group_title,
-                        topic_sub_key, topic_sub_title,
-                        is_verified, is_active
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 1)
-                """, (
-                    user_id, channel_link, channel_id, channel_name,
-                    channel_photo_url, subscribers_count,
-                    group_key, group["title"], sub_key, subtopic_title
-                ))
-                
-                new_channel_id = cursor.lastrowid
-                logger.info(f"✅ Created channel #{new_channel_id} in blogger_channels for user {user_id}")
-                
-                conn.commit()
-                logger.info(f"✅ Database committed after channel creation")
-                
-                cursor.execute("SELECT id, channel_id, channel_name, subscribers_count FROM blogger_channels WHERE id = ?", (new_channel_id,))
-                check_row = cursor.fetchone()
-                if check_row:
-                    check_data = dict_from_row(check_row)
-                    logger.info(f"✅ Verification: channel_id='{check_data.get('channel_id')}', name='{check_data.get('channel_name')}', subs='{check_data.get('subscribers_count')}'")
-                else:
-                    logger.error(f"❌ Failed to verify created channel!")
-                
-                logger.info(f"✅ Channel created independently, user data NOT overwritten")
-            except Exception as e:
-                logger.error(f"❌ CRITICAL ERROR creating channel in blogger_channels: {e}", exc_info=True)
-                conn.rollback()
-                raise
-        else:
-            existing_channel_id = existing_channel['id']
-            logger.info(f"⚠️ Channel already exists in blogger_channels (id={existing_channel_id})")
-            
-            logger.info(f"🔄 Updating existing channel with channel_id: '{channel_id}'")
-            
-            try:
-                cursor.execute("""
-                    UPDATE blogger_channels
-                    SET channel_id = ?,
-                        channel_name = ?,
-                        channel_photo_url = ?,
-                        subscribers_count = ?,
-                        topic_group_key = ?,
-                        topic_group_title = ?,
-                        topic_sub_key = ?,
-                        topic_sub_title = ?,
-                        is_verified = 1,
-                        is_active = 1,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (channel_id, channel_name, channel_photo_url, subscribers_count,
-                      group_key, group["title"], sub_key, subtopic_title, existing_channel_id))
-                
-                conn.commit()
-                logger.info(f"✅ Updated existing channel #{existing_channel_id}")
-            except Exception as e:
-                logger.error(f"❌ CRITICAL ERROR updating channel in blogger_channels: {e}", exc_info=True)
-                conn.rollback()
-                raise
-
-        conn.commit()
+        await async_db.run(
+            _approve_application, app_data, group_key, group["title"], sub_key, subtopic_title,
+            channel_name, channel_photo_url, subscribers_count
+        )
         logger.info(f"✅ All changes committed to database")
-        conn.close()
         try:
             await bot.send_message(
                 chat_id=user_id,
@@ -1511,6 +1410,142 @@ async def handle_withdrawal_cancel(callback: CallbackQuery):
         await callback.answer("❌ Ошибка при отмене вывода", show_alert=True)
 
 
+def _attach_channel_id(cursor, user_id, channel_id):
+    """Бота добавили в канал: записать channel_id в непроверенный канал или ожидающую заявку пользователя."""
+    cursor.execute("""
+        SELECT * FROM blogger_channels 
+        WHERE user_id = ? AND is_verified = 0
+        ORDER BY created_at DESC
+        LIMIT 1
+    """, (user_id,))
+
+    channel_row = cursor.fetchone()
+
+    if channel_row:
+        channel_data = dict_from_row(channel_row)
+        channel_db_id = channel_data['id']
+
+        logger.info(f"   📝 Found unverified channel #{channel_db_id} in blogger_channels")
+        logger.info(f"   📊 Channel BEFORE update:")
+        logger.info(f"      Is verified: {channel_data.get('is_verified')}")
+        logger.info(f"      Channel ID: {channel_data.get('channel_id')}")
+
+        logger.info(f"   🔄 Updating channel #{channel_db_id}...")
+        logger.info(f"      Setting channel_id = {channel_id}")
+
+        cursor.execute("""
+            UPDATE blogger_channels 
+            SET channel_id = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (channel_id, channel_db_id))
+
+        rows_affected = cursor.rowcount
+        logger.info(f"   📝 Rows affected: {rows_affected}")
+
+        cursor.execute("""
+            SELECT id, user_id, is_verified, channel_id, updated_at 
+            FROM blogger_channels 
+            WHERE id = ?
+        """, (channel_db_id,))
+
+        updated_row = cursor.fetchone()
+        if updated_row:
+            updated_data = dict_from_row(updated_row)
+            logger.info(f"   ✅ Channel AFTER update:")
+            logger.info(f"      ID: {updated_data.get('id')}")
+            logger.info(f"      User ID: {updated_data.get('user_id')}")
+            logger.info(f"      Is verified: {updated_data.get('is_verified')}")
+            logger.info(f"      Channel ID: '{updated_data.get('channel_id')}'")
+            logger.info(f"      Updated at: {updated_data.get('updated_at')}")
+        else:
+            logger.error(f"   ❌ Failed to read back channel #{channel_db_id}")
+
+        logger.info(f"✅ Channel #{channel_db_id} updated with channel_id: {channel_id}")
+        logger.info(f"   ⏸️  Waiting for user to click 'Verify' button to submit for approval")
+        return
+
+    cursor.execute("""
+        SELECT * FROM blogger_applications 
+        WHERE user_id = ? AND status = 'pending'
+        ORDER BY created_at DESC
+        LIMIT 1
+    """, (user_id,))
+
+    row = cursor.fetchone()
+
+    if not row:
+        logger.warning(f"   ⚠️ No pending application or unverified channel found for user {user_id}")
+        cursor.execute("""
+            SELECT id, status, verified, created_at FROM blogger_applications 
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+        """, (user_id,))
+        all_apps = cursor.fetchall()
+        if all_apps:
+            logger.info(f"   Found {len(all_apps)} applications for user {user_id}:")
+            for app in all_apps:
+                logger.info(f"     - ID={app['id']}, status={app['status']}, verified={app['verified']}, created={app['created_at']}")
+        else:
+            logger.info(f"   No applications at all for user {user_id}")
+        cursor.execute("""
+            SELECT id, is_verified, created_at FROM blogger_channels 
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+        """, (user_id,))
+        all_channels = cursor.fetchall()
+        if all_channels:
+            logger.info(f"   Found {len(all_channels)} channels for user {user_id}:")
+            for ch in all_channels:
+                logger.info(f"     - ID={ch['id']}, verified={ch['is_verified']}, created={ch['created_at']}")
+        else:
+            logger.info(f"   No channels at all for user {user_id}")
+
+        return
+
+    app_data = dict_from_row(row)
+    application_id = app_data['id']
+
+    logger.info(f"   📝 Found pending application #{application_id}")
+    logger.info(f"   📊 Application BEFORE update:")
+    logger.info(f"      Status: {app_data.get('status')}")
+    logger.info(f"      Verified: {app_data.get('verified')}")
+    logger.info(f"      Channel ID: {app_data.get('channel_id')}")
+    logger.info(f"   🔄 Updating application #{application_id}...")
+    logger.info(f"      Setting verified = 1")
+    logger.info(f"      Setting channel_id = {channel_id}")
+
+    cursor.execute("""
+        UPDATE blogger_applications 
+        SET verified = 1, channel_id = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, (channel_id, application_id))
+
+    rows_affected = cursor.rowcount
+    logger.info(f"   📝 Rows affected: {rows_affected}")
+
+    cursor.execute("""
+        SELECT id, user_id, status, verified, channel_id, updated_at 
+        FROM blogger_applications 
+        WHERE id = ?
+    """, (application_id,))
+
+    updated_row = cursor.fetchone()
+    if updated_row:
+        updated_data = dict_from_row(updated_row)
+        logger.info(f"   ✅ Application AFTER update:")
+        logger.info(f"      ID: {updated_data.get('id')}")
+        logger.info(f"      User ID: {updated_data.get('user_id')}")
+        logger.info(f"      Status: {updated_data.get('status')}")
+        logger.info(f"      Verified: {updated_data.get('verified')} (type: {type(updated_data.get('verified'))})")
+        logger.info(f"      Channel ID: '{updated_data.get('channel_id')}'")
+        logger.info(f"      Updated at: {updated_data.get('updated_at')}")
+    else:
+        logger.error(f"   ❌ Failed to read back application #{application_id}")
+
+    logger.info(f"✅ Application #{application_id} verified (channel_id: {channel_id})")
+    logger.info(f"   ⏸️  Waiting for user to click 'Verify' button to submit application")
+
+
 @dp.my_chat_member()
 async def bot_status_changed(event: ChatMemberUpdated):
     """Обработка изменения статуса бота в чате"""
@@ -1541,151 +1576,7 @@ async def bot_status_changed(event: ChatMemberUpdated):
             
             channel_id = str(chat.id)
             
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT * FROM blogger_channels 
-                WHERE user_id = ? AND is_verified = 0
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (user.id,))
-            
-            channel_row = cursor.fetchone()
-            
-            if channel_row:
-                channel_data = dict_from_row(channel_row)
-                channel_db_id = channel_data['id']
-                
-                logger.info(f"   📝 Found unverified channel #{channel_db_id} in blogger_channels")
-                logger.info(f"   📊 Channel BEFORE update:")
-                logger.info(f"      Is verified: {channel_data.get('is_verified')}")
-                logger.info(f"      Channel ID: {channel_data.get('channel_id')}")
-                
-                logger.info(f"   🔄 Updating channel #{channel_db_id}...")
-                logger.info(f"      Setting channel_id = {channel_id}")
-                
-                cursor.execute("""
-                    UPDATE blogger_channels 
-                    SET channel_id = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (channel_id, channel_db_id))
-                
-                rows_affected = cursor.rowcount
-                logger.info(f"   📝 Rows affected: {rows_affected}")
-                
-                conn.commit()
-                logger.info(f"   💾 Changes committed to database")
-                
-                cursor.execute("""
-                    SELECT id, user_id, is_verified, channel_id, updated_at 
-                    FROM blogger_channels 
-                    WHERE id = ?
-                """, (channel_db_id,))
-                
-                updated_row = cursor.fetchone()
-                if updated_row:
-                    updated_data = dict_from_row(updated_row)
-                    logger.info(f"   ✅ Channel AFTER update:")
-                    logger.info(f"      ID: {updated_data.get('id')}")
-                    logger.info(f"      User ID: {updated_data.get('user_id')}")
-                    logger.info(f"      Is verified: {updated_data.get('is_verified')}")
-                    logger.info(f"      Channel ID: '{updated_data.get('channel_id')}'")
-                    logger.info(f"      Updated at: {updated_data.get('updated_at')}")
-                else:
-                    logger.error(f"   ❌ Failed to read back channel #{channel_db_id}")
-                
-                conn.close()
-                
-                logger.info(f"✅ Channel #{channel_db_id} updated with channel_id: {channel_id}")
-                logger.info(f"   ⏸️  Waiting for user to click 'Verify' button to submit for approval")
-                return
-            
-            cursor.execute("""
-                SELECT * FROM blogger_applications 
-                WHERE user_id = ? AND status = 'pending'
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (user.id,))
-            
-            row = cursor.fetchone()
-            
-            if not row:
-                logger.warning(f"   ⚠️ No pending application or unverified channel found for user {user.id}")
-                cursor.execute("""
-                    SELECT id, status, verified, created_at FROM blogger_applications 
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                """, (user.id,))
-                all_apps = cursor.fetchall()
-                if all_apps:
-                    logger.info(f"   Found {len(all_apps)} applications for user {user.id}:")
-                    for app in all_apps:
-                        logger.info(f"     - ID={app['id']}, status={app['status']}, verified={app['verified']}, created={app['created_at']}")
-                else:
-                    logger.info(f"   No applications at all for user {user.id}")
-                cursor.execute("""
-                    SELECT id, is_verified, created_at FROM blogger_channels 
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                """, (user.id,))
-                all_channels = cursor.fetchall()
-                if all_channels:
-                    logger.info(f"   Found {len(all_channels)} channels for user {user.id}:")
-                    for ch in all_channels:
-                        logger.info(f"     - ID={ch['id']}, verified={ch['is_verified']}, created={ch['created_at']}")
-                else:
-                    logger.info(f"   No channels at all for user {user.id}")
-                
-                conn.close()
-                return
-            
-            app_data = dict_from_row(row)
-            application_id = app_data['id']
-            
-            logger.info(f"   📝 Found pending application #{application_id}")
-            logger.info(f"   📊 Application BEFORE update:")
-            logger.info(f"      Status: {app_data.get('status')}")
-            logger.info(f"      Verified: {app_data.get('verified')}")
-            logger.info(f"      Channel ID: {app_data.get('channel_id')}")
-            logger.info(f"   🔄 Updating application #{application_id}...")
-            logger.info(f"      Setting verified = 1")
-            logger.info(f"      Setting channel_id = {channel_id}")
-            
-            cursor.execute("""
-                UPDATE blogger_applications 
-                SET verified = 1, channel_id = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (channel_id, application_id))
-            
-            rows_affected = cursor.rowcount
-            logger.info(f"   📝 Rows affected: {rows_affected}")
-            
-            conn.commit()
-            logger.info(f"   💾 Changes committed to database")
-            cursor.execute("""
-                SELECT id, user_id, status, verified, channel_id, updated_at 
-                FROM blogger_applications 
-                WHERE id = ?
-            """, (application_id,))
-            
-            updated_row = cursor.fetchone()
-            if updated_row:
-                updated_data = dict_from_row(updated_row)
-                logger.info(f"   ✅ Application AFTER update:")
-                logger.info(f"      ID: {updated_data.get('id')}")
-                logger.info(f"      User ID: {updated_data.get('user_id')}")
-                logger.info(f"      Status: {updated_data.get('status')}")
-                logger.info(f"      Verified: {updated_data.get('verified')} (type: {type(updated_data.get('verified'))})")
-                logger.info(f"      Channel ID: '{updated_data.get('channel_id')}'")
-                logger.info(f"      Updated at: {updated_data.get('updated_at')}")
-            else:
-                logger.error(f"   ❌ Failed to read back application #{application_id}")
-            
-            conn.close()
-            
-            logger.info(f"✅ Application #{application_id} verified (channel_id: {channel_id})")
-            logger.info(f"   ⏸️  Waiting for user to click 'Verify' button to submit application")
+            await async_db.run(_attach_channel_id, user.id, channel_id)
         else:
             logger.info(f"   Skipping: status changed from {old_status} to {new_status} (not an addition)")
         
@@ -1822,28 +1713,22 @@ async def cmd_check(message: Message):
     try:
         user_id = message.from_user.id
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        row = await async_db.fetchone("""
             SELECT * FROM blogger_applications 
             WHERE user_id = ? 
             ORDER BY created_at DESC 
             LIMIT 1
         """, (user_id,))
         
-        row = cursor.fetchone()
-        
         if not row:
             await message.answer(
                 "❌ У вас нет активных заявок.\n\n"
                 "Откройте приложение и подайте заявку на блогера.",
                 parse_mode="HTML"
             )
-            conn.close()
             return
         
         app_data = dict_from_row(row)
-        conn.close()
         
         status = app_data['status']
         verified = bool(app_data['verified'])
@@ -2279,43 +2164,46 @@ async def cmd_list_posts(message: Message):
 
 
 
+def _load_profile(cursor, user_id):
+    """(пользователь, статистика заказов, активные рекламы, последняя заявка блогера) или None."""
+    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+    user_row = cursor.fetchone()
+    if not user_row:
+        return None
+    cursor.execute("""
+        SELECT COUNT(*) as count, COALESCE(SUM(amount), 0) as total
+        FROM orders WHERE user_id = ?
+    """, (user_id,))
+    orders_stats = cursor.fetchone()
+    cursor.execute("""
+        SELECT * FROM advertisements 
+        WHERE user_id = ? AND status = 'active'
+        ORDER BY created_at DESC
+    """, (user_id,))
+    active_ads = cursor.fetchall()
+    cursor.execute("""
+        SELECT * FROM blogger_applications 
+        WHERE user_id = ? 
+        ORDER BY created_at DESC 
+        LIMIT 1
+    """, (user_id,))
+    blogger_app_row = cursor.fetchone()
+    return user_row, orders_stats, active_ads, blogger_app_row
+
+
 @dp.callback_query(F.data.startswith("refresh_profile_"))
 async def handle_refresh_profile(callback: CallbackQuery):
     """Обновить информацию профиля"""
     try:
         user_id = int(callback.data.split("_")[2])
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        user_row = cursor.fetchone()
-        
-        if not user_row:
+        profile = await async_db.run(_load_profile, user_id)
+        if not profile:
             await callback.answer("❌ Пользователь не найден", show_alert=True)
-            conn.close()
             return
         
+        user_row, orders_stats, active_ads, blogger_app_row = profile
         user_data = dict_from_row(user_row)
-        cursor.execute("""
-            SELECT COUNT(*) as count, COALESCE(SUM(amount), 0) as total
-            FROM orders WHERE user_id = ?
-        """, (user_id,))
-        orders_stats = cursor.fetchone()
-        cursor.execute("""
-            SELECT * FROM advertisements 
-            WHERE user_id = ? AND status = 'active'
-            ORDER BY created_at DESC
-        """, (user_id,))
-        active_ads = cursor.fetchall()
-        cursor.execute("""
-            SELECT * FROM blogger_applications 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """, (user_id,))
-        blogger_app_row = cursor.fetchone()
-        
-        conn.close()
         full_name = f"{user_data['first_name']} {user_data['last_name']}".strip()
         username_display = f"@{user_data['username']}" if user_data['username'] else "Не указан"
         is_blogger = user_data.get('user_type') == 'blogger'
@@ -2558,6 +2446,40 @@ async def handle_remove_blogger(callback: CallbackQuery):
         await callback.answer("❌ Ошибка при изменении статуса", show_alert=True)
 
 
+def _save_review(cursor, post_id, buyer_id, blogger_id, rating, review_type):
+    """Отзыв из кнопок бота: reviews, rating_stats и сообщение review_received в чат.
+
+    review_type 'blogger' - покупатель оценил блогера, 'buyer' - блогер
+    покупателя. Возвращает (имя покупателя, канал блогера) для уведомления.
+    """
+    if review_type == 'blogger':
+        reviewer_id, reviewed_id = buyer_id, blogger_id
+    else:
+        reviewer_id, reviewed_id = blogger_id, buyer_id
+    RatingStats.record_review(cursor, post_id, reviewer_id, reviewed_id, rating, review_type)
+
+    cursor.execute("""
+        SELECT channel_link FROM blogger_applications 
+        WHERE user_id = ? AND status = 'approved'
+        LIMIT 1
+    """, (blogger_id,))
+    blogger_data = cursor.fetchone()
+    blogger_channel = blogger_data[0] if blogger_data else f"ID: {blogger_id}"
+    cursor.execute("""
+        SELECT first_name, username FROM users WHERE user_id = ?
+    """, (buyer_id,))
+    buyer_data = cursor.fetchone()
+    buyer_name = f"@{buyer_data[1]}" if buyer_data and buyer_data[1] else (buyer_data[0] if buyer_data else f"ID: {buyer_id}")
+
+    stars = "⭐" * rating + "☆" * (5 - rating)
+    if review_type == 'blogger':
+        received_message = f"Покупатель {buyer_name} оставил вам отзыв: {stars}"
+    else:
+        received_message = f"Блогер {blogger_channel} оставил вам отзыв: {stars}"
+    ChatMessage.create(cursor, reviewer_id, reviewed_id, received_message, message_type="review_received")
+    return buyer_name, blogger_channel
+
+
 @dp.callback_query(F.data.startswith("review_blogger_"))
 async def handle_review_blogger(callback: CallbackQuery):
     """Обработка отзыва покупателя о блогере"""
@@ -2567,49 +2489,9 @@ async def handle_review_blogger(callback: CallbackQuery):
         post_id = int(parts[3])
         rating = int(parts[4])
         buyer_id = callback.from_user.id
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id INTEGER NOT NULL,
-                reviewer_id INTEGER NOT NULL,
-                reviewed_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL,
-                review_text TEXT,
-                review_type TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(post_id, reviewer_id, review_type)
-            )
-        """)
-        cursor.execute("""
-            INSERT OR REPLACE INTO reviews 
-            (post_id, reviewer_id, reviewed_id, rating, review_type)
-            VALUES (?, ?, ?, ?, 'blogger')
-        """, (post_id, buyer_id, blogger_id, rating))
-        cursor.execute("""
-            SELECT channel_link FROM blogger_applications 
-            WHERE user_id = ? AND status = 'approved'
-            LIMIT 1
-        """, (blogger_id,))
-        blogger_data = cursor.fetchone()
-        blogger_channel = blogger_data[0] if blogger_data else f"ID: {blogger_id}"
-        cursor.execute("""
-            SELECT first_name, username FROM users WHERE user_id = ?
-        """, (buyer_id,))
-        buyer_data = cursor.fetchone()
-        buyer_name = f"@{buyer_data[1]}" if buyer_data and buyer_data[1] else (buyer_data[0] if buyer_data else f"ID: {buyer_id}")
+        buyer_name, _ = await async_db.run(_save_review, post_id, buyer_id, blogger_id, rating, 'blogger')
         stars_filled = "⭐" * rating
         stars_empty = "☆" * (5 - rating)
-        received_message = f"Покупатель {buyer_name} оставил вам отзыв: {stars_filled}{stars_empty}"
-        
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, receiver_id, message, message_type, created_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (buyer_id, blogger_id, received_message, "review_received"))
-        
-        conn.commit()
-        conn.close()
         blogger_notification = (
             f"⭐ <b>Покупатель оставил вам отзыв</b>\n\n"
             f"Покупатель: {buyer_name}\n"
@@ -2644,49 +2526,9 @@ async def handle_review_buyer(callback: CallbackQuery):
         post_id = int(parts[3])
         rating = int(parts[4])
         blogger_id = callback.from_user.id
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id INTEGER NOT NULL,
-                reviewer_id INTEGER NOT NULL,
-                reviewed_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL,
-                review_text TEXT,
-                review_type TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(post_id, reviewer_id, review_type)
-            )
-        """)
-        cursor.execute("""
-            INSERT OR REPLACE INTO reviews 
-            (post_id, reviewer_id, reviewed_id, rating, review_type)
-            VALUES (?, ?, ?, ?, 'buyer')
-        """, (post_id, blogger_id, buyer_id, rating))
-        cursor.execute("""
-            SELECT first_name, username FROM users WHERE user_id = ?
-        """, (buyer_id,))
-        buyer_data = cursor.fetchone()
-        buyer_name = f"@{buyer_data[1]}" if buyer_data and buyer_data[1] else (buyer_data[0] if buyer_data else f"ID: {buyer_id}")
-        cursor.execute("""
-            SELECT channel_link FROM blogger_applications 
-            WHERE user_id = ? AND status = 'approved'
-            LIMIT 1
-        """, (blogger_id,))
-        blogger_data = cursor.fetchone()
-        blogger_channel = blogger_data[0] if blogger_data else f"ID: {blogger_id}"
+        _, blogger_channel = await async_db.run(_save_review, post_id, buyer_id, blogger_id, rating, 'buyer')
         stars_filled = "⭐" * rating
         stars_empty = "☆" * (5 - rating)
-        received_message = f"Блогер {blogger_channel} оставил вам отзыв: {stars_filled}{stars_empty}"
-        
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, receiver_id, message, message_type, created_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (blogger_id, buyer_id, received_message, "review_received"))
-        
-        conn.commit()
-        conn.close()
         buyer_notification = (
             f"⭐ <b>Блогер оставил вам отзыв</b>\n\n"
             f"Блогер: {blogger_channel}\n"
@@ -2712,89 +2554,48 @@ async def handle_review_buyer(callback: CallbackQuery):
         await callback.answer("❌ Ошибка при сохранении отзыва", show_alert=True)
 
 
-async def notify_user_about_new_message(receiver_id: int, sender_id: int, sender_name: str, message_preview: str):
-    """Отправить уведомление пользователю о новом сообщении"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+def _new_messages_phrase(count: int) -> str:
+    """'новое сообщение', '3 новых сообщения', '5 новых сообщений'"""
+    if count == 1:
+        return "новое сообщение"
+    if count % 10 in (2, 3, 4) and count % 100 not in (12, 13, 14):
+        return f"{count} новых сообщения"
+    if count % 10 == 1 and count % 100 != 11:
+        return f"{count} новое сообщение"
+    return f"{count} новых сообщений"
 
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (sender_id,))
-        user_row = cursor.fetchone()
-        display_name = (sender_name or f"ID: {sender_id}").lstrip('@')
 
-        if user_row:
-            sender_data = dict_from_row(user_row)
-            user_type = sender_data.get('user_type')
+async def notify_about_new_messages(receiver_id: int, notifications: list):
+    """Одно уведомление о сообщениях, накопившихся для получателя в outbox.
 
-            if user_type == 'blogger':
-                cursor.execute("""
-                    SELECT channel_link
-                    FROM blogger_applications
-                    WHERE user_id = ? AND status = 'approved'
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                """, (sender_id,))
-                app_row = cursor.fetchone()
-
-                channel_username = None
-                if app_row and app_row['channel_link']:
-                    channel_link = app_row['channel_link']
-                    patterns = [
-                        r't\.me/([^/\?]+)',
-                        r'telegram\.me/([^/\?]+)',
-                        r'@(\w+)'
-                    ]
-                    for pattern in patterns:
-                        match = re.search(pattern, channel_link)
-                        if match:
-                            username = match.group(1)
-                            if not username.startswith('@'):
-                                username = '@' + username
-                            channel_username = username
-                            break
-
-                if channel_username:
-                    display_name = channel_username
-                else:
-                    username = (sender_data.get('username') or '').strip()
-                    if username:
-                        if not username.startswith('@'):
-                            username = '@' + username
-                        display_name = username
-                    else:
-                        display_name = sender_data.get('first_name') or f"ID: {sender_id}"
-            else:
-                first_name = (sender_data.get('first_name') or '').strip()
-                last_name = (sender_data.get('last_name') or '').strip()
-                username = (sender_data.get('username') or '').strip().lstrip('@')
-
-                if first_name:
-                    display_name = first_name
-                elif last_name:
-                    display_name = last_name
-                elif username:
-                    display_name = username
-                else:
-                    display_name = f"ID: {sender_id}"
+    Отправители идут в порядке первого сообщения; ошибки Bot API
+    пробрасываются, чтобы outbox повторил или отложил всю пачку.
+    """
+    counts = {}
+    for notification in notifications:
+        sender_id = notification['payload']['sender_id']
+        counts[sender_id] = counts.get(sender_id, 0) + 1
+    names = {sender_id: await _get_user_display_name(sender_id) for sender_id in counts}
+
+    if len(counts) == 1:
+        sender_id, count = next(iter(counts.items()))
+        message_text = f"💬 {_new_messages_phrase(count).capitalize()} от {names[sender_id]}"
+    else:
+        lines = [f"• {names[sender_id]}: {count}" for sender_id, count in counts.items()]
+        message_text = f"💬 {_new_messages_phrase(len(notifications)).capitalize()}\n\n" + "\n".join(lines)
 
-        conn.close()
-        message_text = f"💬 Новое сообщение от {display_name}"
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text="Открыть чат",
-                web_app=WebAppInfo(url=f"https://beta.heisen.online/?chat={sender_id}")
-            )]
-        ])
-        await bot.send_message(
-            chat_id=receiver_id,
-            text=message_text,
-            reply_markup=keyboard
-        )
-        
-        logger.info(f"✅ Notification sent to user {receiver_id} about message from {sender_id}")
-        
-    except Exception as e:
-        logger.error(f"❌ Error sending message notification: {e}", exc_info=True)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="Открыть чат" if len(counts) == 1 else f"Открыть чат: {names[sender_id]}",
+            web_app=WebAppInfo(url=f"https://beta.heisen.online/?chat={sender_id}")
+        )]
+        for sender_id in list(counts)[:CHAT_NOTIFICATION_MAX_BUTTONS]
+    ])
+    await bot.send_message(
+        chat_id=receiver_id,
+        text=message_text,
+        reply_markup=keyboard
+    )
 
 
 async def _get_user_display_name(user_id: int) -> str:
@@ -2804,65 +2605,39 @@ async def _get_user_display_name(user_id: int) -> str:
     для обычных пользователей — имя (first_name) без @.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
+        row = await async_db.fetchone("SELECT * FROM users WHERE user_id = ?", (user_id,))
 
         if not row:
-            conn.close()
             return f"ID: {user_id}"
 
         sender_data = dict_from_row(row)
         user_type = sender_data.get('user_type')
         if user_type == 'blogger':
-            cursor.execute("""
-                SELECT channel_link
+            app_row = await async_db.fetchone("""
+                SELECT channel_username
                 FROM blogger_applications
                 WHERE user_id = ? AND status = 'approved'
                 ORDER BY created_at DESC
                 LIMIT 1
             """, (user_id,))
-            app_row = cursor.fetchone()
-
-            channel_username = None
-            if app_row and app_row['channel_link']:
-                channel_link = app_row['channel_link']
-                patterns = [
-                    r't\.me/([^/\?]+)',
-                    r'telegram\.me/([^/\?]+)',
-                    r'@(\w+)'
-                ]
-                for pattern in patterns:
-                    match = re.search(pattern, channel_link)
-                    if match:
-                        username = match.group(1)
-                        if not username.startswith('@'):
-                            username = '@' + username
-                        channel_username = username
-                        break
+
+            channel_username = app_row['channel_username'] if app_row else None
 
             if channel_username:
-                conn.close()
                 return channel_username
 
             username = (sender_data.get('username') or '').strip()
             if username:
                 if not username.startswith('@'):
                     username = '@' + username
-                conn.close()
                 return username
 
             full_name = (sender_data.get('first_name') or '').strip()
-            conn.close()
             return full_name or f"ID: {user_id}"
         first_name = (sender_data.get('first_name') or '').strip()
         last_name = (sender_data.get('last_name') or '').strip()
         username = (sender_data.get('username') or '').strip().lstrip('@')
 
-        conn.close()
-
         if first_name:
             return first_name
         if last_name:
@@ -3296,50 +3071,37 @@ async def notify_about_ad_post_published(
         logger.error(f"❌ Error sending publish ad post notifications: {e}", exc_info=True)
 
 
+def _insert_review_requests(cursor, review_messages):
+    for sender_id, receiver_id, message, message_type, metadata, channel_id in review_messages:
+        ChatMessage.create(cursor, sender_id, receiver_id, message, channel_id, message_type, metadata)
+
+
 async def send_review_request(buyer_id: int, blogger_id: int, post_id: int, channel_id: int = None):
     """
     Сохраняет запрос на отзыв в базу данных для отображения в приложении.
     НЕ отправляет сообщения в Telegram - отзывы оставляются только через приложение.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
         if not channel_id:
-            cursor.execute("SELECT channel_id FROM ad_posts WHERE id = ?", (post_id,))
-            post_row = cursor.fetchone()
+            post_row = await async_db.fetchone("SELECT channel_id FROM ad_posts WHERE id = ?", (post_id,))
             if post_row:
                 channel_id = post_row[0]
         blogger_channel = "@channel"
         blogger_photo_url = None
         
         if channel_id:
-            cursor.execute("""
-                SELECT channel_link, channel_name, channel_photo_url
+            channel_data = await async_db.fetchone("""
+                SELECT channel_username, channel_name, channel_photo_url
                 FROM blogger_channels
                 WHERE id = ?
             """, (channel_id,))
-            channel_data = cursor.fetchone()
             if channel_data:
-                channel_link = channel_data[0]
                 channel_name = channel_data[1]
                 blogger_photo_url = channel_data[2]
-                if channel_link:
-                    import re
-                    patterns = [
-                        r't\.me/([^/\?]+)',
-                        r'telegram\.me/([^/\?]+)',
-                        r'@(\w+)'
-                    ]
-                    for pattern in patterns:
-                        match = re.search(pattern, channel_link)
-                        if match:
-                            username = match.group(1)
-                            if not username.startswith('@'):
-                                username = '@' + username
-                            blogger_channel = username
-                            break
+                if channel_data[0]:
+                    blogger_channel = channel_data[0]
         if not blogger_photo_url:
-            cursor.execute(
+            blogger_data = await async_db.fetchone(
                 """
                 SELECT ba.channel_photo_url, u.blogger_photo_url, ba.channel_link
                 FROM users u
@@ -3348,40 +3110,21 @@ async def send_review_request(buyer_id: int, blogger_id: int, post_id: int, chan
                 """,
                 (blogger_id,)
             )
-            blogger_data = cursor.fetchone()
             if blogger_data:
                 if blogger_data[2]:
                     blogger_channel = blogger_data[2]
                 blogger_photo_url = blogger_data[0] or blogger_data[1]
-        cursor.execute("""
-            SELECT AVG(rating) as avg_rating
-            FROM reviews
-            WHERE reviewed_id = ?
-        """, (blogger_id,))
-        blogger_rating_result = cursor.fetchone()
-        blogger_rating = round(blogger_rating_result[0], 1) if blogger_rating_result and blogger_rating_result[0] else 0
-        cursor.execute("""
-            SELECT AVG(rating) as avg_rating
-            FROM reviews
-            WHERE reviewed_id = ?
-        """, (buyer_id,))
-        buyer_rating_result = cursor.fetchone()
-        buyer_rating = round(buyer_rating_result[0], 1) if buyer_rating_result and buyer_rating_result[0] else 0
+        blogger_rating = await async_db.run(RatingStats.get_average, blogger_id)
+        buyer_rating = await async_db.run(RatingStats.get_average, buyer_id)
         buyer_photo_url = None
         try:
-            buyer_user = await bot.get_chat(buyer_id)
-            if buyer_user.photo:
-                file = await bot.get_file(buyer_user.photo.big_file_id)
-                buyer_photo_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file.file_path}"
+            buyer_photo_url = await get_user_photo_url(buyer_id)
         except Exception as e:
             logger.warning(f"Failed to get buyer photo from Telegram: {e}")
             buyer_photo_url = None
         
         logger.info(f"📸 Review request avatars - Blogger: {blogger_photo_url}, Buyer: {buyer_photo_url}, Channel: {blogger_channel}")
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, receiver_id, message, message_type, metadata, channel_id, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (
+        review_messages = [(
             blogger_id,  # От блогера
             buyer_id,    # Покупателю
             "review_request",
@@ -3394,13 +3137,7 @@ async def send_review_request(buyer_id: int, blogger_id: int, post_id: int, chan
                 "rating": blogger_rating
             }),
             channel_id  # NEW: Добавляем channel_id
-        ))
-        
-        logger.info(f"✅ Saved review request message for buyer {buyer_id} about blogger {blogger_id} (avatar: {blogger_photo_url}, channel_id: {channel_id})")
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, receiver_id, message, message_type, metadata, channel_id, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (
+        ), (
             buyer_id,    # От покупателя
             blogger_id,  # Блогеру
             "review_request",
@@ -3413,13 +3150,12 @@ async def send_review_request(buyer_id: int, blogger_id: int, post_id: int, chan
                 "rating": buyer_rating
             }),
             channel_id  # NEW: Добавляем channel_id
-        ))
-        
+        )]
+        await async_db.run(_insert_review_requests, review_messages)
+
+        logger.info(f"✅ Saved review request message for buyer {buyer_id} about blogger {blogger_id} (avatar: {blogger_photo_url}, channel_id: {channel_id})")
         logger.info(f"✅ Saved review request message for blogger {blogger_id} about buyer {buyer_id} (avatar: {buyer_photo_url}, channel_id: {channel_id})")
         
-        conn.commit()
-        conn.close()
-        
         logger.info(
             f"✅ Review requests saved to database (post_id={post_id}, "
             f"buyer_id={buyer_id}, blogger_id={blogger_id}, channel_id={channel_id})"
@@ -3469,12 +3205,8 @@ async def notify_about_ad_post_deleted(
             f"✅ Delete notifications sent (post_id={post_id}, "
             f"buyer_id={buyer_id}, blogger_id={blogger_id})"
         )
-        conn_temp = get_db_connection()
-        cursor_temp = conn_temp.cursor()
-        cursor_temp.execute("SELECT channel_id FROM ad_posts WHERE id = ?", (post_id,))
-        post_row = cursor_temp.fetchone()
+        post_row = await async_db.fetchone("SELECT channel_id FROM ad_posts WHERE id = ?", (post_id,))
         post_channel_id = post_row[0] if post_row else None
-        conn_temp.close()
         
         await send_review_request(buyer_id, blogger_id, post_id, channel_id=post_channel_id)
         
@@ -3482,6 +3214,114 @@ async def notify_about_ad_post_deleted(
         logger.error(f"❌ Error sending delete ad post notifications: {e}", exc_info=True)
 
 
+def _auto_cancel_ad_post(cursor, post_id, buyer_id, price):
+    cursor.execute(
+        """
+        UPDATE ad_posts
+        SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (post_id,),
+    )
+    cursor.execute(
+        """
+        UPDATE users
+        SET balance = balance + ?, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = ?
+        """,
+        (price, buyer_id),
+    )
+
+
+def _mark_ad_post_published(cursor, post_id, message_ids):
+    cursor.execute(
+        """
+        UPDATE ad_posts
+        SET telegram_message_ids = ?, posted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (json.dumps(message_ids), post_id),
+    )
+
+
+def _complete_ad_post(cursor, post_id, buyer_id, blogger_id):
+    """Пометить пост завершённым и перевести блогеру средства из escrow."""
+    cursor.execute(
+        """
+        UPDATE ad_posts
+        SET telegram_message_ids = '',
+            status = 'completed',
+            deleted_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (post_id,),
+    )
+    try:
+        from database.escrow_model import EscrowTransaction
+        
+        release_info = EscrowTransaction.release_to_blogger(cursor, post_id)
+        
+        if release_info:
+            blogger_amount = release_info['blogger_amount']
+            commission_amount = release_info['commission_amount']
+            from database.models import Order
+            Order.create(
+                cursor,
+                blogger_id,
+                'blogger_earning',
+                f'Доход от рекламного поста #{post_id}',
+                f'Оплаченный пост от пользователя ID{buyer_id}',
+                blogger_amount
+            )
+            try:
+                from database.models import User
+                referral_share_rate = 0.15
+                referral_reward_total = round(commission_amount * referral_share_rate, 2)
+                
+                if referral_reward_total > 0:
+                    buyer = User.get_by_id(cursor, buyer_id)
+                    blogger = User.get_by_id(cursor, blogger_id)
+                    if buyer and buyer.get('referrer_id'):
+                        ref_id = buyer['referrer_id']
+                        User.update_balance(cursor, ref_id, referral_reward_total, 'add')
+                        cursor.execute("""
+                            UPDATE users
+                            SET referral_commission_received = referral_commission_received + ? 
+                            WHERE user_id = ?
+                        """, (referral_reward_total, ref_id))
+                        cursor.execute("""
+                            UPDATE users
+                            SET referral_commission_generated = referral_commission_generated + ? 
+                            WHERE user_id = ?
+                        """, (referral_reward_total, buyer['user_id']))
+                    if blogger and blogger.get('referrer_id'):
+                        ref_id = blogger['referrer_id']
+                        User.update_balance(cursor, ref_id, referral_reward_total, 'add')
+                        cursor.execute("""
+                            UPDATE users
+                            SET referral_commission_received = referral_commission_received + ? 
+                            WHERE user_id = ?
+                        """, (referral_reward_total, ref_id))
+                        cursor.execute("""
+                            UPDATE users
+                            SET referral_commission_generated = referral_commission_generated + ? 
+                            WHERE user_id = ?
+                        """, (referral_reward_total, blogger['user_id']))
+            except Exception as e:
+                logger.error(f"❌ Error processing referral commission for ad post #{post_id}: {e}", exc_info=True)
+            
+            logger.info(
+                f"💰 Средства переведены блогеру из escrow: post_id={post_id}, "
+                f"blogger_amount={blogger_amount:.2f}, commission={commission_amount:.2f}"
+            )
+        else:
+            logger.warning(f"⚠️ Escrow не найден для поста {post_id}, средства не переведены")
+            
+    except Exception as e:
+        logger.error(f"❌ Error releasing escrow for ad post #{post_id}: {e}", exc_info=True)
+
+
 async def process_scheduled_ad_posts_once():
     """
     Одна итерация обработки всех отложенных постов:
@@ -3492,12 +3332,9 @@ async def process_scheduled_ad_posts_once():
     try:
         now = datetime.now(MOSCOW_TZ)
         now_str = now.strftime("%Y-%m-%d %H:%M:%S")
-        conn = get_db_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
 
         logger.info(f"🕒 Running scheduled ad posts check at {now_str}")
-        cursor.execute(
+        pending_rows = await async_db.fetchall(
             """
             SELECT * FROM ad_posts
             WHERE status = 'pending'
@@ -3505,7 +3342,6 @@ async def process_scheduled_ad_posts_once():
             """,
             (now_str,),
         )
-        pending_rows = cursor.fetchall() or []
         logger.info(f"🔍 Pending posts to auto-cancel: {len(pending_rows)}")
 
         for row in pending_rows:
@@ -3521,23 +3357,7 @@ async def process_scheduled_ad_posts_once():
                 f"⏰ Auto-cancelling ad post #{post_id}: "
                 f"buyer={buyer_id}, blogger={blogger_id}, price={price}, scheduled_time={scheduled_time}, channel_id={channel_id}"
             )
-            cursor.execute(
-                """
-                UPDATE ad_posts
-                SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                """,
-                (post_id,),
-            )
-            cursor.execute(
-                """
-                UPDATE users
-                SET balance = balance + ?, updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-                """,
-                (price, buyer_id),
-            )
-            conn.commit()
+            await async_db.run(_auto_cancel_ad_post, post_id, buyer_id, price)
 
             try:
                 await notify_about_ad_post_auto_cancelled(
@@ -3550,7 +3370,7 @@ async def process_scheduled_ad_posts_once():
                 )
             except Exception as e:
                 logger.error(f"❌ Error sending auto-cancel notifications for post {post_id}: {e}", exc_info=True)
-        cursor.execute(
+        to_publish = await async_db.fetchall(
             """
             SELECT 
                 ap.id,
@@ -3575,7 +3395,6 @@ async def process_scheduled_ad_posts_once():
             """,
             (now_str,),
         )
-        to_publish = cursor.fetchall() or []
         logger.info(f"🔍 Approved posts to publish: {len(to_publish)}")
 
         for row in to_publish:
@@ -3663,15 +3482,7 @@ async def process_scheduled_ad_posts_once():
                     f"messages={message_ids}"
                 )
 
-                cursor.execute(
-                    """
-                    UPDATE ad_posts
-                    SET telegram_message_ids = ?, posted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (json.dumps(message_ids), post_id),
-                )
-                conn.commit()
+                await async_db.run(_mark_ad_post_published, post_id, message_ids)
                 try:
                     await notify_about_ad_post_published(
                         buyer_id=buyer_id,
@@ -3692,7 +3503,7 @@ async def process_scheduled_ad_posts_once():
                 )
         logger.info(f"🔍 Checking for posts to delete at {now_str}")
         
-        cursor.execute(
+        to_delete = await async_db.fetchall(
             """
             SELECT ap.*, bc.channel_id as telegram_channel_id
             FROM ad_posts ap
@@ -3705,7 +3516,6 @@ async def process_scheduled_ad_posts_once():
             """,
             (now_str,),
         )
-        to_delete = cursor.fetchall() or []
         logger.info(f"🔍 Approved posts to delete: {len(to_delete)}")
 
         for row in to_delete:
@@ -3741,81 +3551,7 @@ async def process_scheduled_ad_posts_once():
                         f"in channel {channel_id}: {e}"
                     )
 
-            cursor.execute(
-                """
-                UPDATE ad_posts
-                SET telegram_message_ids = '',
-                    status = 'completed',
-                    deleted_at = CURRENT_TIMESTAMP,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                """,
-                (post_id,),
-            )
-            try:
-                from database.escrow_model import EscrowTransaction
-                
-                release_info = EscrowTransaction.release_to_blogger(cursor, post_id)
-                
-                if release_info:
-                    blogger_amount = release_info['blogger_amount']
-                    commission_amount = release_info['commission_amount']
-                    from database.models import Order
-                    Order.create(
-                        cursor,
-                        blogger_id,
-                        'blogger_earning',
-                        f'Доход от рекламного поста #{post_id}',
-                        f'Оплаченный пост от пользователя ID{buyer_id}',
-                        blogger_amount
-                    )
-                    try:
-                        from database.models import User
-                        referral_share_rate = 0.15
-                        referral_reward_total = round(commission_amount * referral_share_rate, 2)
-                        
-                        if referral_reward_total > 0:
-                            buyer = User.get_by_id(cursor, buyer_id)
-                            blogger = User.get_by_id(cursor, blogger_id)
-                            if buyer and buyer.get('referrer_id'):
-                                ref_id = buyer['referrer_id']
-                                User.update_balance(cursor, ref_id, referral_reward_total, 'add')
-                                cursor.execute("""
-                                    UPDATE users
-                                    SET referral_commission_received = referral_commission_received + ? 
-                                    WHERE user_id = ?
-                                """, (referral_reward_total, ref_id))
-                                cursor.execute("""
-                                    UPDATE users
-                                    SET referral_commission_generated = referral_commission_generated + ? 
-                                    WHERE user_id = ?
-                                """, (referral_reward_total, buyer['user_id']))
-                            if blogger and blogger.get('referrer_id'):
-                                ref_id = blogger['referrer_id']
-                                User.update_balance(cursor, ref_id, referral_reward_total, 'add')
-                                cursor.execute("""
-                                    UPDATE users
-                                    SET referral_commission_received = referral_commission_received + ? 
-                                    WHERE user_id = ?
-                                """, (referral_reward_total, ref_id))
-                                cursor.execute("""
-                                    UPDATE users
-                                    SET referral_commission_generated = referral_commission_generated + ? 
-                                    WHERE user_id = ?
-                                """, (referral_reward_total, blogger['user_id']))
-                    except Exception as e:
-                        logger.error(f"❌ Error processing referral commission for ad post #{post_id}: {e}", exc_info=True)
-                    
-                    logger.info(
-                        f"💰 Средства переведены блогеру из escrow: post_id={post_id}, "
-                        f"blogger_amount={blogger_amount:.2f}, commission={commission_amount:.2f}"
-                    )
-                else:
-                    logger.warning(f"⚠️ Escrow не найден для поста {post_id}, средства не переведены")
-                    
-            except Exception as e:
-                logger.error(f"❌ Error releasing escrow for ad post #{post_id}: {e}", exc_info=True)
-            conn.commit()
+            await async_db.run(_complete_ad_post, post_id, buyer_id, blogger_id)
 
             logger.info(
                 f"🗑️  Deleted ad post #{post_id} messages from channel {channel_id} "
@@ -3832,9 +3568,6 @@ async def process_scheduled_ad_posts_once():
                     f"❌ Error sending delete notifications for ad post #{post_id}: {e}",
                     exc_info=True,
                 )
-
-        conn.commit()
-        conn.close()
     except Exception as e:
         logger.error(f"❌ Error in process_scheduled_ad_posts_once: {e}", exc_info=True)
 
@@ -3874,13 +3607,11 @@ async def process_premium_post_content(message: Message, state: FSMContext):
                 parse_mode="HTML"
             )
             return
-        conn = get_db_connection()
-        cursor = conn.cursor()
         telegram_message_id = message.message_id
         telegram_chat_id = message.chat.id
         
         logger.info(f"💾 Saving premium post: message_id={telegram_message_id}, chat_id={telegram_chat_id}")
-        cursor.execute("""
+        post_id = await async_db.insert("""
             INSERT INTO premium_posts (
                 user_id, session_id, post_text, post_images, 
                 telegram_message_id, telegram_chat_id, status, created_at
@@ -3888,10 +3619,6 @@ async def process_premium_post_content(message: Message, state: FSMContext):
             VALUES (?, ?, ?, ?, ?, ?, 'pending', CURRENT_TIMESTAMP)
         """, (user_id, session_id, post_text, json.dumps(post_images), telegram_message_id, telegram_chat_id))
         
-        post_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
         logger.info(f"✅ Premium post #{post_id} saved for user {user_id} (msg_id={telegram_message_id})")
         await message.answer(
             "✅ <b>Пост получен!</b>\n\n"
@@ -3918,17 +3645,11 @@ async def handle_cancel_premium_post(callback: CallbackQuery, state: FSMContext)
         
         logger.info(f"❌ User {user_id} cancelled premium post session {session_id}")
         await state.clear()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        await async_db.execute("""
             UPDATE premium_post_sessions
             SET status = 'cancelled'
             WHERE user_id = ? AND session_id = ?
         """, (user_id, session_id))
-        
-        conn.commit()
-        conn.close()
         try:
             await callback.message.delete()
         except:
@@ -3950,17 +3671,11 @@ async def restore_fsm_state_handler(message: Message, state: FSMContext):
         if current_state:
             logger.info(f"🔄 User {user_id} already has FSM state: {current_state}")
             return
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        row = await async_db.fetchone("""
             SELECT state, data FROM bot_fsm_states
             WHERE user_id = ?
         """, (user_id,))
         
-        row = cursor.fetchone()
-        conn.close()
-        
         if row:
             state_name = row['state']
             state_data = json.loads(row['data'] or '{}')
@@ -3970,11 +3685,7 @@ async def restore_fsm_state_handler(message: Message, state: FSMContext):
                 await state.set_state(PremiumPostStates.waiting_for_post_content)
                 await state.update_data(**state_data)
                 logger.info(f"✅ FSM state restored from DB for user {user_id}: {state_name}")
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM bot_fsm_states WHERE user_id = ?", (user_id,))
-                conn.commit()
-                conn.close()
+                await async_db.execute("DELETE FROM bot_fsm_states WHERE user_id = ?", (user_id,))
                 await process_premium_post_content(message, state)
                 return
         logger.info(f"ℹ️ No FSM state found for user {user_id}, message not handled")
@@ -3995,6 +3706,130 @@ async def ad_posts_scheduler():
         await asyncio.sleep(30)
 
 
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_INTERVAL = 1
+# Не чаще одного уведомления о сообщениях чата в получателя за столько секунд;
+# пришедшее раньше копится в outbox и уходит следующей пачкой
+CHAT_NOTIFICATION_INTERVAL = float(os.environ.get('CHAT_NOTIFICATION_INTERVAL', 30))
+CHAT_NOTIFICATION_MAX_BUTTONS = 5
+
+chat_notification_flood = FloodControl(per_chat_interval=CHAT_NOTIFICATION_INTERVAL)
+outbox_flood = FloodControl()
+
+
+def _outbox_handlers():
+    """kind -> (функция уведомления, асинхронная ли она)"""
+    return {
+        'ad_post_payment': (notify_about_ad_post_payment, True),
+        'ad_post_cancelled': (notify_about_ad_post_cancelled, True),
+        'ad_post_approved': (notify_about_ad_post_approved, True),
+        'ad_post_rejected': (notify_about_ad_post_rejected, True),
+        # Админские уведомления ходят в Bot API через requests - уводим их из цикла
+        'admin_channel': (notify_admin_about_channel_sync, False),
+        'admin_withdrawal': (notify_admin_about_withdrawal_sync, False),
+    }
+
+
+async def process_notification_outbox_once():
+    """Отправить накопившиеся уведомления из notification_outbox. Возвращает размер пачки."""
+    handlers = _outbox_handlers()
+    due = await async_db.run(NotificationOutbox.get_due, OUTBOX_BATCH_SIZE)
+    # Уведомления о сообщениях, уже ушедшие в пачке другого получателя из due
+    coalesced = set()
+
+    for notification in due:
+        if notification['kind'] == 'new_message':
+            if notification['id'] not in coalesced:
+                await _deliver_chat_notifications(notification, coalesced)
+            continue
+
+        handler = handlers.get(notification['kind'])
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown notification kind: {notification['kind']}")
+            func, is_async = handler
+            await outbox_flood.throttle()
+            if is_async:
+                await func(**notification['payload'])
+            else:
+                await asyncio.to_thread(func, **notification['payload'])
+        except TelegramRetryAfter as e:
+            await async_db.run(NotificationOutbox.postpone, [notification['id']], time.time() + e.retry_after)
+            logger.warning(f"⚠️ Outbox notification #{notification['id']} hit flood limit, retry in {e.retry_after}s")
+            continue
+        except Exception as e:
+            next_attempt_at = await async_db.run(
+                NotificationOutbox.mark_failed, notification['id'], notification['attempts'], e
+            )
+            if next_attempt_at is None:
+                logger.error(f"❌ Outbox notification #{notification['id']} ({notification['kind']}) dropped: {e}")
+            else:
+                logger.warning(f"⚠️ Outbox notification #{notification['id']} ({notification['kind']}) failed, retry scheduled: {e}")
+            continue
+
+        latency_ms = await async_db.run(NotificationOutbox.mark_sent, notification['id'], notification['created_at'])
+        logger.info(f"📨 Outbox notification #{notification['id']} ({notification['kind']}) delivered in {latency_ms} ms")
+
+    return len(due)
+
+
+async def _deliver_chat_notifications(notification, coalesced):
+    """Отправить одним сообщением все ожидающие уведомления о чате получателю notification."""
+    receiver_id = notification['payload']['receiver_id']
+    batch = await async_db.run(NotificationOutbox.get_coalesced, 'new_message', str(receiver_id))
+    # Записи до миграции 14 без coalesce_key уходят по одной
+    if all(n['id'] != notification['id'] for n in batch):
+        batch.append(notification)
+    batch = [n for n in batch if n['id'] not in coalesced]
+    ids = [n['id'] for n in batch]
+    coalesced.update(ids)
+
+    delay = chat_notification_flood.delay_for(receiver_id)
+    if delay > 0:
+        await async_db.run(NotificationOutbox.postpone, ids, time.time() + delay)
+        return
+
+    try:
+        await outbox_flood.throttle()
+        await notify_about_new_messages(receiver_id, batch)
+    except TelegramRetryAfter as e:
+        chat_notification_flood.block(receiver_id, e.retry_after)
+        await async_db.run(NotificationOutbox.postpone, ids, time.time() + e.retry_after)
+        return
+    except Exception as e:
+        next_attempt_at = await async_db.run(NotificationOutbox.mark_batch_failed, batch, e)
+        if next_attempt_at is None:
+            logger.error(f"❌ Chat notifications for user {receiver_id} dropped: {e}")
+        else:
+            logger.warning(f"⚠️ Chat notifications for user {receiver_id} failed, retry scheduled: {e}")
+        return
+
+    chat_notification_flood.record(receiver_id)
+    latency_ms = await async_db.run(NotificationOutbox.mark_batch_sent, batch)
+    logger.info(f"📨 {len(batch)} chat notification(s) for user {receiver_id} delivered as one in {latency_ms} ms")
+
+
+async def notification_dispatcher():
+    """Фоновая доставка уведомлений, поставленных в очередь веб-приложением."""
+    logger.info("📨 Starting notification outbox dispatcher")
+    last_purge = 0
+    while True:
+        try:
+            processed = await process_notification_outbox_once()
+
+            if asyncio.get_running_loop().time() - last_purge > 3600:
+                await async_db.run(NotificationOutbox.purge_sent)
+                await async_db.run(UserEvents.purge)
+                last_purge = asyncio.get_running_loop().time()
+        except Exception as e:
+            logger.error(f"❌ Notification dispatcher error: {e}", exc_info=True)
+            processed = 0
+
+        # Полная пачка - сразу забираем следующую
+        if processed < OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+
 async def main():
     """Главная функция запуска бота"""
     logger.info("=" * 60)
@@ -4017,6 +3852,14 @@ async def main():
         logger.info("✅ Webhook deleted")
         asyncio.create_task(ad_posts_scheduler())
         logger.info("🚀 Ad posts scheduler started")
+        asyncio.create_task(notification_dispatcher())
+        logger.info("🚀 Notification dispatcher started")
+        asyncio.create_task(loop_lag_monitor.run(
+            report=lambda: (
+                f"{async_db.stats()} | single-flight: {singleflight_totals()}"
+                f" | chat notifications: {chat_notification_flood.stats()}"
+            )
+        ))
         logger.info("🚀 Starting polling...")
         logger.info("📡 Listening for: messages, callback_query, my_chat_member")
         await dp.start_polling(
@@ -4027,6 +3870,7 @@ async def main():
         logger.error(f"❌ Error starting bot: {e}", exc_info=True)
     finally:
         await bot.session.close()
+        async_db.shutdown(wait=False)
 
 
 if __name__ == "__main__":
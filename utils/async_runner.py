@@ -0,0 +1,129 @@
+"""
+Долгоживущий asyncio-цикл в фоновом потоке для вызовов Telegram из Flask.
+
+Синхронные обработчики отдают корутины в цикл через
+run_coroutine_threadsafe и ждут результат с таймаутом. Цикл один на
+процесс, поэтому aiohttp-сессия aiogram-бота (telegram_bot.bot) создаётся
+один раз и переиспользует соединения, а не пересоздаётся вместе с
+потоком и event loop на каждый вызов.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRunner:
+
+    def __init__(self, name='async-runner', slow_call_threshold=5.0):
+        self.name = name
+        self.slow_call_threshold = slow_call_threshold
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            logger.info(f"✅ Async runner '{self.name}' started")
+
+    def submit(self, coro):
+        """Отдать корутину в цикл и вернуть concurrent.futures.Future."""
+        if self._loop is None or not self._loop.is_running():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout=30):
+        name = getattr(coro, '__qualname__', None) or type(coro).__name__
+        started = time.perf_counter()
+        future = self.submit(coro)
+        status = 'ok'
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            status = 'timeout'
+            future.cancel()
+            raise
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._record(name, status, elapsed)
+            if elapsed > self.slow_call_threshold:
+                logger.warning(f"⚠️ Slow async call {name}: {elapsed:.2f}s ({status})")
+
+    def _record(self, name, status, elapsed):
+        with self._lock:
+            m = self._metrics.setdefault(name, {
+                'calls': 0, 'errors': 0, 'timeouts': 0, 'total_time': 0.0, 'max_time': 0.0
+            })
+            m['calls'] += 1
+            if status == 'error':
+                m['errors'] += 1
+            elif status == 'timeout':
+                m['timeouts'] += 1
+            m['total_time'] += elapsed
+            m['max_time'] = max(m['max_time'], elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: dict(m, avg_time=m['total_time'] / m['calls'] if m['calls'] else 0.0)
+                for name, m in self._metrics.items()
+            }
+
+    def stop(self, timeout=5):
+        if self._loop is None or not self._loop.is_running():
+            return
+
+        # Закрываем HTTP-сессию бота в том же цикле, где она была создана
+        telegram_bot = sys.modules.get('telegram_bot')
+        bot = getattr(telegram_bot, 'bot', None)
+        if bot is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(bot.session.close(), self._loop).result(timeout=timeout)
+            except Exception as e:
+                logger.debug(f"Error closing bot session: {e}")
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = AsyncRunner('telegram-async')
+                _runner.start()
+                atexit.register(_runner.stop)
+    return _runner
+
+
+def run_async(coro, timeout=30):
+    return get_runner().run(coro, timeout=timeout)
@@ -0,0 +1,138 @@
+"""
+Единая авторизация по Telegram InitData для app.py и всех blueprint'ов.
+
+authenticate_request() регистрируется как before_request и один раз на
+запрос проверяет заголовок "Authorization: tma <initData>", раскладывая
+результат в g (init_data, user, user_id, auth_error). Декораторы
+require_auth только читают g, поэтому разбор и проверка подписи не
+повторяются ни в обработчиках, ни между blueprint'ами. В users
+пользователь записывается декоратором - после проверки срока жизни
+initData для конкретного роута, чтобы отклонённые запросы ничего не писали.
+"""
+
+import logging
+import os
+import re
+import time
+from functools import wraps
+
+from flask import g, jsonify, request
+
+from database.db import sync_user
+from utils.init_data import InitDataVerifier
+
+logger = logging.getLogger(__name__)
+
+
+BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', 'ТУТтокен')
+
+# Время жизни initData по умолчанию; платёжным роутам разрешено больше
+INIT_DATA_EXPIRATION = 3600
+# Верхняя граница для проверки в before_request (TON-транзакция может идти долго)
+MAX_INIT_DATA_EXPIRATION = 86400
+
+init_data_verifier = InitDataVerifier(BOT_TOKEN, max_age=MAX_INIT_DATA_EXPIRATION)
+
+# EventSource не умеет отправлять заголовки: для потока событий initData
+# принимается из ?tma=. Только здесь - в остальных URL он попадал бы в логи
+QUERY_AUTH_PATHS = ('/api/stream',)
+
+
+def parse_referrer_id(parsed_data):
+    """start_param вида ref_<user_id> -> user_id пригласившего."""
+    start_param = parsed_data.get('start_param') or parsed_data.get('startapp') or ''
+    if isinstance(start_param, str) and start_param.startswith('ref_'):
+        ref_str = start_param.split('ref_', 1)[-1]
+        if ref_str.isdigit():
+            return int(ref_str)
+    return None
+
+
+def authenticate_request():
+    g.init_data = None
+    g.user = None
+    g.user_id = None
+    g.auth_error = None
+
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header and request.path in QUERY_AUTH_PATHS and request.args.get('tma'):
+        auth_header = f"tma {request.args['tma']}"
+    if not auth_header:
+        g.auth_error = 'missing'
+        return None
+
+    if not auth_header.startswith('tma '):
+        g.auth_error = 'format'
+        return None
+
+    is_valid, parsed_data = init_data_verifier.verify(auth_header[4:])
+    if not is_valid:
+        g.auth_error = 'invalid'
+        return None
+
+    g.init_data = parsed_data
+    g.user = parsed_data.get('user', {})
+    g.user_id = g.user.get('id')
+    return None
+
+
+def _sync_authenticated_user():
+    """Записать пользователя в users; только после проверки срока жизни в auth_required."""
+    if g.get('user_synced'):
+        return
+    g.user_synced = True
+    try:
+        sync_user(g.user, referrer_id=parse_referrer_id(g.init_data))
+    except Exception as e:
+        logger.error(f"Error syncing user to database: {e}")
+
+
+class QueryAuthLogFilter(logging.Filter):
+    """Скрывает ?tma=<initData> в access-логе werkzeug."""
+
+    _QUERY_AUTH = re.compile(r'([?&]tma=)[^&\s"]+')
+
+    def filter(self, record):
+        message = record.getMessage()
+        if 'tma=' in message:
+            record.msg = self._QUERY_AUTH.sub(r'\1***', message)
+            record.args = ()
+        return True
+
+
+def init_auth(app):
+    app.before_request(authenticate_request)
+    logging.getLogger('werkzeug').addFilter(QueryAuthLogFilter())
+
+
+def auth_required(max_age=INIT_DATA_EXPIRATION, invalid_status=401, invalid_error='Unauthorized'):
+    """Фабрика декораторов: свой срок жизни initData и код ответа на невалидные данные."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            auth_error = g.get('auth_error', 'missing')
+
+            if auth_error == 'missing':
+                logger.warning(f"No Authorization header for {request.method} {request.path}")
+                return jsonify({'error': 'Unauthorized', 'message': 'Missing authorization header'}), 401
+
+            if auth_error == 'format':
+                logger.warning(f"Invalid Authorization format for {request.method} {request.path}")
+                return jsonify({'error': 'Unauthorized', 'message': 'Invalid authorization header format'}), 401
+
+            if auth_error is None and time.time() - int(g.init_data['auth_date']) > max_age:
+                auth_error = 'expired'
+
+            if auth_error is not None:
+                logger.warning(f"Authorization FAILED ({auth_error}) for {request.method} {request.path}")
+                return jsonify({'error': invalid_error, 'message': 'Invalid or expired authorization data'}), invalid_status
+
+            _sync_authenticated_user()
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+require_auth = auth_required()
@@ -0,0 +1,29 @@
+"""
+@username канала из ссылки (t.me/..., telegram.me/..., @...).
+
+Вычисляется один раз при записи ссылки и хранится в колонке
+channel_username таблиц blogger_channels и blogger_applications;
+читающий код регулярки не запускает.
+"""
+
+import re
+
+CHANNEL_LINK_PATTERNS = (
+    re.compile(r't\.me/([^/\?]+)'),
+    re.compile(r'telegram\.me/([^/\?]+)'),
+    re.compile(r'@(\w+)'),
+)
+
+
+def extract_channel_username(channel_link):
+    """'https://t.me/name' -> '@name'; None, если ссылка не распознана."""
+    if not channel_link:
+        return None
+    for pattern in CHANNEL_LINK_PATTERNS:
+        match = pattern.search(channel_link)
+        if match:
+            username = match.group(1)
+            if not username.startswith('@'):
+                username = '@' + username
+            return username
+    return None
@@ -0,0 +1,181 @@
+"""
+Поток событий пользователя для Mini App (Server-Sent Events, /api/stream).
+
+Источник событий - таблица user_events, которую заполняют триггеры в тех
+же транзакциях, что и сами изменения, поэтому сюда попадает и то, что
+закоммитил процесс бота. Один фоновый поток EventHub на процесс Flask
+читает новые строки раз в POLL_INTERVAL (поиск по первичному ключу после
+последнего прочитанного id) и раскладывает их по очередям подписчиков
+этого пользователя. Открытый поток заменяет клиенту опрос чата, баланса,
+статуса премиум-поста и платежа.
+
+Переполненная очередь (клиент не читает) закрывает поток; браузер
+переподключается с Last-Event-ID и получает пропущенное из user_events.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from database.db import DATABASE_PATH
+from database.pool import get_pool
+from database.rows import dict_factory
+from database.user_events import UserEvents
+
+logger = logging.getLogger(__name__)
+
+
+POLL_INTERVAL = 0.5
+HEARTBEAT_INTERVAL = 15
+# Через сколько миллисекунд браузер переподключается после обрыва
+RECONNECT_DELAY_MS = 3000
+MAX_QUEUED_EVENTS = 100
+
+_CLOSED = object()
+
+
+def format_event(event):
+    """Строка SSE для события из user_events."""
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {event['payload']}\n\n"
+
+
+class Subscription:
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=MAX_QUEUED_EVENTS)
+        self.last_id = 0
+
+    def close(self):
+        # Место под маркер есть всегда: переполненную очередь сначала освобождаем
+        while True:
+            try:
+                self.queue.put_nowait(_CLOSED)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class EventHub:
+
+    def __init__(self, database_path, poll_interval=POLL_INTERVAL):
+        self.database_path = database_path
+        self.poll_interval = poll_interval
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+
+        self.delivered = 0
+        self.dropped = 0
+
+    def _read_events(self):
+        conn = get_pool(self.database_path).acquire(row_factory=dict_factory)
+        try:
+            cursor = conn.cursor()
+            if self._last_id is None:
+                # Подписчики получают только новое; старое - через Last-Event-ID
+                self._last_id = UserEvents.get_last_id(cursor)
+                return []
+            return UserEvents.get_after(cursor, self._last_id)
+        finally:
+            conn.close()
+
+    def _dispatch(self, events):
+        for event in events:
+            self._last_id = event['id']
+            with self._lock:
+                subscriptions = list(self._subscribers.get(event['user_id'], ()))
+            for subscription in subscriptions:
+                try:
+                    subscription.queue.put_nowait(event)
+                    self.delivered += 1
+                except queue.Full:
+                    self.dropped += 1
+                    logger.warning(f"⚠️ Event stream of user {subscription.user_id} is not read, closing it")
+                    self.unsubscribe(subscription)
+                    subscription.close()
+
+    def _run(self):
+        logger.info("📡 Event hub started")
+        while True:
+            try:
+                events = self._read_events()
+                self._dispatch(events)
+                if events:
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Event hub error: {e}", exc_info=True)
+            time.sleep(self.poll_interval)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+                self._thread.start()
+
+    def subscribe(self, user_id):
+        self._ensure_started()
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def stream(self, subscription, missed=()):
+        """Генератор тела text/event-stream: пропущенные события, затем новые."""
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+            for event in missed:
+                subscription.last_id = event['id']
+                yield format_event(event)
+            while True:
+                try:
+                    event = subscription.queue.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    # Комментарий SSE держит соединение и выявляет отключившихся
+                    yield ": ping\n\n"
+                    continue
+                if event is _CLOSED:
+                    return
+                if event['id'] <= subscription.last_id:
+                    continue
+                subscription.last_id = event['id']
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'subscriptions': sum(len(s) for s in self._subscribers.values()),
+                'last_event_id': self._last_id,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+            }
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_event_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = EventHub(DATABASE_PATH)
+    return _hub
+
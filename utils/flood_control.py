@@ -0,0 +1,73 @@
+"""
+Ограничение частоты сообщений бота.
+
+Bot API пропускает около 30 сообщений в секунду на бота и заметно меньше в
+один чат; сверх этого отвечает 429 (TelegramRetryAfter) с retry_after.
+FloodControl держит общий темп отправки ниже global_rate, а для каждого
+чата помнит время последнего сообщения и срок, до которого Telegram
+попросил не писать. delay_for() говорит, сколько ещё ждать до следующего
+сообщения в чат, - вызывающий код откладывает отправку, а не спит, и
+очередь других чатов не стоит.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FloodControl:
+
+    def __init__(self, per_chat_interval=1.0, global_rate=25, max_tracked_chats=10000):
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1 / global_rate
+        self.max_tracked_chats = max_tracked_chats
+        self._next_allowed = {}
+        self._next_global = 0.0
+
+        self.sent = 0
+        self.deferred = 0
+        self.retry_after = 0
+
+    def delay_for(self, chat_id):
+        """Секунд до момента, когда в чат можно писать; 0 - можно сейчас."""
+        delay = self._next_allowed.get(chat_id, 0.0) - time.monotonic()
+        if delay > 0:
+            self.deferred += 1
+            return delay
+        return 0.0
+
+    async def throttle(self):
+        """Выдержать общий темп бота перед отправкой."""
+        now = time.monotonic()
+        wait = self._next_global - now
+        self._next_global = max(now, self._next_global) + self.global_interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, chat_id):
+        """Сообщение в чат отправлено."""
+        self.sent += 1
+        self._set_next_allowed(chat_id, time.monotonic() + self.per_chat_interval)
+
+    def block(self, chat_id, seconds):
+        """Telegram ответил 429 с retry_after = seconds."""
+        self.retry_after += 1
+        logger.warning(f"⚠️ Telegram flood limit for chat {chat_id}, retry after {seconds}s")
+        self._set_next_allowed(chat_id, time.monotonic() + seconds)
+
+    def _set_next_allowed(self, chat_id, at):
+        self._next_allowed[chat_id] = max(at, self._next_allowed.get(chat_id, 0.0))
+        if len(self._next_allowed) > self.max_tracked_chats:
+            # Истёкшие сроки ничего не ограничивают
+            now = time.monotonic()
+            self._next_allowed = {c: t for c, t in self._next_allowed.items() if t > now}
+
+    def stats(self):
+        return {
+            'tracked_chats': len(self._next_allowed),
+            'sent': self.sent,
+            'deferred': self.deferred,
+            'retry_after': self.retry_after,
+        }
@@ -0,0 +1,81 @@
+"""
+Условные GET (ETag / If-None-Match) для JSON-ответов, которые редко меняются.
+
+Версия ответа не считается по телу: она собирается из счётчиков изменений
+таблиц (table_versions, миграция 9 - триггеры увеличивают счётчик на каждую
+вставку, изменение и удаление строки) или из ревизии каталога. Если версия
+совпала с If-None-Match клиента, обработчик не вызывается вовсе и уходит
+пустой 304.
+
+Версия читается до сборки тела, поэтому при параллельной записи ответ
+может получить уже устаревший ETag - тогда следующий запрос просто
+вернёт полное тело.
+"""
+
+import hashlib
+import logging
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+
+from database.db import get_db
+
+logger = logging.getLogger(__name__)
+
+
+# Клиент кэширует ответ у себя, но перед использованием сверяет ETag
+CACHE_CONTROL = 'private, no-cache'
+
+
+def get_table_versions(cursor, tables):
+    """Счётчики изменений таблиц в порядке tables (0 для неотслеживаемых)."""
+    placeholders = ', '.join('?' * len(tables))
+    cursor.execute(f"""
+        SELECT table_name, version FROM table_versions
+        WHERE table_name IN ({placeholders})
+    """, tuple(tables))
+    versions = {row['table_name']: row['version'] for row in cursor.fetchall()}
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def table_versions(*tables):
+    """Источник версии для conditional_get по счётчикам таблиц."""
+    def versions(cursor):
+        return get_table_versions(cursor, tables)
+    return versions
+
+
+def make_etag(parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def conditional_get(versions, per_user=False):
+    """Ответить 304, если данные не менялись с версии из If-None-Match.
+
+    versions(cursor) возвращает кортеж, который меняется вместе с данными
+    ответа (table_versions(...) или, например, ревизия каталога). В ETag
+    входят также путь с query string и, при per_user, id пользователя -
+    для ответов, зависящих от того, кто спрашивает. Ставится под
+    require_auth, чтобы неавторизованный запрос не получал 304.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cursor = get_db().cursor()
+            user_id = g.user.get('id') if per_user and g.get('user') else None
+            etag = make_etag((request.full_path, user_id, versions(cursor)))
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            if per_user:
+                response.vary.add('Authorization')
+            return response
+        return decorated_function
+    return decorator
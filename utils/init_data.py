@@ -0,0 +1,117 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, unquote
+
+logger = logging.getLogger(__name__)
+
+
+class InitDataVerifier:
+    """Проверка подписи Telegram WebApp initData.
+
+    Секретный ключ (HMAC "WebAppData" от токена бота) вычисляется один раз.
+    Mini App присылает одну и ту же строку initData при каждом опросе, поэтому
+    успешно проверенные строки хранятся в ограниченном LRU вместе с auth_date и
+    уже разобранными данными: повторная проверка - это поиск в словаре и
+    сравнение возраста с max_age.
+    """
+
+    def __init__(self, bot_token, max_age=3600, cache_size=4096):
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._secret_key = hmac.new(
+            key=b"WebAppData",
+            msg=bot_token.encode(),
+            digestmod=hashlib.sha256
+        ).digest()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, init_data_raw, max_age=None):
+        """Возвращает (is_valid, parsed_data); parsed_data['user'] уже dict."""
+        if not init_data_raw:
+            return False, None
+
+        max_age = self.max_age if max_age is None else max_age
+        now = int(time.time())
+
+        with self._lock:
+            entry = self._cache.get(init_data_raw)
+            if entry is not None:
+                auth_date, parsed_data = entry
+                if now - auth_date > max_age:
+                    # Строка протухла - больше она валидной не станет
+                    del self._cache[init_data_raw]
+                    return False, None
+                self._cache.move_to_end(init_data_raw)
+                self.hits += 1
+                return True, dict(parsed_data)
+
+        self.misses += 1
+        result = self._verify_signature(init_data_raw, now, max_age)
+        if result is None:
+            return False, None
+
+        auth_date, parsed_data = result
+        with self._lock:
+            self._cache[init_data_raw] = (auth_date, parsed_data)
+            self._cache.move_to_end(init_data_raw)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return True, dict(parsed_data)
+
+    def _verify_signature(self, init_data_raw, now, max_age):
+        try:
+            parsed_data = dict(parse_qsl(init_data_raw))
+        except Exception as e:
+            logger.warning(f"Не удалось разобрать initData: {e}")
+            return None
+
+        received_hash = parsed_data.pop('hash', None)
+        if not received_hash:
+            logger.warning("Hash not found in InitData")
+            return None
+
+        try:
+            auth_date = int(parsed_data.get('auth_date', ''))
+        except ValueError:
+            logger.warning("Invalid or missing auth_date in InitData")
+            return None
+
+        if now - auth_date > max_age:
+            logger.warning(f"InitData expired: {now - auth_date}s > {max_age}s")
+            return None
+
+        data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(parsed_data.items()))
+        calculated_hash = hmac.new(
+            key=self._secret_key,
+            msg=data_check_string.encode(),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+
+        if not hmac.compare_digest(calculated_hash, received_hash):
+            logger.warning("InitData hash mismatch")
+            return None
+
+        if 'user' in parsed_data:
+            try:
+                parsed_data['user'] = json.loads(unquote(parsed_data['user']))
+            except (json.JSONDecodeError, ValueError) as e:
+                logger.error(f"Error parsing user data: {e}")
+
+        return auth_date, parsed_data
+
+    def stats(self):
+        with self._lock:
+            size = len(self._cache)
+        return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,66 @@
+"""
+Измерение задержки event loop.
+
+Монитор засыпает на interval и смотрит, насколько позже он проснулся.
+Если цикл занят синхронной работой (запрос к SQLite, тяжёлый парсинг),
+пробуждение опаздывает ровно на время блокировки. Отдельные случаи
+дольше warn_threshold пишутся в лог сразу, сводка - раз в report_interval.
+"""
+
+import asyncio
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+
+    def __init__(self, interval=0.5, warn_threshold=0.25, report_interval=300, window=1200):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.report_interval = report_interval
+        self._recent = collections.deque(maxlen=window)
+        self.samples = 0
+        self.blocked = 0
+        self.max_lag = 0.0
+
+    def _record(self, lag):
+        self._recent.append(lag)
+        self.samples += 1
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.warn_threshold:
+            self.blocked += 1
+            logger.warning(f"🐌 Event loop was blocked for {lag * 1000:.0f} ms")
+
+    def stats(self):
+        recent = sorted(self._recent)
+        if recent:
+            p50 = recent[len(recent) // 2]
+            p99 = recent[max(int(len(recent) * 0.99) - 1, 0)]
+        else:
+            p50 = p99 = 0.0
+        return {
+            'samples': self.samples,
+            'blocked': self.blocked,
+            'p50_ms': p50 * 1000,
+            'p99_ms': p99 * 1000,
+            'max_ms': self.max_lag * 1000,
+        }
+
+    async def run(self, report=None):
+        """Бесконечный цикл измерений; report() - доп. статистика для сводки."""
+        loop = asyncio.get_running_loop()
+        last_report = loop.time()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self._record(max(now - started - self.interval, 0.0))
+
+            if now - last_report >= self.report_interval:
+                last_report = now
+                summary = f"📈 Event loop lag: {self.stats()}"
+                if report is not None:
+                    summary += f" | {report()}"
+                logger.info(summary)
@@ -0,0 +1,231 @@
+"""
+Медиакэш: фото каналов и пользователей из Telegram и аватары с инициалами.
+
+Ссылки вида https://api.telegram.org/file/bot<TOKEN>/... из getFile со
+временем перестают открываться, а каждая новая требует ещё одного getFile.
+Поэтому фото скачивается один раз по file_unique_id и хранится под
+static/uploads/media/<sha256[:2]>/<sha256>.<ext> - имя файла задаёт
+содержимое, и его можно отдавать с бессрочным (immutable) кэшированием.
+Рядом лежат уменьшенные копии <sha256>_small/_medium в WebP (или JPEG,
+если Pillow собран без WebP); без Pillow превью не создаются и вместо
+них отдаётся оригинал.
+
+Вместо внешнего ui-avatars.com аватар без фото - SVG с инициалами,
+который отдаёт app.py по /avatars/<фон>/<инициалы>.svg.
+"""
+
+import hashlib
+import html
+import io
+import logging
+import os
+import re
+from urllib.parse import quote
+
+try:
+    from PIL import Image, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = features = None
+    logging.warning("⚠️ Pillow not installed. Media thumbnails are disabled.")
+
+from database.media_model import MediaFile
+from utils.singleflight import get_singleflight
+
+logger = logging.getLogger(__name__)
+
+
+BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', 'ТУТтокен')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEDIA_DIR = os.path.join(BASE_DIR, 'static', 'uploads', 'media')
+MEDIA_URL_PREFIX = '/static/uploads/media/'
+
+# Сторона квадрата, в который вписывается превью
+THUMBNAIL_SIZES = {'small': 128, 'medium': 320}
+THUMBNAIL_QUALITY = 80
+MAX_MEDIA_BYTES = 10 * 1024 * 1024
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+DEFAULT_AVATAR_BACKGROUND = '2481cc'
+
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+)
+_MEDIA_URL = re.compile(re.escape(MEDIA_URL_PREFIX) + r'([0-9a-f]{2})/([0-9a-f]{64})\.(\w+)$')
+_AVATAR_BACKGROUND = re.compile(r'^[0-9a-fA-F]{6}$')
+
+_download_flight = get_singleflight('telegram_file_download')
+
+
+def _thumbnail_ext():
+    if PIL_AVAILABLE and features.check('webp'):
+        return 'webp'
+    return 'jpg'
+
+
+def _media_path(sha256, ext, size=None):
+    suffix = f"_{size}" if size else ''
+    return os.path.join(MEDIA_DIR, sha256[:2], f"{sha256}{suffix}.{ext}")
+
+
+def media_url(sha256, ext, size=None):
+    suffix = f"_{size}" if size else ''
+    return f"{MEDIA_URL_PREFIX}{sha256[:2]}/{sha256}{suffix}.{ext}"
+
+
+def _image_ext(data):
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _make_thumbnails(sha256, data):
+    """Превью всех размеров; возвращает (ширина, высота) оригинала."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        ext = _thumbnail_ext()
+        for size, side in THUMBNAIL_SIZES.items():
+            path = _media_path(sha256, ext, size)
+            if os.path.exists(path):
+                continue
+            thumbnail = image.copy()
+            thumbnail.thumbnail((side, side))
+            if ext == 'jpg' and thumbnail.mode != 'RGB':
+                thumbnail = thumbnail.convert('RGB')
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, 'WEBP' if ext == 'webp' else 'JPEG', quality=THUMBNAIL_QUALITY)
+            _write_atomic(path, buffer.getvalue())
+    return width, height
+
+
+def store_image(cursor, data, file_unique_id=None):
+    """Сохранить картинку в кэш по sha256 содержимого; возвращает URL оригинала.
+
+    ValueError, если данные не похожи на JPEG/PNG/GIF/WebP. Повторное
+    сохранение того же содержимого файлы не перезаписывает.
+    """
+    ext = _image_ext(data)
+    if ext is None:
+        raise ValueError("Unsupported image format")
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = _media_path(sha256, ext)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+
+    width = height = None
+    if PIL_AVAILABLE:
+        try:
+            width, height = _make_thumbnails(sha256, data)
+        except Exception as e:
+            logger.warning(f"⚠️ Thumbnails for {sha256} failed: {e}")
+
+    MediaFile.save(cursor, sha256, ext, len(data), width, height)
+    if file_unique_id:
+        MediaFile.link_telegram_file(cursor, file_unique_id, sha256)
+    return media_url(sha256, ext)
+
+
+def _download_telegram_file(file_id):
+    import requests
+
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
+    response = requests.post(url, json={'file_id': file_id}, timeout=10)
+    response.raise_for_status()
+    file_data = response.json()
+    if not file_data.get('ok'):
+        raise Exception(f"Telegram API error: {file_data.get('description', 'Unknown error')}")
+
+    file_path = file_data['result']['file_path']
+    response = requests.get(f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}", timeout=20)
+    response.raise_for_status()
+    if len(response.content) > MAX_MEDIA_BYTES:
+        raise ValueError(f"Telegram file too large: {len(response.content)} bytes")
+    return response.content
+
+
+def mirror_telegram_file(cursor, file_id, file_unique_id):
+    """URL локальной копии файла Telegram; скачивает его только при первом обращении.
+
+    file_unique_id одинаков у всех file_id одного файла и не меняется,
+    поэтому уже скачанное фото находится без getFile. Ошибки сети и
+    Bot API пробрасываются.
+    """
+    row = MediaFile.get_by_telegram_id(cursor, file_unique_id)
+    if row:
+        return media_url(row['sha256'], row['ext'])
+
+    data = _download_flight.do(file_unique_id, _download_telegram_file, file_id)
+    url = store_image(cursor, data, file_unique_id)
+    logger.info(f"🖼 Mirrored Telegram file {file_unique_id}: {url}")
+    return url
+
+
+def mirror_chat_photo(cursor, photo):
+    """Большое фото чата из getChat (dict Bot API или ChatPhoto aiogram) -> URL или None."""
+    if not photo:
+        return None
+    if isinstance(photo, dict):
+        file_id, file_unique_id = photo.get('big_file_id'), photo.get('big_file_unique_id')
+    else:
+        file_id, file_unique_id = photo.big_file_id, photo.big_file_unique_id
+    if not file_id or not file_unique_id:
+        return None
+    return mirror_telegram_file(cursor, file_id, file_unique_id)
+
+
+def thumbnail_url(photo_url, size='medium'):
+    """Превью размера size для фото из медиакэша; прочие URL возвращаются как есть."""
+    match = _MEDIA_URL.match(photo_url or '')
+    if not match:
+        return photo_url
+    _, sha256, _ = match.groups()
+    for ext in ('webp', 'jpg'):
+        if os.path.exists(_media_path(sha256, ext, size)):
+            return media_url(sha256, ext, size)
+    return photo_url
+
+
+def get_initials(name):
+    """До двух первых букв слов имени: 'Крипто Мир' -> 'КМ', '@channel' -> 'C'."""
+    letters = [word[0] for word in re.findall(r'[^\W_]+', name or '')]
+    return ''.join(letters[:2]).upper()[:2] or '?'
+
+
+def initials_avatar_url(name, background=DEFAULT_AVATAR_BACKGROUND):
+    return f"/avatars/{background}/{quote(get_initials(name))}.svg"
+
+
+def render_initials_avatar(initials, background=DEFAULT_AVATAR_BACKGROUND):
+    """SVG-аватар; ValueError на неподходящие инициалы или цвет."""
+    if not _AVATAR_BACKGROUND.match(background or ''):
+        raise ValueError("Invalid background")
+    if not initials or len(initials) > 2 or not all(ch.isalnum() or ch == '?' for ch in initials):
+        raise ValueError("Invalid initials")
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="128" height="128" viewBox="0 0 128 128">'
+        f'<rect width="128" height="128" fill="#{background.lower()}"/>'
+        '<text x="64" y="64" dy=".35em" text-anchor="middle" fill="#fff" font-size="52" '
+        'font-family="-apple-system, BlinkMacSystemFont, Segoe UI, Roboto, Helvetica, Arial, sans-serif">'
+        f'{html.escape(initials)}</text></svg>'
+    )
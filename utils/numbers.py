@@ -0,0 +1,63 @@
+"""
+Цены и число подписчиков: разбор входных значений и вывод в ответах.
+
+В базе цены хранятся как REAL в рублях (NULL - цена не указана), число
+подписчиков - как INTEGER. Строки, которые ожидает клиент ("1500",
+"12000"), собираются только при формировании ответа.
+"""
+
+import math
+import re
+
+_COUNT_PATTERN = re.compile(r'^(\d+(?:[.,]\d+)?)([KКMМ])?$', re.IGNORECASE)
+_COUNT_MULTIPLIERS = {'K': 1000, 'К': 1000, 'M': 1000000, 'М': 1000000}
+_PRICE_JUNK = re.compile(r'[\s₽]|руб\.?', re.IGNORECASE)
+
+
+def parse_count(value):
+    """12000, '12000', '12 000', '12K', '1.2M' -> int; пустое и нечитаемое -> 0."""
+    if value is None or isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value) if math.isfinite(value) and value > 0 else 0
+
+    text = str(value).replace(' ', '').replace('\xa0', '')
+    match = _COUNT_PATTERN.match(text)
+    if not match:
+        return 0
+    number, suffix = match.groups()
+    if suffix:
+        return int(float(number.replace(',', '.')) * _COUNT_MULTIPLIERS[suffix.upper()])
+    # Без суффикса запятая - разделитель разрядов ("12,000")
+    return int(float(number.replace(',', '')))
+
+
+def parse_price(value):
+    """1500, '1500', '1 500 ₽', '1500,50' -> float; пустое и нечитаемое -> None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        price = float(value)
+    else:
+        text = _PRICE_JUNK.sub('', str(value)).replace(',', '.')
+        if not text:
+            return None
+        try:
+            price = float(text)
+        except ValueError:
+            return None
+    return price if math.isfinite(price) and price >= 0 else None
+
+
+def format_price(value):
+    """Цена для ответа: 1500.0 -> '1500', 1500.5 -> '1500.5', None -> ''."""
+    if value is None:
+        return ''
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.2f}".rstrip('0')
+
+
+def format_count(value):
+    """Число подписчиков для ответа: 12000 -> '12000', None -> '0'."""
+    return str(int(value or 0))
@@ -0,0 +1,192 @@
+"""
+Single-flight: одновременные одинаковые вызовы разделяют одно выполнение.
+
+Первый вызов с ключом (ведущий) выполняет работу, а вызовы с тем же
+ключом, пришедшие до её окончания, ждут и получают тот же результат или
+то же исключение. Результат не кэшируется: следующий вызов после
+завершения выполняется заново.
+
+SingleFlight - для потоков Flask, AsyncSingleFlight - для корутин в одном
+event loop (бот, async_runner). Группы берутся по имени через
+get_singleflight / get_async_singleflight; singleflight_stats() отдаёт
+счётчики по ключам: вызовы, выполнения, разделённые результаты, ошибки,
+время выполнения, singleflight_totals() - те же счётчики по группам.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+# Ключей может быть много (id каналов); статистика хранится по последним
+MAX_TRACKED_KEYS = 1000
+
+
+class _FlightMetrics:
+
+    def __init__(self, max_keys=MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        m = self._metrics.get(key)
+        if m is None:
+            m = self._metrics[key] = {
+                'calls': 0, 'executions': 0, 'shared': 0, 'errors': 0,
+                'total_time': 0.0, 'max_time': 0.0,
+            }
+            if len(self._metrics) > self.max_keys:
+                self._metrics.popitem(last=False)
+        else:
+            self._metrics.move_to_end(key)
+        return m
+
+    def record_shared(self, key):
+        with self._lock:
+            m = self._entry(key)
+            m['calls'] += 1
+            m['shared'] += 1
+
+    def record_execution(self, key, elapsed, failed):
+        with self._lock:
+            m = self._entry(key)
+            m['calls'] += 1
+            m['executions'] += 1
+            if failed:
+                m['errors'] += 1
+            m['total_time'] += elapsed
+            m['max_time'] = max(m['max_time'], elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                repr(key): dict(m, avg_time=m['total_time'] / m['executions'] if m['executions'] else 0.0)
+                for key, m in self._metrics.items()
+            }
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._metrics = _FlightMetrics()
+
+    def do(self, key, func, *args, **kwargs):
+        """func(*args, **kwargs) один раз на все одновременные вызовы с key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._metrics.record_shared(key)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        started = time.perf_counter()
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            self._metrics.record_execution(key, time.perf_counter() - started, call.error is not None)
+        return call.result
+
+    def stats(self):
+        return self._metrics.stats()
+
+
+class AsyncSingleFlight:
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._metrics = _FlightMetrics()
+
+    async def do(self, key, func, *args, **kwargs):
+        """await func(*args, **kwargs) один раз на все одновременные вызовы с key.
+
+        Работа идёт в отдельной задаче: отмена одного из ожидающих не
+        отменяет её для остальных.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self._metrics.record_shared(key)
+            return await asyncio.shield(task)
+
+        started = time.perf_counter()
+        task = self._calls[key] = asyncio.ensure_future(func(*args, **kwargs))
+
+        def finished(done_task):
+            if self._calls.get(key) is done_task:
+                del self._calls[key]
+            failed = done_task.cancelled() or done_task.exception() is not None
+            self._metrics.record_execution(key, time.perf_counter() - started, failed)
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return self._metrics.stats()
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def _get_group(name, cls):
+    group = _groups.get(name)
+    if group is None:
+        with _groups_lock:
+            group = _groups.get(name)
+            if group is None:
+                group = _groups[name] = cls(name)
+    if not isinstance(group, cls):
+        raise TypeError(f"Single-flight group '{name}' is {type(group).__name__}, not {cls.__name__}")
+    return group
+
+
+def get_singleflight(name):
+    return _get_group(name, SingleFlight)
+
+
+def get_async_singleflight(name):
+    return _get_group(name, AsyncSingleFlight)
+
+
+def singleflight_stats():
+    return {name: group.stats() for name, group in list(_groups.items())}
+
+
+def singleflight_totals():
+    """Сумма счётчиков по всем ключам каждой группы - для периодического лога."""
+    totals = {}
+    for name, stats in singleflight_stats().items():
+        group = totals[name] = {'calls': 0, 'executions': 0, 'shared': 0, 'errors': 0}
+        for m in stats.values():
+            for field in group:
+                group[field] += m[field]
+    return totals
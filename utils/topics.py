@@ -0,0 +1,107 @@
+"""
+Тематики каналов: группы и подтемы.
+
+Общий справочник для бота (клавиатуры выбора тематики) и базы: миграция 8
+переносит названия групп в таблицу topic_groups для полнотекстового
+поиска по каталогу. Клиентская копия - TOPIC_GROUPS в static/js/app.js.
+"""
+
+TOPIC_GROUPS = {
+    "news_media": {
+        "title": "🔷 Новости и медиа",
+        "subtopics": [
+            ("world_news", "Новости мира"),
+            ("city_news", "Новости городов"),
+            ("economy_news", "Экономические новости"),
+            ("entertainment_news", "Развлекательные новости"),
+        ],
+    },
+    "business_finance": {
+        "title": "🔷 Бизнес и финансы",
+        "subtopics": [
+            ("personal_finance", "Личные финансы"),
+            ("investments", "Инвестиции"),
+            ("trading", "Трейдинг"),
+            ("crypto", "Криптовалюты"),
+            ("real_estate", "Недвижимость"),
+            ("entrepreneurship", "Предпринимательство"),
+            ("marketing_ads", "Маркетинг и реклама"),
+        ],
+    },
+    "education": {
+        "title": "🔷 Образование",
+        "subtopics": [
+            ("courses", "Курсы и обучение"),
+            ("exams", "ЕГЭ/ОГЭ"),
+            ("languages", "Иностранные языки"),
+            ("it_education", "IT-образование"),
+            ("psychology", "Психология"),
+            ("science_pop", "Научно-популярный контент"),
+        ],
+    },
+    "technology": {
+        "title": "🔷 Технологии",
+        "subtopics": [
+            ("it_news", "IT новости"),
+            ("dev", "Разработка"),
+            ("gadgets", "Гаджеты"),
+            ("ai", "Искусственный интеллект"),
+            ("cybersec", "Кибербезопасность"),
+        ],
+    },
+    "fun": {
+        "title": "🔷 Юмор и развлечения",
+        "subtopics": [
+            ("memes", "Мемы"),
+            ("jokes", "Приколы"),
+            ("entertainment_content", "Развлекательный контент"),
+            ("stories", "Истории, рассказы"),
+        ],
+    },
+    "literature": {
+        "title": "🔷 Литература и творчество",
+        "subtopics": [
+            ("author_texts", "Авторские тексты"),
+            ("writers", "Писатели, поэты"),
+            ("fanfiction", "Фанфикшн"),
+            ("illustrations", "Иллюстрации"),
+        ],
+    },
+    "lifestyle": {
+        "title": "🔷 Лайфстайл",
+        "subtopics": [
+            ("self_growth", "Саморазвитие"),
+            ("motivation", "Мотивация"),
+            ("relationship_psychology", "Психология отношений"),
+            ("fashion", "Мода"),
+            ("style", "Стиль"),
+            ("travel", "Путешествия"),
+        ],
+    },
+    "health": {
+        "title": "🔷 Здоровье",
+        "subtopics": [
+            ("sport", "Спорт"),
+            ("nutrition", "Питание"),
+            ("healthy_life", "Здоровый образ жизни"),
+            ("medicine", "Медицина"),
+        ],
+    },
+    "gaming": {
+        "title": "🔷 Игры и гейминг",
+        "subtopics": [
+            ("mobile_games", "Мобильные игры"),
+            ("pc_console", "ПК и консоли"),
+            ("guides_reviews", "Гайды, читы, обзоры"),
+        ],
+    },
+    "hobbies": {
+        "title": "🔷 Хобби",
+        "subtopics": [
+            ("music", "Музыка"),
+            ("movies", "Фильмы"),
+            ("anime", "Аниме"),
+            ("auto_moto", "Авто/мото"),
+        ],
+    },
+}